@@ -3,6 +3,9 @@ from flask_cors import CORS
 from config import Config
 from models import db
 from routes import api_bp
+from migrate import upgrade_database
+from database import install_sqlite_pragmas
+from metrics import MetricsJSONProvider, install_metrics
 
 # 创建Flask应用实例
 app = Flask(__name__)
@@ -10,14 +13,20 @@ app = Flask(__name__)
 # 加载配置
 app.config.from_object(Config)
 
+# 金额（Decimal）以数字输出，并统计每个请求序列化的记录数
+app.json = MetricsJSONProvider(app)
+
 # 初始化CORS
 CORS(app, origins=app.config['CORS_ORIGINS'])
 
 # 初始化数据库
 with app.app_context():
     db.init_app(app)
-    # 创建表，包括新添加的银行对账表和采购订单表
-    db.create_all()
+    install_sqlite_pragmas(db.engine, app.config)
+    # 请求级 SQL 条数、耗时统计及 /metrics 接口
+    install_metrics(app, db.engine)
+    # 创建新表并执行未应用的数据库迁移
+    upgrade_database()
 
 # 注册蓝图
 app.register_blueprint(api_bp)
@@ -0,0 +1,590 @@
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# 接口基准测试：按指定规模生成合成账套，进程内以 test_client 压测热点接口，结果写入 JSON 供回归比较
+#   python benchmark.py                                   默认规模，结果写入 benchmark-results/
+#   python benchmark.py --vouchers 50000 --concurrency 4  大规模、多线程并发
+#   python benchmark.py --compare baseline.json           与基线比较，p95 退化超过阈值时返回码为 1
+# 未指定 --database-url 时使用临时 SQLite 文件，不会改动 database/accounting.db
+
+BENCHMARK_PASSWORD = 'benchmark'
+SEED_BATCH_SIZE = 500
+OPENING_CAPITAL = Decimal('100000000.00')
+
+DEFAULT_SCALE = {
+    'users': 1,
+    'vouchers': 5000,
+    'months': 12,
+    'vendors': 50,
+    'purchase_orders': 200,
+    'bills': 2000,
+    'statements': 6,
+    'statement_items': 200,
+}
+
+# 合成凭证模板：(摘要, 借方科目编码列表, 贷方科目编码列表, 金额下限, 金额上限)
+VOUCHER_TEMPLATES = (
+    ('销售收款', ('1002',), ('6001', '2221'), 100, 50000),
+    ('赊销', ('1122',), ('6001',), 100, 30000),
+    ('收回应收账款', ('1002',), ('1122',), 100, 30000),
+    ('采购入库', ('1405',), ('2202',), 500, 30000),
+    ('支付货款', ('2202',), ('1002',), 500, 20000),
+    ('结转销售成本', ('6401',), ('1405',), 100, 20000),
+    ('管理费用报销', ('6602',), ('1002',), 50, 5000),
+    ('销售费用', ('6601',), ('1001',), 50, 3000),
+    ('提取备用金', ('1001',), ('1002',), 100, 5000),
+    ('支付工资', ('2211',), ('1002',), 1000, 50000),
+    ('计提工资', ('6602', '6601'), ('2211',), 1000, 50000),
+)
+
+SCENARIOS = {}
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+def _money(rng, low, high):
+    return Decimal(rng.randint(low * 100, high * 100)).scaleb(-2)
+
+def _split(rng, total, parts):
+    if parts == 1:
+        return [total]
+    cents = int(total * 100)
+    first = rng.randint(cents // 4, cents * 3 // 4)
+    return [Decimal(first).scaleb(-2), Decimal(cents - first).scaleb(-2)]
+
+def _month_start(day, months_back):
+    month = day.year * 12 + day.month - 1 - months_back
+    return date(month // 12, month % 12 + 1, 1)
+
+# 生成合成凭证：日期覆盖截至本月的最近 months 个月，本月也有数据以便仪表盘统计
+def synthetic_vouchers(rng, accounts, count, months):
+    start = _month_start(date.today(), months - 1)
+    span = (date.today() - start).days + 1
+    vouchers = []
+    for i in range(count):
+        description, debit_codes, credit_codes, low, high = rng.choice(VOUCHER_TEMPLATES)
+        amount = _money(rng, low, high)
+        day = start + timedelta(days=rng.randrange(span))
+        entries = [
+            {'account_id': accounts[code], 'direction': '借方', 'amount': part, 'description': description}
+            for code, part in zip(debit_codes, _split(rng, amount, len(debit_codes)))
+        ] + [
+            {'account_id': accounts[code], 'direction': '贷方', 'amount': part, 'description': description}
+            for code, part in zip(credit_codes, _split(rng, amount, len(credit_codes)))
+        ]
+        vouchers.append({
+            'date': datetime(day.year, day.month, day.day, 9) + timedelta(minutes=i % 480),
+            'description': f'{description}{i + 1}',
+            'status': '已审核',
+            'entries': entries
+        })
+    return vouchers
+
+# 按时间先后写入并过账凭证，期初先投入足够的实收资本以保证付款时银行余额充足
+def _seed_vouchers(user_id, accounts, rng, scale):
+    from models import db
+    from voucher_import import insert_vouchers
+
+    opening_day = _month_start(date.today(), scale['months'])
+    vouchers = [{
+        'date': datetime(opening_day.year, opening_day.month, opening_day.day),
+        'description': '投入资本',
+        'status': '已审核',
+        'entries': [
+            {'account_id': accounts['1002'], 'direction': '借方', 'amount': OPENING_CAPITAL, 'description': '投入资本'},
+            {'account_id': accounts['4001'], 'direction': '贷方', 'amount': OPENING_CAPITAL, 'description': '投入资本'},
+        ]
+    }]
+    vouchers += sorted(synthetic_vouchers(rng, accounts, scale['vouchers'], scale['months']), key=lambda voucher: voucher['date'])
+    for start in range(0, len(vouchers), SEED_BATCH_SIZE):
+        insert_vouchers(user_id, vouchers[start:start + SEED_BATCH_SIZE], post=True)
+        db.session.commit()
+    return sum(len(voucher['entries']) for voucher in vouchers)
+
+def _seed_purchasing(user_id, accounts, rng, scale):
+    from sqlalchemy import insert
+    from models import db, Vendor, PurchaseOrder, PurchaseOrderItem, Bill
+
+    now = datetime.utcnow()
+    today = date.today()
+    vendor_ids = db.session.execute(
+        insert(Vendor).returning(Vendor.id, sort_by_parameter_order=True),
+        [{
+            'name': f'供应商{i + 1:04d}',
+            'contact': f'联系人{i + 1}',
+            'phone': f'138{i:08d}',
+            'user_id': user_id,
+            'created_at': now,
+            'updated_at': now
+        } for i in range(scale['vendors'])]
+    ).scalars().all()
+    if not vendor_ids:
+        return
+
+    order_ids = []
+    if scale['purchase_orders']:
+        order_ids = db.session.execute(
+            insert(PurchaseOrder).returning(PurchaseOrder.id, sort_by_parameter_order=True),
+            [{
+                'order_number': f'BP{user_id}-{i + 1:06d}',
+                'vendor_id': rng.choice(vendor_ids),
+                'order_date': datetime.combine(today - timedelta(days=rng.randrange(365)), datetime.min.time()),
+                'description': '合成采购订单',
+                'status': rng.choice(('pending', 'approved', 'approved', 'completed')),
+                'user_id': user_id,
+                'created_at': now,
+                'updated_at': now
+            } for i in range(scale['purchase_orders'])]
+        ).scalars().all()
+        db.session.execute(insert(PurchaseOrderItem), [{
+            'purchase_order_id': order_id,
+            'product_name': f'商品{line + 1}',
+            'quantity': rng.randint(1, 20),
+            'unit_price': _money(rng, 1, 500),
+            'account_id': accounts['1405'],
+            'created_at': now,
+            'updated_at': now
+        } for order_id in order_ids for line in range(rng.randint(1, 5))])
+
+    # 账单全部为已核对待付款状态，供付款场景逐批消耗
+    for start in range(0, scale['bills'], SEED_BATCH_SIZE):
+        db.session.execute(insert(Bill), [{
+            'bill_no': f'BB{user_id}-{i + 1:06d}',
+            'vendor_id': rng.choice(vendor_ids),
+            'purchase_order_id': rng.choice(order_ids) if order_ids and rng.random() < 0.5 else None,
+            'amount': _money(rng, 10, 5000),
+            'due_date': today + timedelta(days=rng.randrange(-30, 60)),
+            'status': '已核对待付款',
+            'description': '合成应付账单',
+            'user_id': user_id,
+            'created_at': now,
+            'updated_at': now
+        } for i in range(start, min(start + SEED_BATCH_SIZE, scale['bills']))])
+    db.session.commit()
+
+# 银行对账单：取最近几个月的银行存款分录生成明细（日期随机偏移 0~2 天），另加约一成无法匹配的明细
+def _seed_statements(user_id, accounts, rng, scale):
+    from sqlalchemy import insert
+    from models import db, Voucher, VoucherEntry, BankStatement, BankStatementItem
+    from statement_import import line_hash
+    from reconcile import adjust_statement_counters
+
+    now = datetime.utcnow()
+    statement_ids = []
+    for months_back in range(scale['statements']):
+        month_start = _month_start(date.today(), months_back)
+        month_end = _month_start(month_start + timedelta(days=40), 0)
+        entries = db.session.query(Voucher.date, VoucherEntry.amount, VoucherEntry.direction).join(
+            Voucher, Voucher.id == VoucherEntry.voucher_id
+        ).filter(
+            Voucher.user_id == user_id,
+            VoucherEntry.account_id == accounts['1002'],
+            Voucher.date >= datetime.combine(month_start, datetime.min.time()),
+            Voucher.date < datetime.combine(month_end, datetime.min.time())
+        ).order_by(Voucher.date, VoucherEntry.id).limit(scale['statement_items']).all()
+        lines = [
+            (entry.date.date() + timedelta(days=rng.randint(0, 2)), entry.amount if entry.direction == '借方' else -entry.amount, '银行流水')
+            for entry in entries
+        ]
+        lines += [
+            (month_start + timedelta(days=rng.randrange(28)), -_money(rng, 1, 200), '银行手续费')
+            for _ in range(max(len(lines) // 10, 1))
+        ]
+        lines.sort(key=lambda line: line[0])
+
+        statement = BankStatement(
+            account_id=accounts['1002'],
+            statement_date=month_end - timedelta(days=1),
+            opening_balance=OPENING_CAPITAL,
+            closing_balance=OPENING_CAPITAL + sum((line[1] for line in lines), Decimal('0')),
+            user_id=user_id
+        )
+        db.session.add(statement)
+        db.session.flush()
+        running = OPENING_CAPITAL
+        rows = []
+        for transaction_date, amount, description in lines:
+            running += amount
+            rows.append({
+                'bank_statement_id': statement.id,
+                'transaction_date': transaction_date,
+                'description': description,
+                'amount': amount,
+                'balance': running,
+                'reconciled': False,
+                'line_hash': line_hash(transaction_date, amount, description, running),
+                'created_at': now,
+                'updated_at': now
+            })
+        db.session.execute(insert(BankStatementItem), rows)
+        adjust_statement_counters(statement.id, item_delta=len(rows))
+        statement_ids.append(statement.id)
+    db.session.commit()
+    return statement_ids
+
+# 生成合成账套：用户经注册接口创建（同时生成默认科目），其余数据直接批量写入；返回每个用户的压测上下文
+def seed_ledger(app, scale=None, seed=42):
+    from models import db, Account, Bill
+
+    scale = dict(DEFAULT_SCALE, **(scale or {}))
+    rng = random.Random(seed)
+    client = app.test_client()
+    contexts = []
+    counts = {'users': 0, 'vouchers': 0, 'voucher_entries': 0, 'bills': 0, 'bank_statements': 0}
+    for index in range(scale['users']):
+        username = f'bench{index + 1}'
+        response = client.post('/api/auth/register', json={
+            'username': username,
+            'email': f'{username}@example.com',
+            'password': BENCHMARK_PASSWORD,
+            'full_name': f'Benchmark {index + 1}'
+        })
+        if response.status_code != 201:
+            raise RuntimeError(f"注册压测用户失败: {response.get_json().get('message')}")
+        user_id = response.get_json()['user']['id']
+        accounts = {account.code: account.id for account in Account.query.filter_by(user_id=user_id)}
+
+        counts['voucher_entries'] += _seed_vouchers(user_id, accounts, rng, scale)
+        _seed_purchasing(user_id, accounts, rng, scale)
+        statement_ids = _seed_statements(user_id, accounts, rng, scale)
+        bill_ids = [row.id for row in db.session.query(Bill.id).filter(Bill.user_id == user_id).order_by(Bill.id)]
+
+        counts['users'] += 1
+        counts['vouchers'] += scale['vouchers'] + 1
+        counts['bills'] += len(bill_ids)
+        counts['bank_statements'] += len(statement_ids)
+        contexts.append(BenchmarkContext(username, user_id, accounts, statement_ids, bill_ids))
+    db.session.remove()
+    return contexts, counts
+
+# 单个压测用户的数据：科目、对账单，以及按请求领取的待付款账单
+class BenchmarkContext:
+    def __init__(self, username, user_id, accounts, statement_ids, bill_ids, payment_batch=10):
+        self.username = username
+        self.user_id = user_id
+        self.accounts = accounts
+        self.statement_ids = statement_ids
+        self.payment_batch = payment_batch
+        self._bills = deque(bill_ids)
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._clients = []
+
+    # 已登录的客户端在各场景间复用，登录（密码哈希校验）不计入压测
+    def clients(self, app, count):
+        while len(self._clients) < count:
+            client = app.test_client()
+            client.post('/api/auth/login', json={'username': self.username, 'password': BENCHMARK_PASSWORD})
+            self._clients.append(client)
+        return self._clients[:count]
+
+    def take_bills(self):
+        with self._lock:
+            return [self._bills.popleft() for _ in range(min(self.payment_batch, len(self._bills)))]
+
+    def next_index(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def statement_id(self):
+        return self.statement_ids[self.next_index() % len(self.statement_ids)] if self.statement_ids else 0
+
+def _year_range():
+    today = date.today()
+    return f'{today.year}-01-01', today.isoformat()
+
+@scenario('vouchers_list')
+def bench_vouchers_list(client, context):
+    return client.get('/api/vouchers?limit=50')
+
+@scenario('vouchers_list_entries')
+def bench_vouchers_list_entries(client, context):
+    return client.get('/api/vouchers?limit=50&include=entries')
+
+@scenario('voucher_create')
+def bench_voucher_create(client, context):
+    index = context.next_index()
+    return client.post('/api/vouchers', json={
+        'date': date.today().isoformat(),
+        'description': f'压测凭证{index}',
+        'entries': [
+            {'account_id': context.accounts['6602'], 'direction': '借方', 'amount': 12.34},
+            {'account_id': context.accounts['1001'], 'direction': '贷方', 'amount': 12.34},
+        ]
+    })
+
+@scenario('dashboard')
+def bench_dashboard(client, context):
+    return client.get('/api/dashboard')
+
+# 每次请求前清除缓存，测量仪表盘实际计算耗时
+@scenario('dashboard_uncached')
+def bench_dashboard_uncached(client, context):
+    from cache import dashboard_cache
+    dashboard_cache.invalidate(context.user_id)
+    return client.get('/api/dashboard')
+
+@scenario('balance_sheet')
+def bench_balance_sheet(client, context):
+    return client.get(f'/api/reports/balance_sheet?as_of={date.today().isoformat()}')
+
+@scenario('income_statement')
+def bench_income_statement(client, context):
+    date_from, date_to = _year_range()
+    return client.get(f'/api/reports/income_statement?from={date_from}&to={date_to}')
+
+@scenario('cash_flow')
+def bench_cash_flow(client, context):
+    date_from, date_to = _year_range()
+    return client.get(f'/api/reports/cash_flow?from={date_from}&to={date_to}')
+
+@scenario('account_ledger')
+def bench_account_ledger(client, context):
+    return client.get(f"/api/accounts/{context.accounts['1002']}/ledger?limit=200")
+
+@scenario('trial_balance')
+def bench_trial_balance(client, context):
+    date_from, date_to = _year_range()
+    return client.get(f'/api/reports/trial-balance?from={date_from}&to={date_to}')
+
+@scenario('general_ledger_export')
+def bench_general_ledger_export(client, context):
+    month_start = _month_start(date.today(), 0)
+    return client.get(f'/api/reports/general-ledger/export?format=csv&from={month_start.isoformat()}&to={date.today().isoformat()}')
+
+@scenario('unreconciled_entries')
+def bench_unreconciled_entries(client, context):
+    return client.get(f"/api/unreconciled-voucher-entries?account_id={context.accounts['1002']}&limit=200")
+
+@scenario('auto_reconcile_dry_run')
+def bench_auto_reconcile(client, context):
+    return client.post(f'/api/bank-statements/{context.statement_id()}/auto-reconcile', json={'dry_run': True})
+
+# 每次请求支付一批尚未支付的账单；账单耗尽后请求返回 400 并计入错误数
+@scenario('payments_execute')
+def bench_payments_execute(client, context):
+    return client.post('/api/payments/execute', json={
+        'bill_ids': context.take_bills(),
+        'bank_account_id': context.accounts['1002'],
+        'payment_method': '银企直连'
+    })
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+def latency_stats(latencies):
+    values = sorted(latencies)
+    if not values:
+        return {}
+    return {
+        'min': round(values[0] * 1000, 3),
+        'mean': round(sum(values) / len(values) * 1000, 3),
+        'p50': round(percentile(values, 50) * 1000, 3),
+        'p90': round(percentile(values, 90) * 1000, 3),
+        'p95': round(percentile(values, 95) * 1000, 3),
+        'p99': round(percentile(values, 99) * 1000, 3),
+        'max': round(values[-1] * 1000, 3),
+    }
+
+# 执行一个场景，返回各请求耗时（秒）、错误状态码和总耗时；每个线程使用独立登录的 test_client，避免会话 Cookie 共享
+def measure_scenario(app, name, context, iterations=50, concurrency=1, warmup=2):
+    func = SCENARIOS[name]
+    clients = context.clients(app, max(concurrency, 1))
+    latencies, errors = [], []
+    remaining = [iterations]
+    lock = threading.Lock()
+
+    def request_once(client):
+        start = time.perf_counter()
+        response = func(client, context)
+        response.get_data()
+        elapsed = time.perf_counter() - start
+        return elapsed, response.status_code
+
+    def worker(client):
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            elapsed, status = request_once(client)
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors.append(status)
+
+    for _ in range(warmup):
+        request_once(clients[0])
+
+    started = time.perf_counter()
+    if len(clients) == 1:
+        worker(clients[0])
+    else:
+        threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+def scenario_result(latencies, errors, seconds):
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'error_statuses': sorted(set(errors)),
+        'seconds': round(seconds, 4),
+        'throughput': round(len(latencies) / seconds, 2) if seconds else None,
+        'latency_ms': latency_stats(latencies)
+    }
+
+# 多个用户时依次压测各用户的账套，合并统计
+def run_benchmark(app, contexts, scenarios=None, iterations=50, concurrency=1, warmup=2):
+    results = {}
+    for name in scenarios or SCENARIOS:
+        if name not in SCENARIOS:
+            raise ValueError(f'未知的压测场景: {name}')
+        latencies, errors, seconds = [], [], 0.0
+        for context in contexts:
+            run_latencies, run_errors, run_seconds = measure_scenario(app, name, context, iterations, concurrency, warmup)
+            latencies += run_latencies
+            errors += run_errors
+            seconds += run_seconds
+        results[name] = scenario_result(latencies, errors, seconds)
+    return results
+
+def benchmark_meta(app, scale, iterations, concurrency, seed):
+    import sqlalchemy
+    from models import db
+
+    with app.app_context():
+        backend = db.engine.dialect.name
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'platform': platform.platform(),
+        'database': backend,
+        'scale': scale,
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'seed': seed
+    }
+
+# 与基线比较指定分位数，变化比例超过阈值的场景判为退化
+def compare_results(current, baseline, metric='p95', threshold=0.2):
+    rows = []
+    for name, result in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base or not base.get('latency_ms') or not result.get('latency_ms'):
+            continue
+        before, after = base['latency_ms'][metric], result['latency_ms'][metric]
+        change = (after - before) / before if before else 0.0
+        rows.append({
+            'scenario': name,
+            'baseline': before,
+            'current': after,
+            'change': round(change, 4),
+            'regressed': change > threshold
+        })
+    return rows
+
+def print_results(results):
+    print(f"{'场景':<26}{'请求数':>8}{'错误':>6}{'吞吐/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results['scenarios'].items():
+        latency = result['latency_ms']
+        print(f"{name:<26}{result['requests']:>8}{result['errors']:>6}{result['throughput']:>10}"
+              f"{latency.get('p50', '-'):>10}{latency.get('p95', '-'):>10}{latency.get('p99', '-'):>10}")
+
+def print_comparison(rows, metric):
+    print(f"\n{'场景':<26}{'基线 ' + metric:>12}{'本次 ' + metric:>12}{'变化':>10}")
+    for row in rows:
+        flag = '  退化' if row['regressed'] else ''
+        print(f"{row['scenario']:<26}{row['baseline']:>12}{row['current']:>12}{row['change'] * 100:>9.1f}%{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description='接口基准测试')
+    for key, value in DEFAULT_SCALE.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=value, help=f'合成数据规模：{key}')
+    parser.add_argument('--iterations', type=int, default=50, help='每个场景的请求次数')
+    parser.add_argument('--concurrency', type=int, default=1, help='并发线程数')
+    parser.add_argument('--warmup', type=int, default=2, help='每个场景不计入统计的预热请求数')
+    parser.add_argument('--payment-batch', type=int, default=10, help='付款场景每次请求支付的账单数')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='只运行指定场景，可重复')
+    parser.add_argument('--seed', type=int, default=42, help='随机数种子')
+    parser.add_argument('--database-url', help='压测数据库，默认使用临时 SQLite 文件')
+    parser.add_argument('--output', help='结果文件路径，默认写入 benchmark-results/')
+    parser.add_argument('--compare', help='基线结果文件')
+    parser.add_argument('--metric', default='p95', choices=('p50', 'p90', 'p95', 'p99', 'mean'), help='比较的延迟指标')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判为退化的变化比例')
+    args = parser.parse_args()
+
+    # 数据库地址须在导入应用前设置
+    temp_dir = None
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        temp_dir = tempfile.TemporaryDirectory(prefix='accounting-benchmark-')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(temp_dir.name, 'benchmark.db')
+    os.environ.setdefault('DEBUG', 'False')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+
+    scale = {key: getattr(args, key) for key in DEFAULT_SCALE}
+    with app.app_context():
+        started = time.perf_counter()
+        contexts, counts = seed_ledger(app, scale, seed=args.seed)
+        seed_seconds = time.perf_counter() - started
+    print(f"合成数据生成完成：{counts['vouchers']} 张凭证，{counts['voucher_entries']} 条分录，耗时 {seed_seconds:.1f}s")
+    for context in contexts:
+        context.payment_batch = args.payment_batch
+
+    results = {
+        'meta': benchmark_meta(app, scale, args.iterations, args.concurrency, args.seed),
+        'seed': dict(counts, seconds=round(seed_seconds, 3)),
+        'scenarios': run_benchmark(app, contexts, args.scenario, args.iterations, args.concurrency, args.warmup)
+    }
+    print_results(results)
+
+    output = args.output
+    if not output:
+        directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark-results')
+        os.makedirs(directory, exist_ok=True)
+        output = os.path.join(directory, f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f'结果已写入 {output}')
+
+    if temp_dir is not None:
+        with app.app_context():
+            from models import db
+            db.engine.dispose()
+        temp_dir.cleanup()
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare_results(results, baseline, args.metric, args.threshold)
+        print_comparison(rows, args.metric)
+        if any(row['regressed'] for row in rows):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
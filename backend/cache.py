@@ -0,0 +1,83 @@
+import threading
+import time
+from sqlalchemy import event
+from models import db
+
+# 进程内短时缓存，多进程部署时各进程独立，依赖较短的过期时间保证最终一致
+class TTLCache:
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+# 仪表盘数据缓存，键为用户ID
+dashboard_cache = TTLCache()
+
+# 税款计算的期间发生额汇总缓存，键为 (用户ID, 会计期间)
+tax_cache = TTLCache()
+
+# 账务变动监听：事务提交后按用户（及受影响期间）通知各缓存失效
+_listeners = []
+
+def on_ledger_change(listener):
+    _listeners.append(listener)
+    return listener
+
+# 记录本事务内发生账务变动的用户和会计期间，提交后统一失效
+def mark_ledger_changed(user_id, periods=()):
+    changes = db.session.info.setdefault('ledger_changes', {})
+    changes.setdefault(user_id, set()).update(periods)
+
+@event.listens_for(db.session, 'after_commit')
+def _notify_ledger_changes(session):
+    changes = session.info.pop('ledger_changes', None)
+    if not changes:
+        return
+    for user_id, periods in changes.items():
+        for listener in _listeners:
+            listener(user_id, periods)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_ledger_changes(session):
+    session.info.pop('ledger_changes', None)
+
+@on_ledger_change
+def _invalidate_dashboard(user_id, periods):
+    dashboard_cache.invalidate(user_id)
+
+# 只失效发生变动的期间；未指明期间（如修改科目编码、删除科目）时失效该用户的全部期间
+@on_ledger_change
+def _invalidate_tax(user_id, periods):
+    if periods:
+        for period in periods:
+            tax_cache.invalidate((user_id, period))
+    else:
+        tax_cache.invalidate_where(lambda key: key[0] == user_id)
@@ -0,0 +1,184 @@
+from datetime import datetime
+from models import db, Account, AccountPeriodBalance, AccountingPeriod, Voucher, VoucherEntry
+from money import ZERO
+from ledger import DEBIT_NORMAL_TYPES, period_key, period_start, period_end, next_period_start, balances_as_of, latest_closed_period, chunked, signed_amount
+from posting import unpost_vouchers
+from voucher_import import insert_vouchers
+from cache import mark_ledger_changed
+
+# 期末结账：将损益类科目截至期末的余额一次性结转至本年利润，12月再将本年利润转入利润分配
+# 结账后补齐全部科目的期间快照并锁定该期间及之前的期间，已结账期间的报表只读取快照
+
+PROFIT_ACCOUNT_CODE = '4103'  # 本年利润
+DISTRIBUTION_ACCOUNT_CODE = '4104'  # 利润分配
+PROFIT_LOSS_TYPES = ('收入', '费用')
+
+class ClosingError(Exception):
+    pass
+
+def parse_period(value):
+    try:
+        start = period_start(value)
+    except (TypeError, ValueError):
+        raise ClosingError('会计期间格式无效，应为 YYYY-MM')
+    if period_key(start) != value:
+        raise ClosingError('会计期间格式无效，应为 YYYY-MM')
+    return value
+
+def _entry(account_id, amount, description, debit_when_positive):
+    direction = '借方' if (amount > 0) == debit_when_positive else '贷方'
+    return {'account_id': account_id, 'direction': direction, 'amount': abs(amount), 'description': description}
+
+# 结转损益分录：收入类借记、费用类贷记（余额为负时方向相反），差额计入本年利润；返回 (分录, 净利润)
+def closing_entries(user_id, moment, profit_account_id):
+    entries = []
+    net_profit = ZERO
+    for row in balances_as_of(user_id, moment, types=PROFIT_LOSS_TYPES):
+        if not row.balance:
+            continue
+        income = row.type not in DEBIT_NORMAL_TYPES
+        entries.append(_entry(row.id, row.balance, f'结转{row.name}', income))
+        net_profit += row.balance if income else -row.balance
+    if net_profit:
+        entries.append(_entry(profit_account_id, net_profit, '结转本期损益', False))
+    return entries, net_profit
+
+def _profit_accounts(user_id):
+    codes = dict(db.session.query(Account.code, Account.id).filter(
+        Account.user_id == user_id,
+        Account.code.in_((PROFIT_ACCOUNT_CODE, DISTRIBUTION_ACCOUNT_CODE))
+    ))
+    for code, name in ((PROFIT_ACCOUNT_CODE, '本年利润'), (DISTRIBUTION_ACCOUNT_CODE, '利润分配')):
+        if code not in codes:
+            raise ClosingError(f'缺少{name}科目（{code}）')
+    return codes[PROFIT_ACCOUNT_CODE], codes[DISTRIBUTION_ACCOUNT_CODE]
+
+# 补齐本期没有发生额的科目的快照行，使已结账期间的任何科目余额都可直接从快照读取
+def _complete_snapshots(user_id, period, moment):
+    existing = {
+        row.account_id for row in db.session.query(AccountPeriodBalance.account_id).filter(
+            AccountPeriodBalance.user_id == user_id,
+            AccountPeriodBalance.period == period
+        )
+    }
+    now = datetime.utcnow()
+    rows = [{
+        'account_id': row.id,
+        'period': period,
+        'opening_balance': row.balance,
+        'debit_total': ZERO,
+        'credit_total': ZERO,
+        'closing_balance': row.balance,
+        'user_id': user_id,
+        'updated_at': now
+    } for row in balances_as_of(user_id, moment) if row.id not in existing]
+    for chunk in chunked(rows):
+        db.session.execute(AccountPeriodBalance.__table__.insert(), chunk)
+    return len(rows)
+
+# 结账：须按期间顺序逐期结账，截至期末的凭证须全部过账；返回结账记录，由调用方提交
+def close_period(user_id, period):
+    parse_period(period)
+    latest = latest_closed_period(user_id)
+    if latest is not None:
+        if period <= latest:
+            raise ClosingError(f'会计期间 {period} 已结账')
+        expected = period_key(next_period_start(latest))
+        if period != expected:
+            raise ClosingError(f'请先结账 {expected}')
+
+    # 本期及之前未结账期间的凭证须全部过账，已结账期间已锁定，不会再有未过账凭证
+    start, end = period_start(period), period_end(period)
+    unposted, earliest = db.session.query(db.func.count(Voucher.id), db.func.min(Voucher.date)).filter(
+        Voucher.user_id == user_id,
+        Voucher.date <= end,
+        db.or_(Voucher.posted == False, Voucher.posted.is_(None))
+    ).one()
+    if unposted:
+        if earliest >= start:
+            raise ClosingError(f'本期还有 {unposted} 张凭证未过账')
+        raise ClosingError(f'截至本期末还有 {unposted} 张凭证未过账（最早在 {period_key(earliest)}）')
+
+    profit_account_id, distribution_account_id = _profit_accounts(user_id)
+    # 结转凭证日期为期末当天
+    voucher_date = datetime(end.year, end.month, end.day)
+    vouchers = []
+    entries, net_profit = closing_entries(user_id, end, profit_account_id)
+    if entries:
+        vouchers.append({'date': voucher_date, 'description': f'{period} 期末结转损益', 'status': '已审核', 'entries': entries})
+
+    # 年末：本年利润余额（含本期结转）全部转入利润分配
+    transfer = ZERO
+    if end.month == 12:
+        profit_row = balances_as_of(user_id, end, codes=[PROFIT_ACCOUNT_CODE]).first()
+        transfer = (profit_row.balance if profit_row else ZERO) + net_profit
+        if transfer:
+            vouchers.append({'date': voucher_date, 'description': f'{end.year} 年度本年利润转入利润分配', 'status': '已审核', 'entries': [
+                _entry(profit_account_id, transfer, '年末结转本年利润', True),
+                _entry(distribution_account_id, transfer, '年末结转本年利润', False)
+            ]})
+
+    voucher_ids = insert_vouchers(user_id, vouchers, post=True) if vouchers else []
+    closing_voucher_id = voucher_ids[0] if entries else None
+    transfer_voucher_id = voucher_ids[-1] if transfer else None
+    _complete_snapshots(user_id, period, end)
+
+    record = AccountingPeriod(
+        user_id=user_id,
+        period=period,
+        closing_voucher_id=closing_voucher_id,
+        transfer_voucher_id=transfer_voucher_id,
+        net_profit=net_profit
+    )
+    db.session.add(record)
+    db.session.flush()
+    mark_ledger_changed(user_id, [period])
+    return record
+
+# 反结账：只能反结账最近一个已结账期间，冲回并删除结账时生成的凭证；由调用方提交
+def reopen_period(user_id, period):
+    parse_period(period)
+    record = AccountingPeriod.query.filter_by(user_id=user_id, period=period).first()
+    if record is None:
+        raise ClosingError(f'会计期间 {period} 未结账')
+    if period != latest_closed_period(user_id):
+        raise ClosingError('只能反结账最近一个已结账期间')
+
+    voucher_ids = [voucher_id for voucher_id in (record.closing_voucher_id, record.transfer_voucher_id) if voucher_id]
+    db.session.delete(record)
+    db.session.flush()
+    if voucher_ids:
+        unpost_vouchers(user_id, voucher_ids)
+        for voucher in Voucher.query.filter(Voucher.id.in_(voucher_ids)):
+            db.session.delete(voucher)
+    mark_ledger_changed(user_id, [period])
+    return voucher_ids
+
+# 科目在已结账期间是否有快照：有则不能再直接调整余额或删除
+def has_closed_snapshots(user_id, account_id):
+    latest = latest_closed_period(user_id)
+    if latest is None:
+        return False
+    return db.session.query(AccountPeriodBalance.id).filter(
+        AccountPeriodBalance.account_id == account_id,
+        AccountPeriodBalance.period <= latest
+    ).first() is not None
+
+# 结转损益凭证对各科目余额的影响：{科目ID: 余额变动}，利润表须剔除，否则已结账期间的损益被结转清零
+def closing_movements(user_id, start=None, end=None):
+    query = db.session.query(
+        VoucherEntry.account_id,
+        db.func.sum(signed_amount())
+    ).join(Voucher, Voucher.id == VoucherEntry.voucher_id).join(
+        Account, Account.id == VoucherEntry.account_id
+    ).join(
+        AccountingPeriod, AccountingPeriod.closing_voucher_id == Voucher.id
+    ).filter(
+        AccountingPeriod.user_id == user_id,
+        Voucher.posted == True
+    )
+    if start is not None:
+        query = query.filter(Voucher.date >= start)
+    if end is not None:
+        query = query.filter(Voucher.date <= end)
+    return {account_id: net or ZERO for account_id, net in query.group_by(VoucherEntry.account_id)}
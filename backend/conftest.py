@@ -0,0 +1,61 @@
+import os
+import sys
+
+# 测试使用内存数据库，避免改动 database/accounting.db
+os.environ['DATABASE_URL'] = 'sqlite://'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import app as flask_app
+from models import db
+from cache import dashboard_cache, tax_cache
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        dashboard_cache.clear()
+        tax_cache.clear()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(client):
+    response = client.post('/api/auth/register', json={
+        'username': 'tester',
+        'email': 'tester@example.com',
+        'password': 'secret',
+        'full_name': 'Tester'
+    })
+    return response.get_json()['user']
+
+
+# 统计代码块内执行的SQL语句
+@pytest.fixture
+def count_queries(app):
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return counter
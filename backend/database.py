@@ -0,0 +1,59 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# 数据库引擎配置：按数据库类型生成连接池参数；SQLite 每个新连接设置 WAL、busy_timeout 等 PRAGMA
+
+def normalize_database_url(url):
+    # 部分托管平台提供 postgres:// 前缀，SQLAlchemy 只识别 postgresql://
+    if url and url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def is_memory_sqlite(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+# 生成 SQLALCHEMY_ENGINE_OPTIONS；内存数据库由 Flask-SQLAlchemy 使用单连接池，不设置连接池参数
+def engine_options(url, pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=1800, busy_timeout=5000):
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite':
+        if is_memory_sqlite(url):
+            return {}
+        return {
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_timeout': pool_timeout,
+            # 连接可在线程间传递（连接池归还后由其他请求线程取用）
+            'connect_args': {'timeout': busy_timeout / 1000, 'check_same_thread': False},
+        }
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': True,
+    }
+
+def sqlite_pragmas(config):
+    return (
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('cache_size', config['SQLITE_CACHE_SIZE']),
+        ('temp_store', 'MEMORY'),
+    )
+
+# 为 SQLite 引擎注册连接事件，每个新建连接执行一次 PRAGMA
+def install_sqlite_pragmas(engine, config):
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
@@ -0,0 +1,145 @@
+from sqlalchemy import event, insert, select, literal, union_all, inspect
+from sqlalchemy.orm import aliased
+from models import db, Account, AccountClosure
+from money import ZERO
+from ledger import chunked, activity_between
+
+# 科目层级：闭包表随 Account 的插入、上级变更和删除自动维护（ORM 映射事件，与科目写入在同一 flush 内执行）
+# 删除科目时其下级科目的 parent_id 由 ORM 置空，按上级变更处理，成为顶级科目
+
+closure = AccountClosure.__table__
+
+def _path_rows(account_id, parent_id):
+    own = select(literal(account_id, db.Integer), literal(account_id, db.Integer), literal(0, db.Integer))
+    if parent_id is None:
+        return own
+    return union_all(
+        select(closure.c.ancestor_id, literal(account_id, db.Integer), closure.c.depth + 1).where(closure.c.descendant_id == parent_id),
+        own
+    )
+
+def insert_account_paths(connection, account_id, parent_id):
+    connection.execute(insert(closure).from_select(['ancestor_id', 'descendant_id', 'depth'], _path_rows(account_id, parent_id)))
+
+# 移动子树：先删除子树与原祖先之间的路径，再与新上级的祖先链做笛卡尔积写入新路径
+def move_subtree(connection, account_id, new_parent_id):
+    subtree = select(closure.c.descendant_id).where(closure.c.ancestor_id == account_id)
+    ancestors = select(closure.c.ancestor_id).where(closure.c.descendant_id == account_id, closure.c.ancestor_id != account_id)
+    connection.execute(closure.delete().where(closure.c.descendant_id.in_(subtree), closure.c.ancestor_id.in_(ancestors)))
+    if new_parent_id is None:
+        return
+    upper = closure.alias('upper_paths')
+    lower = closure.alias('lower_paths')
+    connection.execute(insert(closure).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(upper.c.ancestor_id, lower.c.descendant_id, upper.c.depth + lower.c.depth + 1).select_from(
+            upper.join(lower, db.true())
+        ).where(
+            upper.c.descendant_id == new_parent_id,
+            lower.c.ancestor_id == account_id
+        )
+    ))
+
+@event.listens_for(Account, 'after_insert')
+def account_inserted(mapper, connection, target):
+    insert_account_paths(connection, target.id, target.parent_id)
+
+@event.listens_for(Account, 'after_update')
+def account_updated(mapper, connection, target):
+    if inspect(target).attrs.parent_id.history.has_changes():
+        move_subtree(connection, target.id, target.parent_id)
+
+@event.listens_for(Account, 'before_delete')
+def account_deleted(mapper, connection, target):
+    connection.execute(closure.delete().where(db.or_(closure.c.ancestor_id == target.id, closure.c.descendant_id == target.id)))
+
+# 按 parent_id 重建闭包表（迁移补建或数据修复时使用）；parent_id 成环或指向不存在科目时该科目按顶级处理
+def rebuild_account_closure(user_id=None):
+    query = db.session.query(Account.id, Account.parent_id)
+    if user_id is not None:
+        query = query.filter(Account.user_id == user_id)
+    parents = dict(query.all())
+    rows = []
+    for account_id in parents:
+        depth, current, seen = 0, account_id, set()
+        while current is not None and current in parents and current not in seen:
+            rows.append({'ancestor_id': current, 'descendant_id': account_id, 'depth': depth})
+            seen.add(current)
+            current = parents[current]
+            depth += 1
+    if user_id is None:
+        db.session.execute(closure.delete())
+    else:
+        db.session.execute(closure.delete().where(closure.c.descendant_id.in_(list(parents))))
+    for chunk in chunked(rows, 1000):
+        db.session.execute(insert(closure), chunk)
+    return len(rows)
+
+# 科目自身及全部下级科目的ID子查询，可直接用于 IN 条件
+def subtree_select(account_id):
+    return db.select(AccountClosure.descendant_id).where(AccountClosure.ancestor_id == account_id)
+
+# 科目自身及全部下级科目的ID
+def subtree_ids(account_id):
+    return list(db.session.scalars(subtree_select(account_id)))
+
+# 按上级汇总余额的子查询：每个科目一行，total_balance 为自身及全部下级科目余额之和
+def rollup_subquery(user_id):
+    descendant = aliased(Account)
+    return db.session.query(
+        AccountClosure.ancestor_id.label('account_id'),
+        db.func.coalesce(db.func.sum(descendant.balance), ZERO).label('total_balance'),
+        (db.func.count() - 1).label('descendant_count')
+    ).join(descendant, descendant.id == AccountClosure.descendant_id).filter(
+        descendant.user_id == user_id
+    ).group_by(AccountClosure.ancestor_id).subquery()
+
+# 科目层级深度（顶级为 0）
+def level_subquery(user_id):
+    return db.session.query(
+        AccountClosure.descendant_id.label('account_id'),
+        db.func.max(AccountClosure.depth).label('level')
+    ).join(Account, Account.id == AccountClosure.descendant_id).filter(
+        Account.user_id == user_id
+    ).group_by(AccountClosure.descendant_id).subquery()
+
+# 单次查询返回用户全部科目及其层级、汇总余额，按科目编码排序
+def account_hierarchy(user_id):
+    rollup = rollup_subquery(user_id)
+    levels = level_subquery(user_id)
+    return db.session.query(
+        Account,
+        rollup.c.total_balance,
+        rollup.c.descendant_count,
+        levels.c.level
+    ).outerjoin(rollup, rollup.c.account_id == Account.id).outerjoin(
+        levels, levels.c.account_id == Account.id
+    ).filter(Account.user_id == user_id).order_by(Account.code, Account.id).all()
+
+# 区间发生额按上级汇总：期初、借贷方发生额、期末均为科目自身及全部下级科目之和；max_level 限定输出的层级
+def rollup_activity(user_id, start, end, max_level=None):
+    activity = activity_between(user_id, start, end).order_by(None).subquery()
+    levels = level_subquery(user_id)
+    level = db.func.coalesce(levels.c.level, 0)
+    query = db.session.query(
+        Account.id,
+        Account.code,
+        Account.name,
+        Account.type,
+        Account.parent_id,
+        level.label('level'),
+        (db.func.count() - 1).label('descendant_count'),
+        db.func.sum(activity.c.opening_balance).label('opening_balance'),
+        db.func.sum(activity.c.debit_total).label('debit_total'),
+        db.func.sum(activity.c.credit_total).label('credit_total'),
+        db.func.sum(activity.c.closing_balance).label('closing_balance')
+    ).select_from(AccountClosure).join(
+        activity, activity.c.id == AccountClosure.descendant_id
+    ).join(
+        Account, Account.id == AccountClosure.ancestor_id
+    ).outerjoin(
+        levels, levels.c.account_id == Account.id
+    ).group_by(Account.id, Account.code, Account.name, Account.type, Account.parent_id, levels.c.level)
+    if max_level is not None:
+        query = query.filter(level <= max_level)
+    return query.order_by(Account.code, Account.id)
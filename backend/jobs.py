@@ -0,0 +1,377 @@
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+from xml.etree.ElementTree import ParseError
+from flask import current_app
+from models import db, Job, Voucher, BankStatement
+from money import MoneyJSONProvider
+from ledger import chunked
+from cache import mark_ledger_changed
+from posting import post_vouchers
+from payments import prepare_payment_run, execute_payment_run, PaymentRunError
+from voucher_import import import_vouchers, detect_format as detect_voucher_format, IMPORT_FORMATS
+from statement_import import import_statement_file, detect_format as detect_statement_format, StatementParseError, STATEMENT_FORMATS
+from ledger_export import export_general_ledger, EXPORT_FORMATS
+
+# 后台任务：jobs 表即任务队列，接口只负责入队并返回任务ID，worker.py 进程领取执行
+# 任务通过 context.progress 汇报进度并在检查点响应取消；进度、心跳和取消请求不随处理函数的事务提交：
+# 其他数据库通过独立连接读写 jobs 表并立即提交；SQLite 整库只有一个写锁，处理函数事务未提交时其他连接无法写入，
+# 执行中任务的进度、心跳写入任务目录下的状态文件，取消请求写入取消标记文件，任务结束时进度写回 jobs 表
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+# 需要上传文件的任务类型
+FILE_JOB_KINDS = ('voucher_import', 'statement_import')
+POST_JOB_CHUNK_SIZE = 500
+
+JOB_HANDLERS = {}
+
+# 任务在检查点发现取消请求时抛出，当前事务回滚
+class JobCancelled(Exception):
+    pass
+
+# 参数或业务校验失败，消息写入任务的 error 字段
+class JobError(ValueError):
+    pass
+
+def job_handler(kind):
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+# 执行中任务的状态文件与取消标记文件后缀
+STATE_SUFFIX = '.state'
+CANCEL_SUFFIX = '.cancel'
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, default=MoneyJSONProvider.default)
+
+# 任务文件（上传的导入文件、导出结果）存放位置
+def job_file_path(job_id, suffix):
+    directory = current_app.config['JOB_FILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'job-{job_id}{suffix}')
+
+# 入队：由调用方提交
+def enqueue_job(user_id, kind, params=None):
+    if kind not in JOB_HANDLERS:
+        raise JobError(f'不支持的任务类型: {kind}')
+    job = Job(user_id=user_id, kind=kind, status='queued', params=_dumps(params or {}))
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+def _uses_state_files():
+    return db.engine.dialect.name == 'sqlite'
+
+def read_job_state(job_id):
+    try:
+        with open(job_file_path(job_id, STATE_SUFFIX), encoding='utf-8') as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return None
+
+# 先写临时文件再替换，读取方不会读到写了一半的内容
+def _write_job_state(job_id, state):
+    path = job_file_path(job_id, STATE_SUFFIX)
+    with open(path + '.tmp', 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+    os.replace(path + '.tmp', path)
+
+def _cancel_marked(job_id):
+    return os.path.exists(job_file_path(job_id, CANCEL_SUFFIX))
+
+class JobContext:
+    def __init__(self, job):
+        self.job_id = job.id
+        self.user_id = job.user_id
+        self.params = json.loads(job.params) if job.params else {}
+
+    def progress(self, done, total=None):
+        now = datetime.utcnow()
+        if _uses_state_files():
+            _write_job_state(self.job_id, {'progress_done': done, 'progress_total': total, 'heartbeat_at': now.isoformat()})
+        else:
+            jobs = Job.__table__
+            with db.engine.begin() as connection:
+                connection.execute(jobs.update().where(jobs.c.id == self.job_id).values(
+                    progress_done=done,
+                    progress_total=total,
+                    heartbeat_at=now
+                ))
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if _uses_state_files():
+            cancelled = _cancel_marked(self.job_id)
+        else:
+            jobs = Job.__table__
+            with db.engine.connect() as connection:
+                cancelled = connection.execute(db.select(jobs.c.cancel_requested).where(jobs.c.id == self.job_id)).scalar()
+        if cancelled:
+            raise JobCancelled()
+
+# 任务详情：执行中的任务以状态文件中的最新进度和取消标记为准
+def job_to_dict(job):
+    data = job.to_dict()
+    if job.status == 'running':
+        state = read_job_state(job.id)
+        if state:
+            data['progress_done'] = state['progress_done']
+            data['progress_total'] = state['progress_total']
+        data['cancel_requested'] = bool(job.cancel_requested) or _cancel_marked(job.id)
+    return data
+
+# 领取最早入队的任务；以状态为条件更新，多个工作进程同时领取时只有一个成功
+def claim_job(worker_id):
+    jobs = Job.__table__
+    while True:
+        job_id = db.session.query(Job.id).filter(Job.status == 'queued').order_by(Job.id).limit(1).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+        now = datetime.utcnow()
+        claimed = db.session.execute(jobs.update().where(jobs.c.id == job_id, jobs.c.status == 'queued').values(
+            status='running',
+            worker_id=worker_id,
+            started_at=now,
+            heartbeat_at=now
+        )).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+
+def _finish(job_id, status, result=None, error=None):
+    jobs = Job.__table__
+    values = {'status': status, 'finished_at': datetime.utcnow(), 'error': error[:500] if error else None}
+    if result is not None:
+        values['result'] = _dumps(result)
+    state = read_job_state(job_id)
+    if state:
+        values['progress_done'] = state['progress_done']
+        values['progress_total'] = state['progress_total']
+    db.session.execute(jobs.update().where(jobs.c.id == job_id).values(**values))
+    db.session.commit()
+    _remove(job_file_path(job_id, STATE_SUFFIX))
+    _remove(job_file_path(job_id, CANCEL_SUFFIX))
+
+def run_job(job):
+    context = JobContext(job)
+    try:
+        context.check_cancelled()
+        result = JOB_HANDLERS[job.kind](context)
+        db.session.commit()
+    except JobCancelled:
+        db.session.rollback()
+        _finish(context.job_id, 'cancelled')
+        return
+    except JobError as e:
+        db.session.rollback()
+        _finish(context.job_id, 'failed', error=str(e))
+        return
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('任务 %s 执行失败', context.job_id)
+        _finish(context.job_id, 'failed', error=f'{type(e).__name__}: {e}')
+        return
+    _finish(context.job_id, 'succeeded', result=result)
+
+# 领取并执行一个任务，返回任务ID；无任务时返回 None
+def run_next_job(worker_id):
+    job = claim_job(worker_id)
+    if job is None:
+        return None
+    job_id = job.id
+    run_job(job)
+    return job_id
+
+def _mark_cancel(job_id):
+    with open(job_file_path(job_id, CANCEL_SUFFIX), 'w', encoding='utf-8'):
+        pass
+
+# 取消：排队中的任务直接取消，执行中的任务在下一个检查点停止；由调用方提交
+# SQLite 下执行中的任务占用写锁，只写取消标记文件，不等待写锁
+def cancel_job(job):
+    jobs = Job.__table__
+    if _uses_state_files() and job.status == 'running':
+        _mark_cancel(job.id)
+        return
+    db.session.execute(jobs.update().where(jobs.c.id == job.id, jobs.c.status == 'queued').values(
+        status='cancelled',
+        cancel_requested=True,
+        finished_at=datetime.utcnow()
+    ))
+    db.session.execute(jobs.update().where(jobs.c.id == job.id, jobs.c.status == 'running').values(cancel_requested=True))
+    db.session.refresh(job)
+    # 更新前已被工作进程领取
+    if _uses_state_files() and job.status == 'running':
+        _mark_cancel(job.id)
+
+# 工作进程异常退出后遗留的执行中任务：超过心跳超时的标记为失败（付款等任务不可安全重放）
+# 心跳以状态文件中较新的时间为准
+def fail_stale_jobs(timeout_seconds):
+    jobs = Job.__table__
+    deadline = datetime.utcnow() - timedelta(seconds=timeout_seconds)
+    stale_ids = []
+    for row in db.session.query(Job.id).filter(Job.status == 'running', Job.heartbeat_at < deadline):
+        state = read_job_state(row.id)
+        if state is None or datetime.fromisoformat(state['heartbeat_at']) < deadline:
+            stale_ids.append(row.id)
+    if not stale_ids:
+        db.session.commit()
+        return 0
+    count = db.session.execute(jobs.update().where(jobs.c.id.in_(stale_ids), jobs.c.status == 'running').values(
+        status='failed',
+        error='工作进程中断',
+        finished_at=datetime.utcnow()
+    )).rowcount
+    db.session.commit()
+    for job_id in stale_ids:
+        _remove(job_file_path(job_id, STATE_SUFFIX))
+        _remove(job_file_path(job_id, CANCEL_SUFFIX))
+    return count
+
+# 月末批量过账：按块过账并逐块提交，取消后已过账的块保持过账
+@job_handler('post_vouchers')
+def run_post_vouchers(context):
+    params = context.params
+    query = db.session.query(Voucher.id).filter(
+        Voucher.user_id == context.user_id,
+        db.or_(Voucher.posted == False, Voucher.posted.is_(None))
+    )
+    if params.get('voucher_ids'):
+        try:
+            voucher_ids = sorted({int(voucher_id) for voucher_id in params['voucher_ids']})
+        except (TypeError, ValueError):
+            raise JobError('凭证ID无效')
+    else:
+        try:
+            if params.get('date_from'):
+                query = query.filter(Voucher.date >= datetime.fromisoformat(params['date_from']))
+            if params.get('date_to'):
+                query = query.filter(Voucher.date < datetime.fromisoformat(params['date_to'][:10]) + timedelta(days=1))
+        except ValueError:
+            raise JobError('日期格式无效')
+        voucher_ids = [row.id for row in query.order_by(Voucher.id)]
+
+    posted_ids, skipped_ids = [], []
+    context.progress(0, len(voucher_ids))
+    for chunk in chunked(voucher_ids, POST_JOB_CHUNK_SIZE):
+        posted, skipped = post_vouchers(context.user_id, chunk)
+        posted_ids.extend(posted)
+        skipped_ids.extend(skipped)
+        mark_ledger_changed(context.user_id)
+        context.progress(len(posted_ids) + len(skipped_ids), len(voucher_ids))
+        db.session.commit()
+    return {'posted_count': len(posted_ids), 'skipped_count': len(skipped_ids), 'skipped_ids': skipped_ids}
+
+# 批量付款：整批在一个事务内，取消时全部回滚
+@job_handler('payment_run')
+def run_payment(context):
+    try:
+        bank_account, payables = prepare_payment_run(context.user_id, context.params)
+    except PaymentRunError as e:
+        raise JobError(str(e))
+    run = execute_payment_run(
+        context.user_id,
+        bank_account,
+        payables,
+        payment_method=context.params.get('payment_method', '银企直连'),
+        consolidate=bool(context.params.get('consolidate')),
+        progress=context.progress
+    )
+    mark_ledger_changed(context.user_id)
+    return run
+
+def _flag(value):
+    return value is True or str(value).lower() in ('1', 'true')
+
+# 凭证导入：上传文件由接口保存到任务目录，导入完成后删除；已提交的批次在取消后保留
+@job_handler('voucher_import')
+def run_voucher_import(context):
+    params = context.params
+    try:
+        file_format = params.get('format') or detect_voucher_format(params.get('filename'), params.get('content_type'))
+        if file_format not in IMPORT_FORMATS:
+            raise JobError('无法识别的导入格式，支持 csv、jsonl')
+        with open(params['path'], 'rb') as stream:
+            result = import_vouchers(context.user_id, stream, file_format, post=_flag(params.get('post')), progress=context.progress)
+    finally:
+        _remove(params['path'])
+    processed = result['imported_count'] + result['error_count']
+    context.progress(processed, processed)
+    return result
+
+# 对账单导入：整个文件在一个事务内，取消时全部回滚
+@job_handler('statement_import')
+def run_statement_import(context):
+    params = context.params
+    try:
+        try:
+            statement_id = int(params.get('bank_statement_id'))
+        except (TypeError, ValueError):
+            raise JobError('银行对账单不存在')
+        statement = BankStatement.query.filter_by(id=statement_id, user_id=context.user_id).first()
+        if statement is None:
+            raise JobError('银行对账单不存在')
+        file_format = params.get('format') or detect_statement_format(params.get('filename'), params.get('content_type'))
+        if file_format not in STATEMENT_FORMATS:
+            raise JobError('无法识别的对账单格式，支持 csv、mt940、camt053')
+        with open(params['path'], 'rb') as stream:
+            try:
+                result = import_statement_file(statement, stream, file_format, progress=context.progress)
+            except (StatementParseError, ParseError) as e:
+                raise JobError(f'对账单文件解析失败: {e}')
+    finally:
+        _remove(params['path'])
+    context.progress(result['line_count'], result['line_count'])
+    return result
+
+# 总账导出：写入任务文件，完成后通过下载接口获取
+@job_handler('general_ledger_export')
+def run_general_ledger_export(context):
+    params = context.params
+    file_format = params.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        raise JobError('不支持的导出格式，支持 csv、jsonl、xlsx')
+    try:
+        date_from = datetime.fromisoformat(params['from']) if params.get('from') else None
+        date_to = datetime.fromisoformat(params['to']) if params.get('to') else None
+    except ValueError:
+        raise JobError('日期格式无效')
+    if date_to and len(params['to']) == 10:
+        date_to = date_to.replace(hour=23, minute=59, second=59, microsecond=999999)
+    mimetype, extension = EXPORT_FORMATS[file_format]
+    path = export_file_path(context.job_id, extension)
+    size = 0
+    try:
+        with open(path, 'wb') as output:
+            for chunk in export_general_ledger(context.user_id, file_format, date_from, date_to, params.get('account_id')):
+                output.write(chunk)
+                size += len(chunk)
+                context.check_cancelled()
+    except BaseException:
+        _remove(path)
+        raise
+    return {
+        'filename': 'general-ledger-{}-{}.{}'.format(
+            date_from.strftime('%Y%m%d') if date_from else 'all',
+            date_to.strftime('%Y%m%d') if date_to else datetime.now().strftime('%Y%m%d'),
+            extension
+        ),
+        'mimetype': mimetype,
+        'size': size
+    }
+
+def export_file_path(job_id, extension):
+    return job_file_path(job_id, f'.{extension}')
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
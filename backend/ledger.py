@@ -0,0 +1,408 @@
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam
+from models import db, Account, AccountPeriodBalance, AccountingPeriod, Voucher, VoucherEntry
+from money import Money, ZERO
+from cache import mark_ledger_changed
+
+# 科目期间余额快照：维护与按时点查询余额
+
+# 资产和费用类：借方增加，贷方减少；负债、权益、收入类：贷方增加，借方减少
+DEBIT_NORMAL_TYPES = ('资产', '费用')
+
+# 会计期间格式，与税务申报所属期一致
+PERIOD_FORMAT = '%Y-%m'
+
+# IN 查询分批大小，避免超过SQLite参数个数限制
+CHUNK_SIZE = 500
+
+def chunked(values, size=CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def period_key(value):
+    return value.strftime(PERIOD_FORMAT)
+
+def period_start(period):
+    return datetime.strptime(period, PERIOD_FORMAT)
+
+# 期间最后一刻（含），与报表截止日期按当天 23:59:59.999999 取值一致
+def period_end(period):
+    return next_period_start(period) - timedelta(microseconds=1)
+
+class PeriodClosedError(Exception):
+    pass
+
+# 最近一个已结账期间，未结账过时为 None
+def latest_closed_period(user_id):
+    return db.session.query(db.func.max(AccountingPeriod.period)).filter(AccountingPeriod.user_id == user_id).scalar()
+
+# 已结账期间（最近一个已结账期间及之前）不允许再有凭证变动
+def ensure_periods_open(user_id, periods):
+    latest = latest_closed_period(user_id)
+    if latest is None:
+        return
+    closed = sorted(period for period in periods if period <= latest)
+    if closed:
+        raise PeriodClosedError(f'会计期间 {closed[0]} 已结账，不能修改')
+
+# SQL表达式：日期所属会计期间
+def period_of(column):
+    if db.engine.dialect.name == 'postgresql':
+        return db.func.to_char(column, 'YYYY-MM')
+    return db.func.strftime('%Y-%m', column)
+
+# 分录对科目余额的带符号影响（过账方向）
+def signed_amount():
+    return db.case(
+        (Account.type.in_(DEBIT_NORMAL_TYPES),
+         db.case((VoucherEntry.direction == '借方', VoucherEntry.amount), else_=-VoucherEntry.amount)),
+        else_=db.case((VoucherEntry.direction == '借方', -VoucherEntry.amount), else_=VoucherEntry.amount)
+    )
+
+def debit_amount():
+    return db.case((VoucherEntry.direction == '借方', VoucherEntry.amount), else_=0)
+
+def credit_amount():
+    return db.case((VoucherEntry.direction == '贷方', VoucherEntry.amount), else_=0)
+
+# 汇总凭证分录按科目、期间的发生额：{(account_id, period): [借方, 贷方, 余额变动]}
+def voucher_period_deltas(voucher_ids):
+    deltas = {}
+    period = period_of(Voucher.date)
+    for chunk in chunked(voucher_ids):
+        rows = db.session.query(
+            VoucherEntry.account_id,
+            period,
+            db.func.sum(debit_amount()),
+            db.func.sum(credit_amount()),
+            db.func.sum(signed_amount())
+        ).join(Voucher, Voucher.id == VoucherEntry.voucher_id).join(
+            Account, Account.id == VoucherEntry.account_id
+        ).filter(
+            VoucherEntry.voucher_id.in_(chunk)
+        ).group_by(VoucherEntry.account_id, period)
+        for account_id, row_period, debit, credit, net in rows:
+            total = deltas.setdefault((account_id, row_period), [0, 0, 0])
+            total[0] += debit or 0
+            total[1] += credit or 0
+            total[2] += net or 0
+    return deltas
+
+# 将期间发生额写入快照，sign=-1 表示冲回；须在更新 Account.balance 之前调用
+def apply_period_deltas(period_deltas, sign=1):
+    if not period_deltas:
+        return
+    account_ids = {account_id for account_id, _ in period_deltas}
+
+    accounts = {}
+    existing = {}
+    for chunk in chunked(account_ids):
+        for account in db.session.query(Account.id, Account.balance, Account.user_id).filter(Account.id.in_(chunk)):
+            accounts[account.id] = account
+        rows = db.session.query(
+            AccountPeriodBalance.account_id,
+            AccountPeriodBalance.period,
+            AccountPeriodBalance.opening_balance,
+            AccountPeriodBalance.closing_balance
+        ).filter(AccountPeriodBalance.account_id.in_(chunk)).order_by(AccountPeriodBalance.period)
+        for row in rows:
+            existing.setdefault(row.account_id, []).append(row)
+
+    # 已结账期间的快照不可变，变动在写入前整体拒绝
+    user_periods = {}
+    for account_id, period in period_deltas:
+        user_periods.setdefault(accounts[account_id].user_id, set()).add(period)
+    for user_id, periods in user_periods.items():
+        ensure_periods_open(user_id, periods)
+
+    # 补建缺失期间：期初取前一期期末，否则取后一期期初，否则取当前余额
+    new_rows = []
+    for account_id, period in sorted(period_deltas):
+        rows = existing.get(account_id, [])
+        if any(row.period == period for row in rows):
+            continue
+        previous = [row for row in rows if row.period < period]
+        following = [row for row in rows if row.period > period]
+        if previous:
+            base = previous[-1].closing_balance
+        elif following:
+            base = following[0].opening_balance
+        else:
+            base = accounts[account_id].balance or ZERO
+        new_rows.append({
+            'account_id': account_id,
+            'period': period,
+            'opening_balance': base,
+            'debit_total': ZERO,
+            'credit_total': ZERO,
+            'closing_balance': base,
+            'user_id': accounts[account_id].user_id,
+            'updated_at': datetime.utcnow()
+        })
+    if new_rows:
+        db.session.execute(AccountPeriodBalance.__table__.insert(), new_rows)
+
+    for account_id, period in period_deltas:
+        mark_ledger_changed(accounts[account_id].user_id, [period])
+
+    # 本期发生额与期末余额
+    table = AccountPeriodBalance.__table__
+    now = datetime.utcnow()
+    db.session.execute(
+        table.update().where(
+            table.c.account_id == bindparam('b_account_id'),
+            table.c.period == bindparam('b_period')
+        ).values(
+            debit_total=table.c.debit_total + bindparam('b_debit'),
+            credit_total=table.c.credit_total + bindparam('b_credit'),
+            closing_balance=table.c.closing_balance + bindparam('b_net'),
+            updated_at=now
+        ),
+        [
+            {'b_account_id': account_id, 'b_period': period, 'b_debit': debit * sign, 'b_credit': credit * sign, 'b_net': net * sign}
+            for (account_id, period), (debit, credit, net) in period_deltas.items()
+        ]
+    )
+    # 后续期间的期初、期末同步顺延
+    params = [
+        {'b_account_id': account_id, 'b_period': period, 'b_net': net * sign}
+        for (account_id, period), (debit, credit, net) in period_deltas.items() if net
+    ]
+    if params:
+        db.session.execute(
+            table.update().where(
+                table.c.account_id == bindparam('b_account_id'),
+                table.c.period > bindparam('b_period')
+            ).values(
+                opening_balance=table.c.opening_balance + bindparam('b_net'),
+                closing_balance=table.c.closing_balance + bindparam('b_net'),
+                updated_at=now
+            ),
+            params
+        )
+
+# 直接调整科目余额（如手工修改期初）时，整体平移该科目的快照
+def shift_account_balance(account_id, delta):
+    if not delta:
+        return
+    AccountPeriodBalance.query.filter_by(account_id=account_id).update({
+        AccountPeriodBalance.opening_balance: AccountPeriodBalance.opening_balance + delta,
+        AccountPeriodBalance.closing_balance: AccountPeriodBalance.closing_balance + delta
+    }, synchronize_session=False)
+
+# 查询科目在某一时点的余额：定位快照行，只需扫描该期间内的分录
+def balance_at(account_id, at):
+    period = period_key(at)
+    row = AccountPeriodBalance.query.filter(
+        AccountPeriodBalance.account_id == account_id,
+        AccountPeriodBalance.period <= period
+    ).order_by(AccountPeriodBalance.period.desc()).first()
+
+    if row is None:
+        following = AccountPeriodBalance.query.filter(
+            AccountPeriodBalance.account_id == account_id,
+            AccountPeriodBalance.period > period
+        ).order_by(AccountPeriodBalance.period).first()
+        if following:
+            return following.opening_balance
+        account = db.session.get(Account, account_id)
+        return account.balance if account else ZERO
+
+    if row.period < period or at >= period_end(period):
+        return row.closing_balance
+
+    delta = db.session.query(db.func.sum(signed_amount())).select_from(VoucherEntry).join(
+        Voucher, Voucher.id == VoucherEntry.voucher_id
+    ).join(Account, Account.id == VoucherEntry.account_id).filter(
+        VoucherEntry.account_id == account_id,
+        Voucher.posted == True,
+        Voucher.date >= period_start(period),
+        Voucher.date <= at
+    ).scalar()
+    return row.opening_balance + (delta or 0)
+
+# 科目在某一时点之前（不含该时点）的余额；未指定时点时为最早一笔过账之前的期初余额
+def balance_before(account_id, moment=None):
+    if moment is not None:
+        return balance_at(account_id, moment - timedelta(microseconds=1))
+    first = AccountPeriodBalance.query.filter_by(account_id=account_id).order_by(AccountPeriodBalance.period).first()
+    if first is not None:
+        return first.opening_balance
+    account = db.session.get(Account, account_id)
+    return account.balance if account else ZERO
+
+# 明细账一页：按 (日期, 凭证ID, 分录ID) 升序的已过账分录，after 为上一页最后一行的键
+# 先在子查询中按键集取出本页，再对本页行用窗口函数累计余额，起点为 seed，每页耗时与总行数无关
+def ledger_page(account, start=None, end=None, after=None, seed=ZERO, limit=50):
+    change = db.case((VoucherEntry.direction == '借方', VoucherEntry.amount), else_=-VoucherEntry.amount)
+    if account.type not in DEBIT_NORMAL_TYPES:
+        change = -change
+    query = db.select(
+        VoucherEntry.id.label('entry_id'),
+        Voucher.id.label('voucher_id'),
+        Voucher.voucher_no,
+        Voucher.date,
+        Voucher.description.label('voucher_description'),
+        VoucherEntry.description,
+        VoucherEntry.direction,
+        VoucherEntry.amount,
+        change.label('change')
+    ).select_from(VoucherEntry).join(Voucher, Voucher.id == VoucherEntry.voucher_id).where(
+        VoucherEntry.account_id == account.id,
+        Voucher.user_id == account.user_id,
+        Voucher.posted == True
+    )
+    if start is not None:
+        query = query.where(Voucher.date >= start)
+    if end is not None:
+        query = query.where(Voucher.date <= end)
+    if after is not None:
+        after_date, after_voucher_id, after_entry_id = after
+        query = query.where(db.or_(
+            Voucher.date > after_date,
+            db.and_(Voucher.date == after_date, Voucher.id > after_voucher_id),
+            db.and_(Voucher.date == after_date, Voucher.id == after_voucher_id, VoucherEntry.id > after_entry_id)
+        ))
+    page = query.order_by(Voucher.date, Voucher.id, VoucherEntry.id).limit(limit).subquery()
+    order = (page.c.date, page.c.voucher_id, page.c.entry_id)
+    running = db.func.sum(page.c.change).over(order_by=order, rows=(None, 0))
+    return db.session.execute(
+        db.select(page, (db.literal(seed, Money()) + running).label('balance')).order_by(*order)
+    ).all()
+
+# 根据已过账分录重建快照（用于历史数据初始化或纠偏），期初余额由当前余额倒推
+def rebuild_period_balances(account_ids=None):
+    account_query = db.session.query(Account.id, Account.balance, Account.user_id)
+    if account_ids is not None:
+        account_query = account_query.filter(Account.id.in_(list(account_ids)))
+    accounts = {account.id: account for account in account_query}
+
+    for chunk in chunked(accounts):
+        AccountPeriodBalance.query.filter(AccountPeriodBalance.account_id.in_(chunk)).delete(synchronize_session=False)
+
+    period = period_of(Voucher.date)
+    activity = {}
+    for chunk in chunked(accounts):
+        rows = db.session.query(
+            VoucherEntry.account_id,
+            period,
+            db.func.sum(debit_amount()),
+            db.func.sum(credit_amount()),
+            db.func.sum(signed_amount())
+        ).join(Voucher, Voucher.id == VoucherEntry.voucher_id).join(
+            Account, Account.id == VoucherEntry.account_id
+        ).filter(
+            Voucher.posted == True,
+            VoucherEntry.account_id.in_(chunk)
+        ).group_by(VoucherEntry.account_id, period)
+        for account_id, row_period, debit, credit, net in rows:
+            activity.setdefault(account_id, []).append((row_period, debit or 0, credit or 0, net or 0))
+
+    new_rows = []
+    now = datetime.utcnow()
+    for account_id, periods in activity.items():
+        account = accounts[account_id]
+        periods.sort()
+        running = (account.balance or ZERO) - sum(net for _, _, _, net in periods)
+        for row_period, debit, credit, net in periods:
+            new_rows.append({
+                'account_id': account_id,
+                'period': row_period,
+                'opening_balance': running,
+                'debit_total': debit,
+                'credit_total': credit,
+                'closing_balance': running + net,
+                'user_id': account.user_id,
+                'updated_at': now
+            })
+            running += net
+    for chunk in chunked(new_rows):
+        db.session.execute(AccountPeriodBalance.__table__.insert(), chunk)
+    return len(new_rows)
+
+def next_period_start(period):
+    start = period_start(period)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+# 子查询：某一时点之后的已过账发生额（按科目汇总）
+# 完整期间取自快照，时点所在期间只扫描该期间剩余的分录；时点恰为期初或期末时不扫描分录
+def movement_after(user_id, moment, inclusive=False):
+    period = period_key(moment)
+    whole_period = inclusive and moment == period_start(period)
+    later = db.select(
+        AccountPeriodBalance.account_id.label('account_id'),
+        AccountPeriodBalance.debit_total.label('debit'),
+        AccountPeriodBalance.credit_total.label('credit'),
+        (AccountPeriodBalance.closing_balance - AccountPeriodBalance.opening_balance).label('net')
+    ).where(
+        AccountPeriodBalance.user_id == user_id,
+        AccountPeriodBalance.period >= period if whole_period else AccountPeriodBalance.period > period
+    )
+    tail = db.select(
+        VoucherEntry.account_id.label('account_id'),
+        debit_amount().label('debit'),
+        credit_amount().label('credit'),
+        signed_amount().label('net')
+    ).select_from(VoucherEntry).join(
+        Voucher, Voucher.id == VoucherEntry.voucher_id
+    ).join(
+        Account, Account.id == VoucherEntry.account_id
+    ).where(
+        Voucher.user_id == user_id,
+        Voucher.posted == True,
+        Voucher.date >= moment if inclusive else Voucher.date > moment,
+        Voucher.date < next_period_start(period)
+    )
+    if whole_period or (not inclusive and moment >= period_end(period)):
+        combined = later.subquery()
+    else:
+        combined = db.union_all(later, tail).subquery()
+    return db.select(
+        combined.c.account_id,
+        db.func.sum(combined.c.debit).label('debit'),
+        db.func.sum(combined.c.credit).label('credit'),
+        db.func.sum(combined.c.net).label('net')
+    ).group_by(combined.c.account_id).subquery()
+
+def _filter_accounts(query, user_id, types=None, codes=None):
+    query = query.filter(Account.user_id == user_id)
+    if types:
+        query = query.filter(Account.type.in_(types))
+    if codes:
+        query = query.filter(Account.code.in_(codes))
+    return query.order_by(Account.code, Account.id)
+
+# 各科目在某一时点的余额：当前余额减去该时点之后的发生额，单条SQL完成
+def balances_as_of(user_id, moment, types=None, codes=None):
+    after = movement_after(user_id, moment)
+    query = db.session.query(
+        Account.id,
+        Account.code,
+        Account.name,
+        Account.type,
+        Account.parent_id,
+        (db.func.coalesce(Account.balance, 0) - db.func.coalesce(after.c.net, 0)).label('balance')
+    ).outerjoin(after, after.c.account_id == Account.id)
+    return _filter_accounts(query, user_id, types, codes)
+
+# 各科目在 [start, end] 区间的期初余额、借贷方发生额和期末余额，单条SQL完成
+def activity_between(user_id, start, end, types=None, codes=None):
+    since_start = movement_after(user_id, start, inclusive=True)
+    after_end = movement_after(user_id, end)
+    query = db.session.query(
+        Account.id,
+        Account.code,
+        Account.name,
+        Account.type,
+        Account.parent_id,
+        (db.func.coalesce(Account.balance, 0) - db.func.coalesce(since_start.c.net, 0)).label('opening_balance'),
+        (db.func.coalesce(since_start.c.debit, 0) - db.func.coalesce(after_end.c.debit, 0)).label('debit_total'),
+        (db.func.coalesce(since_start.c.credit, 0) - db.func.coalesce(after_end.c.credit, 0)).label('credit_total'),
+        (db.func.coalesce(Account.balance, 0) - db.func.coalesce(after_end.c.net, 0)).label('closing_balance')
+    ).outerjoin(
+        since_start, since_start.c.account_id == Account.id
+    ).outerjoin(
+        after_end, after_end.c.account_id == Account.id
+    )
+    return _filter_accounts(query, user_id, types, codes)
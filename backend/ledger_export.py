@@ -0,0 +1,191 @@
+import io
+import csv
+import json
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+from sqlalchemy import select
+from models import db, Account, Voucher, VoucherEntry
+from money import ZERO, MoneyJSONProvider
+
+# 总账导出：按批次游标读取已过账分录（yield_per），逐块生成 CSV / JSON Lines / XLSX，
+# 内存占用与总账行数无关
+
+EXPORT_YIELD_PER = 1000
+EXPORT_CHUNK_ROWS = 500
+
+# (列名, 表头)
+LEDGER_COLUMNS = (
+    ('date', '日期'),
+    ('voucher_no', '凭证号'),
+    ('voucher_description', '凭证摘要'),
+    ('account_code', '科目编码'),
+    ('account_name', '科目名称'),
+    ('account_type', '科目类型'),
+    ('direction', '方向'),
+    ('debit', '借方金额'),
+    ('credit', '贷方金额'),
+    ('entry_description', '分录摘要'),
+    ('voucher_id', '凭证ID'),
+    ('entry_id', '分录ID'),
+)
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+def general_ledger_rows(user_id, start=None, end=None, account_id=None):
+    statement = select(
+        Voucher.date,
+        Voucher.voucher_no,
+        Voucher.description.label('voucher_description'),
+        Account.code.label('account_code'),
+        Account.name.label('account_name'),
+        Account.type.label('account_type'),
+        VoucherEntry.direction,
+        VoucherEntry.amount,
+        VoucherEntry.description.label('entry_description'),
+        Voucher.id.label('voucher_id'),
+        VoucherEntry.id.label('entry_id')
+    ).join(Voucher, Voucher.id == VoucherEntry.voucher_id).join(
+        Account, Account.id == VoucherEntry.account_id
+    ).where(
+        Voucher.user_id == user_id,
+        Voucher.posted == True
+    ).order_by(Voucher.date, Voucher.id, VoucherEntry.id)
+    if start:
+        statement = statement.where(Voucher.date >= start)
+    if end:
+        statement = statement.where(Voucher.date <= end)
+    if account_id:
+        statement = statement.where(VoucherEntry.account_id == account_id)
+
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_YIELD_PER))
+    for row in result:
+        yield {
+            'date': row.date.date().isoformat() if row.date else None,
+            'voucher_no': row.voucher_no,
+            'voucher_description': row.voucher_description,
+            'account_code': row.account_code,
+            'account_name': row.account_name,
+            'account_type': row.account_type,
+            'direction': row.direction,
+            'debit': row.amount if row.direction == '借方' else ZERO,
+            'credit': row.amount if row.direction == '贷方' else ZERO,
+            'entry_description': row.entry_description,
+            'voucher_id': row.voucher_id,
+            'entry_id': row.entry_id
+        }
+
+def _chunks(rows, size=EXPORT_CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # 带BOM，Excel直接打开中文不乱码
+    buffer.write('\ufeff')
+    writer.writerow([title for _, title in LEDGER_COLUMNS])
+    for chunk in _chunks(rows):
+        writer.writerows([row[key] for key, _ in LEDGER_COLUMNS] for row in chunk)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def iter_jsonl(rows):
+    for chunk in _chunks(rows):
+        yield ''.join(json.dumps(row, ensure_ascii=False, default=MoneyJSONProvider.default) + '\n' for row in chunk).encode('utf-8')
+
+# 只写、不可定位的缓冲区，zipfile 会改用数据描述符顺序写出
+class _ZipStream(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+XLSX_STATIC_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="总账" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+     '</Relationships>'),
+)
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+# 以内联字符串写出单个工作表，工作表XML随行生成、随块压缩输出
+def iter_xlsx(rows):
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS:
+            archive.writestr(name, content)
+        yield stream.drain()
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_row(title for _, title in LEDGER_COLUMNS)
+            ).encode('utf-8'))
+            for chunk in _chunks(rows):
+                sheet.write(''.join(_xlsx_row(row[key] for key, _ in LEDGER_COLUMNS) for row in chunk).encode('utf-8'))
+                data = stream.drain()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield stream.drain()
+
+WRITERS = {
+    'csv': iter_csv,
+    'jsonl': iter_jsonl,
+    'xlsx': iter_xlsx,
+}
+
+def export_general_ledger(user_id, file_format, start=None, end=None, account_id=None):
+    return WRITERS[file_format](general_ledger_rows(user_id, start, end, account_id))
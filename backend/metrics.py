@@ -0,0 +1,210 @@
+import time
+import logging
+import threading
+from flask import g, request, has_request_context, current_app, Response
+from sqlalchemy import event
+from money import MoneyJSONProvider
+
+# 请求级性能统计：通过引擎事件累计每个请求的 SQL 条数和耗时，请求结束时按路由汇总
+# /metrics 以 Prometheus 文本格式输出；统计保存在进程内，多进程部署时由采集端按实例汇总
+
+logger = logging.getLogger(__name__)
+
+# 请求耗时直方图分桶（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestMetrics:
+    def __init__(self, max_statements):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.statements = []
+        self.max_statements = max_statements
+        self.status = None
+
+    def add_query(self, statement, seconds):
+        self.query_count += 1
+        self.db_seconds += seconds
+        if len(self.statements) < self.max_statements:
+            self.statements.append((statement, seconds))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+class _Series:
+    __slots__ = ('count', 'duration', 'db_duration', 'queries', 'rows', 'slow', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.db_duration = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.slow = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+# 按 (方法, 路由, 状态码) 汇总；路由使用 URL 规则而不是实际路径，避免标签无限增长
+class MetricsRegistry:
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, endpoint, status, metrics, duration, slow):
+        with self._lock:
+            series = self._series.get((method, endpoint, status))
+            if series is None:
+                series = self._series[(method, endpoint, status)] = _Series()
+            series.count += 1
+            series.duration += duration
+            series.db_duration += metrics.db_seconds
+            series.queries += metrics.query_count
+            series.rows += metrics.rows
+            series.slow += int(slow)
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    series.buckets[index] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return sorted(
+                (key, (series.count, series.duration, series.db_duration, series.queries, series.rows, series.slow, list(series.buckets)))
+                for key, series in self._series.items()
+            )
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+registry = MetricsRegistry()
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_label(value)}"' for name, value in labels.items()) + '}'
+
+def render_prometheus(snapshot):
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+
+    def by_series(name, index):
+        return [
+            f'{name}{_labels(method=method, endpoint=endpoint, status=status)} {values[index]}'
+            for (method, endpoint, status), values in snapshot
+        ]
+
+    metric('accounting_http_requests_total', 'counter', 'HTTP requests handled.', by_series('accounting_http_requests_total', 0))
+    histogram = []
+    for (method, endpoint, status), values in snapshot:
+        count, duration, buckets = values[0], values[1], values[6]
+        for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+            histogram.append(f'accounting_http_request_duration_seconds_bucket{_labels(method=method, endpoint=endpoint, status=status, le=bound)} {bucket_count}')
+        histogram.append(f'accounting_http_request_duration_seconds_bucket{_labels(method=method, endpoint=endpoint, status=status, le="+Inf")} {count}')
+        histogram.append(f'accounting_http_request_duration_seconds_sum{_labels(method=method, endpoint=endpoint, status=status)} {duration:.6f}')
+        histogram.append(f'accounting_http_request_duration_seconds_count{_labels(method=method, endpoint=endpoint, status=status)} {count}')
+    metric('accounting_http_request_duration_seconds', 'histogram', 'HTTP request duration in seconds.', histogram)
+    metric('accounting_db_queries_total', 'counter', 'SQL statements executed while handling requests.', by_series('accounting_db_queries_total', 3))
+    metric('accounting_db_query_duration_seconds_total', 'counter', 'Time spent executing SQL while handling requests.', [
+        f'accounting_db_query_duration_seconds_total{_labels(method=method, endpoint=endpoint, status=status)} {values[2]:.6f}'
+        for (method, endpoint, status), values in snapshot
+    ])
+    metric('accounting_serialized_rows_total', 'counter', 'Rows serialized into JSON responses.', by_series('accounting_serialized_rows_total', 4))
+    metric('accounting_slow_requests_total', 'counter', 'Requests slower than SLOW_REQUEST_MS.', by_series('accounting_slow_requests_total', 5))
+    return '\n'.join(lines) + '\n'
+
+def current_metrics():
+    if has_request_context():
+        return g.get('request_metrics')
+    return None
+
+# 响应中的记录数：列表按元素计，对象按其中列表字段的元素合计（如分页接口的 vouchers），其余按 1 计
+def count_rows(obj):
+    if isinstance(obj, (list, tuple)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(len(value) for value in obj.values() if isinstance(value, list)) or 1
+    return 1
+
+# 在 JSON 响应生成时统计序列化的记录数
+class MetricsJSONProvider(MoneyJSONProvider):
+    def response(self, *args, **kwargs):
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.rows += count_rows(args[0] if len(args) == 1 else (args or kwargs))
+        return super().response(*args, **kwargs)
+
+def install_engine_events(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.add_query(statement, time.perf_counter() - started)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('query_started'):
+            connection.info['query_started'].pop()
+
+def _server_timing(metrics):
+    return 'db;dur={:.1f};desc="{} queries", app;dur={:.1f}'.format(
+        metrics.db_seconds * 1000, metrics.query_count, metrics.elapsed() * 1000
+    )
+
+def install_request_hooks(app):
+    @app.before_request
+    def start_request_metrics():
+        g.request_metrics = RequestMetrics(app.config['SLOW_REQUEST_LOG_QUERIES'])
+
+    @app.after_request
+    def finish_request_metrics(response):
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.status = response.status_code
+            if app.config['METRICS_SERVER_TIMING']:
+                response.headers['Server-Timing'] = _server_timing(metrics)
+        return response
+
+    # 流式响应在输出结束后才执行 teardown，统计包含流式输出期间的查询
+    @app.teardown_request
+    def record_request_metrics(exc):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return
+        duration = metrics.elapsed()
+        status = metrics.status or 500
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        slow = duration * 1000 >= app.config['SLOW_REQUEST_MS']
+        registry.record(request.method, endpoint, status, metrics, duration, slow)
+        if slow:
+            logger.warning(
+                '慢请求 %s %s -> %s 耗时 %.1fms，SQL %d 条共 %.1fms，序列化 %d 条记录\n%s',
+                request.method, request.path, status, duration * 1000, metrics.query_count, metrics.db_seconds * 1000, metrics.rows,
+                '\n'.join(f'  [{seconds * 1000:.1f}ms] {statement}' for statement, seconds in metrics.statements)
+            )
+
+# 指标含各路由的SQL条数与耗时，未配置 METRICS_TOKEN 时接口不开放
+def metrics_endpoint():
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        return {'message': '未配置 METRICS_TOKEN，指标接口未开放'}, 403
+    if request.headers.get('Authorization') != f'Bearer {token}':
+        return {'message': '未授权'}, 401
+    return Response(render_prometheus(registry.snapshot()), mimetype='text/plain; version=0.0.4')
+
+def install_metrics(app, engine):
+    if not app.config['METRICS_ENABLED']:
+        return
+    install_engine_events(engine)
+    install_request_hooks(app)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
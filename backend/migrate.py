@@ -0,0 +1,84 @@
+import os
+import re
+import importlib.util
+from datetime import datetime
+from sqlalchemy import inspect, text
+from models import db
+
+# 版本化数据库迁移：migrations/NNNN_name.py 按版本号顺序执行，已执行的版本记录在 schema_migrations 表
+# 全新数据库直接按当前模型建表，并将所有迁移标记为已执行
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+def load_migrations():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        version, name = match.groups()
+        spec = importlib.util.spec_from_file_location(f'migrations.m{version}', os.path.join(MIGRATIONS_DIR, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        migrations.append((version, name, module))
+    return migrations
+
+def _ensure_migrations_table():
+    db.session.execute(text('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(20) PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+    '''))
+
+def applied_versions():
+    _ensure_migrations_table()
+    return {row.version for row in db.session.execute(text('SELECT version FROM schema_migrations'))}
+
+def _record(version, name):
+    db.session.execute(
+        text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)'),
+        {'version': version, 'name': name, 'applied_at': datetime.utcnow()}
+    )
+
+# 需在应用上下文中调用，返回本次执行的迁移版本列表
+def upgrade_database():
+    fresh = 'users' not in inspect(db.engine).get_table_names()
+    # 先补建新增的表，迁移只负责修改已有表结构和回填数据
+    db.create_all()
+    done = applied_versions()
+    db.session.commit()
+
+    applied = []
+    for version, name, module in load_migrations():
+        if version in done:
+            continue
+        try:
+            if not fresh:
+                module.upgrade(db.session.connection())
+            _record(version, name)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+def migration_status():
+    done = applied_versions()
+    db.session.commit()
+    return [(version, name, version in done) for version, name, _ in load_migrations()]
+
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    with app.app_context():
+        # 导入 app 时已自动执行迁移，这里再次执行以便输出结果
+        if len(sys.argv) < 2 or sys.argv[1] != 'status':
+            upgrade_database()
+        for version, name, applied in migration_status():
+            print(f"{version} {name} {'已执行' if applied else '待执行'}")
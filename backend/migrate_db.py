@@ -1,6 +0,0 @@
-from app import app
-from models import db
-
-with app.app_context():
-    db.create_all()
-    print("数据库表创建成功！")
@@ -0,0 +1,51 @@
+from sqlalchemy import inspect, text
+
+# payments 表增加税务申报、采购订单关联，bill_id 允许为空（原 update_db.py / update_payment_table.py）
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    columns = {column['name']: column for column in inspector.get_columns('payments')}
+
+    if 'tax_declaration_id' not in columns:
+        conn.execute(text('ALTER TABLE payments ADD COLUMN tax_declaration_id INTEGER REFERENCES tax_declarations(id)'))
+    if 'purchase_order_id' not in columns:
+        conn.execute(text('ALTER TABLE payments ADD COLUMN purchase_order_id INTEGER REFERENCES purchase_orders(id)'))
+
+    if columns['bill_id']['nullable']:
+        return
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text('ALTER TABLE payments ALTER COLUMN bill_id DROP NOT NULL'))
+        return
+
+    # SQLite 不支持修改字段约束，需要重建表
+    conn.execute(text('''
+        CREATE TABLE payments_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bill_id INTEGER,
+            voucher_id INTEGER,
+            payment_date DATETIME,
+            amount FLOAT NOT NULL,
+            payment_method VARCHAR(20) NOT NULL,
+            bank_account_id INTEGER,
+            receipt_number VARCHAR(100),
+            status VARCHAR(20) DEFAULT 'pending',
+            user_id INTEGER,
+            created_at DATETIME,
+            updated_at DATETIME,
+            tax_declaration_id INTEGER,
+            purchase_order_id INTEGER,
+            FOREIGN KEY (bill_id) REFERENCES bills(id),
+            FOREIGN KEY (voucher_id) REFERENCES vouchers(id),
+            FOREIGN KEY (bank_account_id) REFERENCES accounts(id),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (tax_declaration_id) REFERENCES tax_declarations(id),
+            FOREIGN KEY (purchase_order_id) REFERENCES purchase_orders(id)
+        )
+    '''))
+    conn.execute(text('''
+        INSERT INTO payments_new (id, bill_id, voucher_id, payment_date, amount, payment_method, bank_account_id, receipt_number, status, user_id, created_at, updated_at, tax_declaration_id, purchase_order_id)
+        SELECT id, bill_id, voucher_id, payment_date, amount, payment_method, bank_account_id, receipt_number, status, user_id, created_at, updated_at, tax_declaration_id, purchase_order_id
+        FROM payments
+    '''))
+    conn.execute(text('DROP TABLE payments'))
+    conn.execute(text('ALTER TABLE payments_new RENAME TO payments'))
@@ -0,0 +1,8 @@
+from sqlalchemy import inspect, text
+
+# tax_declarations 表增加 tax_rate 字段（原 add_tax_rate_field.py）
+
+def upgrade(conn):
+    columns = [column['name'] for column in inspect(conn).get_columns('tax_declarations')]
+    if 'tax_rate' not in columns:
+        conn.execute(text('ALTER TABLE tax_declarations ADD COLUMN tax_rate FLOAT DEFAULT 0.0'))
@@ -0,0 +1,31 @@
+from sqlalchemy import text
+
+# 为按用户过滤、按日期分页、按科目/凭证关联的查询补充组合索引，与 models.py 中的 __table_args__ 保持一致
+
+INDEXES = (
+    ('ix_accounts_user_type', 'accounts', 'user_id, type'),
+    ('ix_accounts_user_code', 'accounts', 'user_id, code'),
+    ('ix_accounts_parent', 'accounts', 'parent_id'),
+    ('ix_vouchers_user_date', 'vouchers', 'user_id, date, id'),
+    ('ix_vouchers_user_status', 'vouchers', 'user_id, status'),
+    ('ix_vouchers_user_posted_date', 'vouchers', 'user_id, posted, date'),
+    ('ix_voucher_entries_voucher', 'voucher_entries', 'voucher_id'),
+    ('ix_voucher_entries_account_voucher', 'voucher_entries', 'account_id, voucher_id'),
+    ('ix_vendors_user', 'vendors', 'user_id'),
+    ('ix_bank_statements_user', 'bank_statements', 'user_id'),
+    ('ix_bank_statement_items_statement', 'bank_statement_items', 'bank_statement_id'),
+    ('ix_bank_statement_items_voucher_entry', 'bank_statement_items', 'voucher_entry_id'),
+    ('ix_purchase_orders_user_status', 'purchase_orders', 'user_id, status'),
+    ('ix_purchase_order_items_order', 'purchase_order_items', 'purchase_order_id'),
+    ('ix_tax_declarations_user_status', 'tax_declarations', 'user_id, status'),
+    ('ix_bills_user_status', 'bills', 'user_id, status'),
+    ('ix_payments_user', 'payments', 'user_id'),
+    ('ix_payments_bill', 'payments', 'bill_id'),
+    ('ix_account_period_balances_user_period', 'account_period_balances', 'user_id, period'),
+)
+
+def upgrade(conn):
+    for name, table, columns in INDEXES:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text('ANALYZE'))
@@ -0,0 +1,11 @@
+from models import AccountPeriodBalance, Voucher
+from ledger import rebuild_period_balances
+
+# 为升级前已有的过账数据补建科目期间余额快照
+
+def upgrade(conn):
+    if AccountPeriodBalance.query.first() is not None:
+        return
+    if Voucher.query.filter(Voucher.posted == True).first() is None:
+        return
+    rebuild_period_balances()
@@ -0,0 +1,30 @@
+from sqlalchemy import inspect, text
+
+# bank_statements 表增加明细笔数、已对账笔数、已对账金额计数，并按现有明细回填
+
+def upgrade(conn):
+    columns = [column['name'] for column in inspect(conn).get_columns('bank_statements')]
+    if 'item_count' not in columns:
+        conn.execute(text('ALTER TABLE bank_statements ADD COLUMN item_count INTEGER NOT NULL DEFAULT 0'))
+    if 'reconciled_count' not in columns:
+        conn.execute(text('ALTER TABLE bank_statements ADD COLUMN reconciled_count INTEGER NOT NULL DEFAULT 0'))
+    if 'reconciled_amount' not in columns:
+        conn.execute(text('ALTER TABLE bank_statements ADD COLUMN reconciled_amount FLOAT NOT NULL DEFAULT 0.0'))
+
+    conn.execute(text('''
+        UPDATE bank_statements SET
+            item_count = (
+                SELECT COUNT(*) FROM bank_statement_items
+                WHERE bank_statement_items.bank_statement_id = bank_statements.id
+            ),
+            reconciled_count = (
+                SELECT COUNT(*) FROM bank_statement_items
+                WHERE bank_statement_items.bank_statement_id = bank_statements.id
+                AND bank_statement_items.reconciled = :reconciled
+            ),
+            reconciled_amount = (
+                SELECT COALESCE(SUM(amount), 0) FROM bank_statement_items
+                WHERE bank_statement_items.bank_statement_id = bank_statements.id
+                AND bank_statement_items.reconciled = :reconciled
+            )
+    '''), {'reconciled': True})
@@ -0,0 +1,37 @@
+from datetime import date
+from sqlalchemy import inspect, text, bindparam
+from statement_import import line_hash
+
+# bank_statement_items 表增加 line_hash 字段及索引，并为已有明细回填哈希
+
+INDEXES = (
+    ('ix_bank_statement_items_line_hash', 'bank_statement_items', 'line_hash'),
+)
+BATCH_SIZE = 1000
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+def upgrade(conn):
+    columns = [column['name'] for column in inspect(conn).get_columns('bank_statement_items')]
+    if 'line_hash' not in columns:
+        conn.execute(text('ALTER TABLE bank_statement_items ADD COLUMN line_hash VARCHAR(64)'))
+    for name, table, indexed in INDEXES:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({indexed})'))
+
+    update = text('UPDATE bank_statement_items SET line_hash = :b_hash WHERE id = :b_id').bindparams(
+        bindparam('b_hash'), bindparam('b_id')
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, transaction_date, amount, description, balance FROM bank_statement_items '
+            'WHERE line_hash IS NULL AND id > :last_id ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            break
+        conn.execute(update, [{
+            'b_id': row.id,
+            'b_hash': line_hash(_as_date(row.transaction_date), row.amount, row.description, row.balance)
+        } for row in rows])
+        last_id = rows[-1].id
@@ -0,0 +1,37 @@
+from sqlalchemy import inspect, text
+from models import Voucher
+from ledger import rebuild_period_balances
+
+# 金额字段由浮点元改为整数分存储；随后按换算后的金额重建期间余额快照
+# SQLite 不重建表，原 FLOAT 列中存放整数分（REAL 可精确表示 2^53 以内的整数）
+
+MONEY_COLUMNS = (
+    ('accounts', ('balance',)),
+    ('account_period_balances', ('opening_balance', 'debit_total', 'credit_total', 'closing_balance')),
+    ('voucher_entries', ('amount',)),
+    ('bank_statements', ('opening_balance', 'closing_balance', 'reconciled_amount')),
+    ('bank_statement_items', ('amount', 'balance')),
+    ('purchase_order_items', ('unit_price',)),
+    ('tax_declarations', ('taxable_income', 'input_tax', 'output_tax', 'taxable_amount', 'deduction_amount', 'tax_payable')),
+    ('bills', ('amount',)),
+    ('payments', ('amount',)),
+)
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    postgresql = conn.dialect.name == 'postgresql'
+    for table, columns in MONEY_COLUMNS:
+        existing = {column['name']: column for column in inspector.get_columns(table)}
+        for column in columns:
+            if column not in existing:
+                continue
+            # create_all 新建的表已是整数列，无需换算
+            if existing[column]['type'].python_type is int:
+                continue
+            if postgresql:
+                conn.execute(text(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT USING ROUND({column} * 100)'))
+            else:
+                conn.execute(text(f'UPDATE {table} SET {column} = ROUND({column} * 100)'))
+
+    if Voucher.query.filter(Voucher.posted == True).first() is not None:
+        rebuild_period_balances()
@@ -0,0 +1,12 @@
+from sqlalchemy import text
+
+# 后台任务表 jobs 由 create_all 创建，此处补齐其索引
+
+INDEXES = (
+    ('ix_jobs_status', 'jobs', 'status, id'),
+    ('ix_jobs_user_created', 'jobs', 'user_id, created_at'),
+)
+
+def upgrade(conn):
+    for name, table, columns in INDEXES:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
@@ -0,0 +1,15 @@
+from sqlalchemy import text
+from models import AccountClosure
+from hierarchy import rebuild_account_closure
+
+# 科目层级闭包表 account_closure 由 create_all 创建，此处补齐索引并按现有 parent_id 补建路径
+
+INDEXES = (
+    ('ix_account_closure_descendant', 'account_closure', 'descendant_id, depth'),
+)
+
+def upgrade(conn):
+    for name, table, columns in INDEXES:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+    if AccountClosure.query.first() is None:
+        rebuild_account_closure()
@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import json
 import bcrypt
+from money import Money, ZERO
 
 # 创建数据库实例
 db = SQLAlchemy()
@@ -47,13 +49,19 @@ class Account(db.Model):
     type = db.Column(db.String(20), nullable=False)  # 资产、负债、权益、收入、费用
     parent_id = db.Column(db.Integer, db.ForeignKey('accounts.id'))
     description = db.Column(db.String(200))
-    balance = db.Column(db.Float, default=0.0)
+    balance = db.Column(Money, default=ZERO)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     parent = db.relationship('Account', remote_side=[id], backref='children')
     
+    __table_args__ = (
+        db.Index('ix_accounts_user_type', 'user_id', 'type'),
+        db.Index('ix_accounts_user_code', 'user_id', 'code'),
+        db.Index('ix_accounts_parent', 'parent_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -65,8 +73,92 @@ class Account(db.Model):
             'balance': self.balance,
             'user_id': self.user_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'children': [child.to_dict() for child in self.children] if self.children else []
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# 科目层级闭包表：每对祖先-后代科目一行（含自身，depth 为 0），由 hierarchy.py 随科目增删改维护
+# 子树、祖先链和上级汇总余额均为单次查询，不需要逐层递归
+class AccountClosure(db.Model):
+    __tablename__ = 'account_closure'
+    
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)  # 祖先到后代的层级差
+    
+    __table_args__ = (
+        db.Index('ix_account_closure_descendant', 'descendant_id', 'depth'),
+    )
+
+# 科目期间余额快照：每个科目每个会计期间（YYYY-MM）一行，过账/取消过账时增量维护
+class AccountPeriodBalance(db.Model):
+    __tablename__ = 'account_period_balances'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    period = db.Column(db.String(7), nullable=False)  # 会计期间，格式如：2025-12
+    opening_balance = db.Column(Money, nullable=False, default=ZERO)  # 期初余额
+    debit_total = db.Column(Money, nullable=False, default=ZERO)  # 本期借方发生额
+    credit_total = db.Column(Money, nullable=False, default=ZERO)  # 本期贷方发生额
+    closing_balance = db.Column(Money, nullable=False, default=ZERO)  # 期末余额
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'period', name='uq_account_period_balances_account_period'),
+        db.Index('ix_account_period_balances_user_period', 'user_id', 'period'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'account_id': self.account_id,
+            'period': self.period,
+            'opening_balance': self.opening_balance,
+            'debit_total': self.debit_total,
+            'credit_total': self.credit_total,
+            'closing_balance': self.closing_balance,
+            'user_id': self.user_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# 单据编号计数器：按用户、单据类型、日期分别计数
+class DocumentSequence(db.Model):
+    __tablename__ = 'document_sequences'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    doc_type = db.Column(db.String(20), nullable=False)  # voucher, purchase_order, bill, payment
+    day = db.Column(db.String(8), nullable=False)  # 格式如：20251201
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'doc_type', 'day', name='uq_document_sequences_user_type_day'),
+    )
+
+# 会计期间结账记录：最近一个已结账期间及之前的期间全部锁定
+class AccountingPeriod(db.Model):
+    __tablename__ = 'accounting_periods'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    period = db.Column(db.String(7), nullable=False)  # 已结账的会计期间，格式如：2025-12
+    closing_voucher_id = db.Column(db.Integer, db.ForeignKey('vouchers.id'))  # 结转损益凭证，本期无损益时为空
+    transfer_voucher_id = db.Column(db.Integer, db.ForeignKey('vouchers.id'))  # 年末本年利润转入利润分配的凭证
+    net_profit = db.Column(Money, nullable=False, default=ZERO)  # 本期结转的净利润（截至期末的损益类科目余额）
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'period', name='uq_accounting_periods_user_period'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'period': self.period,
+            'closing_voucher_id': self.closing_voucher_id,
+            'transfer_voucher_id': self.transfer_voucher_id,
+            'net_profit': self.net_profit,
+            'closed_at': self.closed_at.isoformat() if self.closed_at else None
         }
 
 class Voucher(db.Model):
@@ -85,6 +177,12 @@ class Voucher(db.Model):
     
     entries = db.relationship('VoucherEntry', backref='voucher', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_vouchers_user_date', 'user_id', 'date', 'id'),
+        db.Index('ix_vouchers_user_status', 'user_id', 'status'),
+        db.Index('ix_vouchers_user_posted_date', 'user_id', 'posted', 'date'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -107,11 +205,16 @@ class VoucherEntry(db.Model):
     voucher_id = db.Column(db.Integer, db.ForeignKey('vouchers.id'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
     direction = db.Column(db.String(10), nullable=False)  # 借方或贷方
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
     description = db.Column(db.String(200))
     
     account = db.relationship('Account')
     
+    __table_args__ = (
+        db.Index('ix_voucher_entries_voucher', 'voucher_id'),
+        db.Index('ix_voucher_entries_account_voucher', 'account_id', 'voucher_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -137,6 +240,10 @@ class Vendor(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_vendors_user', 'user_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -158,9 +265,12 @@ class BankStatement(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
     statement_date = db.Column(db.Date, nullable=False)
-    opening_balance = db.Column(db.Float, nullable=False, default=0.0)
-    closing_balance = db.Column(db.Float, nullable=False, default=0.0)
+    opening_balance = db.Column(Money, nullable=False, default=ZERO)
+    closing_balance = db.Column(Money, nullable=False, default=ZERO)
     status = db.Column(db.String(20), default='待对账')  # 待对账、已对账、已完成
+    item_count = db.Column(db.Integer, nullable=False, default=0)  # 明细笔数
+    reconciled_count = db.Column(db.Integer, nullable=False, default=0)  # 已对账笔数
+    reconciled_amount = db.Column(Money, nullable=False, default=ZERO)  # 已对账金额合计
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -169,6 +279,10 @@ class BankStatement(db.Model):
     account = db.relationship('Account', backref='bank_statements')
     items = db.relationship('BankStatementItem', backref='bank_statement', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_bank_statements_user', 'user_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -178,6 +292,9 @@ class BankStatement(db.Model):
             'opening_balance': self.opening_balance,
             'closing_balance': self.closing_balance,
             'status': self.status,
+            'item_count': self.item_count,
+            'reconciled_count': self.reconciled_count,
+            'reconciled_amount': self.reconciled_amount,
             'user_id': self.user_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
@@ -192,16 +309,23 @@ class BankStatementItem(db.Model):
     bank_statement_id = db.Column(db.Integer, db.ForeignKey('bank_statements.id'), nullable=False)
     transaction_date = db.Column(db.Date, nullable=False)
     description = db.Column(db.String(200), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    balance = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
+    balance = db.Column(Money, nullable=False)
     reconciled = db.Column(db.Boolean, default=False)  # 是否已对账
     voucher_entry_id = db.Column(db.Integer, db.ForeignKey('voucher_entries.id'))
+    line_hash = db.Column(db.String(64))  # 日期、金额、摘要、余额的哈希，用于导入去重
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关联关系
     voucher_entry = db.relationship('VoucherEntry', backref='bank_statement_items')
     
+    __table_args__ = (
+        db.Index('ix_bank_statement_items_statement', 'bank_statement_id'),
+        db.Index('ix_bank_statement_items_voucher_entry', 'voucher_entry_id'),
+        db.Index('ix_bank_statement_items_line_hash', 'line_hash'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -234,6 +358,10 @@ class PurchaseOrder(db.Model):
     vendor = db.relationship('Vendor', backref='purchase_orders')
     items = db.relationship('PurchaseOrderItem', backref='purchase_order', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_purchase_orders_user_status', 'user_id', 'status'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -257,7 +385,7 @@ class PurchaseOrderItem(db.Model):
     purchase_order_id = db.Column(db.Integer, db.ForeignKey('purchase_orders.id'), nullable=False)
     product_name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Float, nullable=False, default=1.0)
-    unit_price = db.Column(db.Float, nullable=False, default=0.0)
+    unit_price = db.Column(Money, nullable=False, default=ZERO)
     account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'))
     description = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -266,6 +394,10 @@ class PurchaseOrderItem(db.Model):
     # 关联关系
     account = db.relationship('Account', backref='purchase_order_items')
     
+    __table_args__ = (
+        db.Index('ix_purchase_order_items_order', 'purchase_order_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -287,13 +419,13 @@ class TaxDeclaration(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     period = db.Column(db.String(20), nullable=False)  # 申报所属期，格式如：2025-12
     tax_type = db.Column(db.String(50), nullable=False)  # 税种，如：增值税、企业所得税、附加税
-    taxable_income = db.Column(db.Float, default=0.0)  # 应税收入
+    taxable_income = db.Column(Money, default=ZERO)  # 应税收入
     tax_rate = db.Column(db.Float, default=0.0)  # 税率（百分比）
-    input_tax = db.Column(db.Float, default=0.0)  # 进项税额
-    output_tax = db.Column(db.Float, default=0.0)  # 销项税额
-    taxable_amount = db.Column(db.Float, default=0.0)  # 应纳税所得额
-    deduction_amount = db.Column(db.Float, default=0.0)  # 减免税额
-    tax_payable = db.Column(db.Float, default=0.0)  # 应纳税额
+    input_tax = db.Column(Money, default=ZERO)  # 进项税额
+    output_tax = db.Column(Money, default=ZERO)  # 销项税额
+    taxable_amount = db.Column(Money, default=ZERO)  # 应纳税所得额
+    deduction_amount = db.Column(Money, default=ZERO)  # 减免税额
+    tax_payable = db.Column(Money, default=ZERO)  # 应纳税额
     status = db.Column(db.String(20), default='pending')  # pending, submitted, success, failed
     declaration_time = db.Column(db.DateTime)  # 申报时间
     receipt_number = db.Column(db.String(100))  # 税务系统回执号
@@ -305,6 +437,10 @@ class TaxDeclaration(db.Model):
     # 关联关系
     user = db.relationship('User', backref='tax_declarations')
     
+    __table_args__ = (
+        db.Index('ix_tax_declarations_user_status', 'user_id', 'status'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -335,7 +471,7 @@ class Bill(db.Model):
     bill_no = db.Column(db.String(20), nullable=False, unique=True)  # 账单编号
     vendor_id = db.Column(db.Integer, db.ForeignKey('vendors.id'), nullable=False)  # 供应商ID
     purchase_order_id = db.Column(db.Integer, db.ForeignKey('purchase_orders.id'))  # 关联采购订单
-    amount = db.Column(db.Float, nullable=False)  # 账单金额
+    amount = db.Column(Money, nullable=False)  # 账单金额
     due_date = db.Column(db.Date, nullable=False)  # 到期日期
     status = db.Column(db.String(20), default='待核对')  # 待核对、已核对待付款、已支付
     description = db.Column(db.String(200))  # 描述
@@ -348,6 +484,10 @@ class Bill(db.Model):
     purchase_order = db.relationship('PurchaseOrder', backref='bills')
     payments = db.relationship('Payment', backref='bill', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_bills_user_status', 'user_id', 'status'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -375,7 +515,7 @@ class Payment(db.Model):
     purchase_order_id = db.Column(db.Integer, db.ForeignKey('purchase_orders.id'), nullable=True)  # 关联采购订单，可为空
     voucher_id = db.Column(db.Integer, db.ForeignKey('vouchers.id'))  # 关联凭证
     payment_date = db.Column(db.DateTime, default=datetime.utcnow)  # 付款日期
-    amount = db.Column(db.Float, nullable=False)  # 付款金额
+    amount = db.Column(Money, nullable=False)  # 付款金额
     payment_method = db.Column(db.String(20), nullable=False)  # 付款方式
     bank_account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'))  # 付款银行账户
     receipt_number = db.Column(db.String(100))  # 银行回执号
@@ -390,6 +530,11 @@ class Payment(db.Model):
     tax_declaration = db.relationship('TaxDeclaration', backref='payments')
     purchase_order = db.relationship('PurchaseOrder', backref='payments')
     
+    __table_args__ = (
+        db.Index('ix_payments_user', 'user_id'),
+        db.Index('ix_payments_bill', 'bill_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -413,3 +558,43 @@ class Payment(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+# 后台任务模型：数据库即任务队列，由 worker.py 进程领取执行
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)  # 任务类型，如：post_vouchers、payment_run
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    params = db.Column(db.Text)  # 任务参数（JSON）
+    result = db.Column(db.Text)  # 任务结果（JSON）
+    error = db.Column(db.String(500))  # 失败原因
+    progress_done = db.Column(db.Integer, nullable=False, default=0)  # 已处理数量
+    progress_total = db.Column(db.Integer)  # 总数量，未知时为空
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)  # 已请求取消
+    worker_id = db.Column(db.String(100))  # 执行该任务的工作进程
+    heartbeat_at = db.Column(db.DateTime)  # 工作进程最近一次汇报进度的时间
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_jobs_status', 'status', 'id'),
+        db.Index('ix_jobs_user_created', 'user_id', 'created_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'progress_done': self.progress_done,
+            'progress_total': self.progress_total,
+            'cancel_requested': self.cancel_requested,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
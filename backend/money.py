@@ -0,0 +1,63 @@
+from decimal import Decimal, ROUND_HALF_UP
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import types, Integer, Numeric
+from sqlalchemy.sql import operators
+
+# 金额定点表示：数据库中以整数分存储，Python 中为保留两位小数的 Decimal
+# 求和、加减在 SQL 中按整数精确计算，不再有浮点误差累积
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+# 任意输入（字符串、整数、浮点数、Decimal）转为两位小数的 Decimal，四舍五入
+def to_money(value):
+    if value is None or value == '':
+        return ZERO
+    if isinstance(value, float):
+        value = repr(value)
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+def to_cents(value):
+    return int(to_money(value).scaleb(2))
+
+def from_cents(cents):
+    return Decimal(int(round(cents))).scaleb(-2)
+
+class Money(types.TypeDecorator):
+    impl = types.BigInteger
+    cache_ok = True
+
+    # 金额之间加减仍为金额；未指定类型的绑定参数按金额处理
+    class comparator_factory(types.TypeDecorator.Comparator):
+        def _adapt_expression(self, op, other_comparator):
+            if op in (operators.add, operators.sub) and isinstance(other_comparator.type, Money):
+                return op, self.type
+            return super()._adapt_expression(op, other_comparator)
+
+    # 乘除的另一方是普通数值（数量、倍数），不能换算成分
+    def coerce_compared_value(self, op, value):
+        if op in (operators.mul, operators.truediv, operators.floordiv, operators.mod):
+            return Integer() if isinstance(value, int) else Numeric()
+        return self
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return from_cents(value)
+
+# 金额乘以数量（如采购单价×数量），结果按分四舍五入
+def money_mul(amount, quantity):
+    return to_money(to_money(amount) * Decimal(str(quantity or 0)))
+
+# JSON 中金额输出为数字
+class MoneyJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return DefaultJSONProvider.default(o)
@@ -0,0 +1,211 @@
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, Account, Voucher, VoucherEntry, PurchaseOrder, TaxDeclaration, Bill, Payment
+from serializers import PURCHASE_ORDER_LOAD_OPTIONS, TAX_DECLARATION_LOAD_OPTIONS, BILL_LOAD_OPTIONS, purchase_order_amount
+from sequences import next_number, next_numbers
+from posting import post_vouchers
+from ledger import chunked
+from money import ZERO
+
+# 付款批次：一次性解析应付账款/应交税费科目，按批次批量写入付款记录、凭证及分录，
+# 可合并为每次付款一张凭证；全部写入在一个事务内，由调用方提交
+
+PAYMENT_BATCH_SIZE = 500
+
+# 付款对象类型：(模型, 预加载策略, 付款后状态, 付款记录外键, 借方科目编码)
+PAYABLE_KINDS = {
+    'bill': (Bill, BILL_LOAD_OPTIONS, '已支付', 'bill_id', '2202'),
+    'tax': (TaxDeclaration, TAX_DECLARATION_LOAD_OPTIONS, 'paid', 'tax_declaration_id', '2221'),
+    'purchase_order': (PurchaseOrder, PURCHASE_ORDER_LOAD_OPTIONS, 'completed', 'purchase_order_id', '2202'),
+}
+
+MISSING_MESSAGES = {
+    'bill': '部分账单不存在或无权限访问',
+    'tax': '部分税务申报不存在或无权限访问',
+    'purchase_order': '部分采购订单不存在或无权限访问',
+}
+
+# 科目不存在时自动创建的默认科目
+DEFAULT_ACCOUNTS = {
+    '2202': ('应付账款', '负债'),
+    '2221': ('应交税费', '负债'),
+}
+
+# 付款请求校验失败，status 为对应的HTTP状态码
+class PaymentRunError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def _vendor_name(record):
+    return record.vendor.name if record.vendor else '未知供应商'
+
+# 付款对象的金额、凭证摘要和借方分录摘要
+def _describe(kind, record):
+    if kind == 'bill':
+        vendor_name = _vendor_name(record)
+        return record.amount, f'支付{vendor_name}账单 {record.bill_no}', f'支付{vendor_name}账单'
+    if kind == 'tax':
+        description = f'支付{record.tax_type}（所属期：{record.period}）'
+        return record.tax_payable, description, description
+    vendor_name = _vendor_name(record)
+    return purchase_order_amount(record), f'支付{vendor_name}采购订单 {record.order_number}', f'支付{vendor_name}采购订单'
+
+# 按类型批量加载待付款记录，返回 [(类型, 记录, 金额, 凭证摘要, 分录摘要)]
+def load_payables(user_id, ids_by_kind):
+    payables = []
+    for kind, ids in ids_by_kind.items():
+        if not ids:
+            continue
+        model, load_options = PAYABLE_KINDS[kind][:2]
+        records = []
+        for chunk in chunked(set(ids)):
+            records.extend(model.query.options(*load_options).filter(model.id.in_(chunk), model.user_id == user_id))
+        if len(records) != len(set(ids)):
+            raise PaymentRunError(MISSING_MESSAGES[kind])
+        records.sort(key=lambda record: record.id)
+        payables.extend((kind, record) + _describe(kind, record) for record in records)
+    return payables
+
+# 校验付款请求并加载银行科目及待付款记录，返回 (银行科目, 待付款记录)
+def prepare_payment_run(user_id, data):
+    ids_by_kind = {
+        'bill': data.get('bill_ids') or [],
+        'tax': data.get('tax_ids') or [],
+        'purchase_order': data.get('purchase_order_ids') or []
+    }
+    # 检查是否选择了任何付款记录
+    if not any(ids_by_kind.values()):
+        raise PaymentRunError('请选择要支付的记录')
+    bank_account_id = data.get('bank_account_id')
+    if not bank_account_id:
+        raise PaymentRunError('请选择付款银行账户')
+    # 检查银行账户是否存在且属于当前用户
+    bank_account = Account.query.filter_by(id=bank_account_id, user_id=user_id).first()
+    if not bank_account:
+        raise PaymentRunError('银行账户不存在', 404)
+    payables = load_payables(user_id, ids_by_kind)
+    # 检查银行账户余额是否充足
+    if bank_account.balance < sum((amount for _, _, amount, _, _ in payables), ZERO):
+        raise PaymentRunError('银行账户余额不足')
+    return bank_account, payables
+
+# 按编码前缀查找科目，不存在时创建默认科目
+def resolve_account(user_id, code):
+    account = Account.query.filter(
+        Account.user_id == user_id,
+        Account.code.startswith(code)
+    ).order_by(Account.code).first()
+    if account is None:
+        name, account_type = DEFAULT_ACCOUNTS[code]
+        account = Account(code=code, name=name, type=account_type, parent_id=None, description=name, balance=ZERO, user_id=user_id)
+        db.session.add(account)
+        db.session.flush()
+    return account
+
+def _insert_vouchers(user_id, descriptions, now):
+    numbers = next_numbers(user_id, 'voucher', len(descriptions))
+    rows = [{
+        'voucher_no': number,
+        'date': now,
+        'description': description,
+        'status': '已审核',
+        'posted': False,
+        'user_id': user_id,
+        'created_at': now,
+        'updated_at': now
+    } for number, description in zip(numbers, descriptions)]
+    return db.session.execute(
+        insert(Voucher).returning(Voucher.id, sort_by_parameter_order=True),
+        rows
+    ).scalars().all()
+
+# 执行付款：progress(已处理笔数, 总笔数) 在每批次写入后调用
+def execute_payment_run(user_id, bank_account, payables, payment_method='银企直连', consolidate=False, progress=None):
+    now = datetime.utcnow()
+    receipt_number = next_number(user_id, 'payment')
+    total_amount = sum((amount for _, _, amount, _, _ in payables), ZERO)
+    debit_accounts = {
+        code: resolve_account(user_id, code).id
+        for code in {PAYABLE_KINDS[kind][4] for kind, *_ in payables}
+    }
+    credit_description = f'从{bank_account.name}支付'
+
+    voucher_ids = []
+    if consolidate:
+        voucher_ids = _insert_vouchers(user_id, [f'批量付款 {receipt_number}（{len(payables)}笔）'], now)
+
+    done = 0
+    for batch in chunked(payables, PAYMENT_BATCH_SIZE):
+        if consolidate:
+            batch_voucher_ids = voucher_ids * len(batch)
+        else:
+            batch_voucher_ids = _insert_vouchers(user_id, [description for _, _, _, description, _ in batch], now)
+            voucher_ids.extend(batch_voucher_ids)
+
+        entry_rows = []
+        payment_rows = []
+        paid_ids = {}
+        for voucher_id, (kind, record, amount, _, entry_description) in zip(batch_voucher_ids, batch):
+            _, _, _, foreign_key, code = PAYABLE_KINDS[kind]
+            entry_rows.append({
+                'voucher_id': voucher_id,
+                'account_id': debit_accounts[code],
+                'direction': '借方',
+                'amount': amount,
+                'description': entry_description
+            })
+            if not consolidate:
+                entry_rows.append({
+                    'voucher_id': voucher_id,
+                    'account_id': bank_account.id,
+                    'direction': '贷方',
+                    'amount': amount,
+                    'description': credit_description
+                })
+            payment_rows.append({
+                'bill_id': None,
+                'tax_declaration_id': None,
+                'purchase_order_id': None,
+                foreign_key: record.id,
+                'voucher_id': voucher_id,
+                'payment_date': now,
+                'amount': amount,
+                'payment_method': payment_method,
+                'bank_account_id': bank_account.id,
+                'receipt_number': receipt_number,
+                'status': 'success',
+                'user_id': user_id,
+                'created_at': now,
+                'updated_at': now
+            })
+            paid_ids.setdefault(kind, []).append(record.id)
+        db.session.execute(insert(VoucherEntry), entry_rows)
+        db.session.execute(insert(Payment), payment_rows)
+
+        for kind, ids in paid_ids.items():
+            model, _, status = PAYABLE_KINDS[kind][:3]
+            model.query.filter(model.id.in_(ids)).update({model.status: status, model.updated_at: now})
+
+        done += len(batch)
+        if progress:
+            progress(done, len(payables))
+
+    # 合并凭证：贷方一笔银行存款合计
+    if consolidate and payables:
+        db.session.execute(insert(VoucherEntry), [{
+            'voucher_id': voucher_ids[0],
+            'account_id': bank_account.id,
+            'direction': '贷方',
+            'amount': total_amount,
+            'description': credit_description
+        }])
+
+    # 按科目汇总更新银行账户、应付账款、应交税费余额及期间快照
+    post_vouchers(user_id, voucher_ids)
+    return {
+        'receipt_number': receipt_number,
+        'total_amount': total_amount,
+        'payment_count': len(payables),
+        'voucher_ids': voucher_ids
+    }
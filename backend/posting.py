@@ -0,0 +1,77 @@
+from datetime import datetime
+from sqlalchemy import bindparam
+from models import db, Account, Voucher
+from ledger import chunked, voucher_period_deltas, apply_period_deltas
+
+# 过账引擎：按科目汇总一批凭证的余额变动，每个科目只执行一次UPDATE，并同步维护期间余额快照
+
+# 将余额变动写入科目表，sign=-1 表示冲回
+def apply_balance_deltas(deltas, sign=1):
+    params = [
+        {'b_account_id': account_id, 'b_delta': delta * sign}
+        for account_id, delta in deltas.items() if delta
+    ]
+    if not params:
+        return
+    accounts = Account.__table__
+    db.session.execute(
+        accounts.update().where(accounts.c.id == bindparam('b_account_id')).values(
+            balance=accounts.c.balance + bindparam('b_delta'),
+            updated_at=datetime.utcnow()
+        ),
+        params
+    )
+
+# 应用/冲回一批凭证的余额影响（不改变凭证状态）
+def apply_vouchers(voucher_ids, sign=1):
+    period_deltas = voucher_period_deltas(voucher_ids)
+    deltas = {}
+    for (account_id, _), (_, _, net) in period_deltas.items():
+        deltas[account_id] = deltas.get(account_id, 0) + net
+    # 快照补建期间依赖变动前的科目余额，须先于余额更新
+    apply_period_deltas(period_deltas, sign)
+    apply_balance_deltas(deltas, sign)
+    return deltas
+
+def _select_voucher_ids(user_id, voucher_ids, posted):
+    selected = []
+    for chunk in chunked(set(voucher_ids)):
+        query = db.session.query(Voucher.id).filter(Voucher.user_id == user_id, Voucher.id.in_(chunk))
+        if posted:
+            query = query.filter(Voucher.posted == True)
+        else:
+            query = query.filter(db.or_(Voucher.posted == False, Voucher.posted.is_(None)))
+        selected.extend(row.id for row in query)
+    return sorted(selected)
+
+# 批量过账：返回 (已过账ID列表, 跳过的ID列表)，由调用方提交事务
+def post_vouchers(user_id, voucher_ids):
+    ids = _select_voucher_ids(user_id, voucher_ids, posted=False)
+    if ids:
+        apply_vouchers(ids, 1)
+        now = datetime.utcnow()
+        for chunk in chunked(ids):
+            Voucher.query.filter(Voucher.id.in_(chunk)).update({
+                Voucher.status: '已审核',
+                Voucher.posted: True,
+                Voucher.posted_at: now,
+                Voucher.updated_at: now
+            }, synchronize_session=False)
+    skipped = sorted(set(voucher_ids) - set(ids))
+    return ids, skipped
+
+# 批量取消过账：返回 (已取消过账ID列表, 跳过的ID列表)，由调用方提交事务
+def unpost_vouchers(user_id, voucher_ids):
+    ids = _select_voucher_ids(user_id, voucher_ids, posted=True)
+    if ids:
+        apply_vouchers(ids, -1)
+        now = datetime.utcnow()
+        for chunk in chunked(ids):
+            Voucher.query.filter(Voucher.id.in_(chunk)).update({
+                Voucher.status: '未审核',
+                Voucher.posted: False,
+                Voucher.posted_at: None,
+                Voucher.updated_at: now
+            }, synchronize_session=False)
+    skipped = sorted(set(voucher_ids) - set(ids))
+    return ids, skipped
@@ -0,0 +1,10 @@
+from app import app
+from models import db
+from ledger import rebuild_period_balances
+
+# 根据已过账凭证重建科目期间余额快照
+with app.app_context():
+    print('重建科目期间余额快照...')
+    count = rebuild_period_balances()
+    db.session.commit()
+    print(f'完成，共生成 {count} 条期间余额记录')
@@ -0,0 +1,199 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam
+from models import db, Voucher, VoucherEntry, BankStatement, BankStatementItem
+from money import ZERO, to_cents
+from hierarchy import subtree_ids
+
+# 银行对账：对账单上维护明细笔数、已对账笔数和已对账金额，每次对账只做增量更新
+# 自动对账按 (金额分, 方向) 建立未对账分录索引，在日期窗口内为对账单明细配对，
+# 先做一对一匹配，剩余明细再按同日同方向合并后与单条分录做多对一匹配
+
+DEFAULT_WINDOW_DAYS = 3
+
+def amount_cents(amount):
+    return abs(to_cents(amount))
+
+# 银行存入对应银行科目借方，支出对应贷方
+def item_direction(item_amount):
+    return '借方' if item_amount > 0 else '贷方'
+
+# 未对账条件：没有已对账的银行明细关联到该分录
+def unreconciled_condition():
+    return ~db.exists().where(
+        BankStatementItem.voucher_entry_id == VoucherEntry.id,
+        BankStatementItem.reconciled == True
+    )
+
+# 对账单科目及其各级下级科目
+def statement_account_ids(statement):
+    return subtree_ids(statement.account_id)
+
+class EntryIndex:
+    def __init__(self, entries):
+        self._buckets = {}
+        for entry in entries:
+            key = (amount_cents(entry.amount), entry.direction)
+            self._buckets.setdefault(key, []).append((entry.date.toordinal(), entry.id, entry))
+        for bucket in self._buckets.values():
+            bucket.sort(key=lambda candidate: candidate[:2])
+
+    # 取出窗口内日期最接近的一条分录（同等接近时取ID较小者），未找到返回 None
+    def take(self, cents, direction, day, window_days):
+        bucket = self._buckets.get((cents, direction))
+        if not bucket:
+            return None
+        target = day.toordinal()
+        position = bisect_left(bucket, (target - window_days,))
+        best = None
+        while position < len(bucket) and bucket[position][0] <= target + window_days:
+            distance = abs(bucket[position][0] - target)
+            if best is None or distance < best[0]:
+                best = (distance, position)
+            position += 1
+        if best is None:
+            return None
+        return bucket.pop(best[1])[2]
+
+def _candidate_entries(user_id, account_ids, start, end):
+    return db.session.query(
+        VoucherEntry.id,
+        VoucherEntry.amount,
+        VoucherEntry.direction,
+        VoucherEntry.description,
+        Voucher.voucher_no,
+        Voucher.date
+    ).join(Voucher, Voucher.id == VoucherEntry.voucher_id).filter(
+        Voucher.user_id == user_id,
+        VoucherEntry.account_id.in_(account_ids),
+        Voucher.date >= start,
+        Voucher.date < end,
+        unreconciled_condition()
+    ).all()
+
+class _Candidate:
+    __slots__ = ('id', 'amount', 'direction', 'voucher_no', 'description', 'date')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.amount = row.amount
+        self.direction = row.direction
+        self.voucher_no = row.voucher_no
+        self.description = row.description
+        self.date = row.date.date()
+
+def _match(kind, items, entry):
+    return {
+        'type': kind,
+        'item_ids': [item.id for item in items],
+        'voucher_entry_id': entry.id,
+        'voucher_no': entry.voucher_no,
+        'direction': entry.direction,
+        'amount': entry.amount,
+        'entry_date': entry.date.isoformat(),
+        'date_diff_days': max(abs((item.transaction_date - entry.date).days) for item in items)
+    }
+
+# 为对账单生成匹配方案；dry_run 为 False 时写入对账结果，由调用方提交
+def auto_reconcile(statement, window_days=DEFAULT_WINDOW_DAYS, dry_run=True):
+    items = BankStatementItem.query.filter(
+        BankStatementItem.bank_statement_id == statement.id,
+        db.or_(BankStatementItem.reconciled == False, BankStatementItem.reconciled.is_(None))
+    ).order_by(BankStatementItem.transaction_date, BankStatementItem.id).all()
+    items = [item for item in items if amount_cents(item.amount)]
+    if not items:
+        return {'matches': [], 'matched_item_count': 0, 'unmatched_item_ids': []}
+
+    start = datetime.combine(items[0].transaction_date - timedelta(days=window_days), datetime.min.time())
+    end = datetime.combine(items[-1].transaction_date + timedelta(days=window_days + 1), datetime.min.time())
+    rows = _candidate_entries(statement.user_id, statement_account_ids(statement), start, end)
+    index = EntryIndex(_Candidate(row) for row in rows)
+
+    matches = []
+    remaining = []
+    for item in items:
+        entry = index.take(amount_cents(item.amount), item_direction(item.amount), item.transaction_date, window_days)
+        if entry:
+            matches.append(_match('one_to_one', [item], entry))
+        else:
+            remaining.append(item)
+
+    # 多对一：同一天、同方向的多笔银行明细合计对应一条分录
+    groups = {}
+    for item in remaining:
+        groups.setdefault((item.transaction_date, item_direction(item.amount)), []).append(item)
+    unmatched = []
+    for (day, direction), group in groups.items():
+        entry = None
+        if len(group) > 1:
+            entry = index.take(sum(amount_cents(item.amount) for item in group), direction, day, window_days)
+        if entry:
+            matches.append(_match('many_to_one', group, entry))
+        else:
+            unmatched.extend(group)
+
+    if not dry_run and matches:
+        items_by_id = {item.id: item for item in items}
+        links = {item_id: match['voucher_entry_id'] for match in matches for item_id in match['item_ids']}
+        set_item_reconciliations(statement.id, [items_by_id[item_id] for item_id in links], links)
+
+    return {
+        'matches': matches,
+        'matched_item_count': sum(len(match['item_ids']) for match in matches),
+        'unmatched_item_ids': sorted(item.id for item in unmatched)
+    }
+
+# 在一条UPDATE中调整对账单计数，并根据调整后的计数更新状态；SET 右侧引用的均为更新前的值
+def adjust_statement_counters(statement_id, item_delta=0, reconciled_delta=0, amount_delta=ZERO):
+    if not (item_delta or reconciled_delta or amount_delta):
+        return
+    statements = BankStatement.__table__
+    item_count = statements.c.item_count + item_delta
+    reconciled_count = statements.c.reconciled_count + reconciled_delta
+    db.session.execute(
+        statements.update().where(statements.c.id == statement_id).values(
+            item_count=item_count,
+            reconciled_count=reconciled_count,
+            reconciled_amount=statements.c.reconciled_amount + amount_delta,
+            status=db.case(
+                (db.and_(item_count > 0, reconciled_count >= item_count), '已完成'),
+                (reconciled_count > 0, '已对账'),
+                else_='待对账'
+            ),
+            updated_at=datetime.utcnow()
+        )
+    )
+
+# 新增明细后更新计数
+def items_added(statement_id, items):
+    reconciled = [item for item in items if item.reconciled]
+    adjust_statement_counters(
+        statement_id,
+        item_delta=len(items),
+        reconciled_delta=len(reconciled),
+        amount_delta=sum((item.amount or ZERO for item in reconciled), ZERO)
+    )
+
+# 批量设置明细的对账关联，links 为 {明细ID: 分录ID}，分录ID为 None 表示取消对账；由调用方提交
+def set_item_reconciliations(statement_id, items, links):
+    params = []
+    reconciled_delta = 0
+    amount_delta = ZERO
+    for item in items:
+        entry_id = links[item.id]
+        change = int(entry_id is not None) - int(bool(item.reconciled))
+        reconciled_delta += change
+        amount_delta += (item.amount or ZERO) * change
+        params.append({'b_item_id': item.id, 'b_entry_id': entry_id, 'b_reconciled': entry_id is not None})
+    if not params:
+        return
+    table = BankStatementItem.__table__
+    db.session.execute(
+        table.update().where(table.c.id == bindparam('b_item_id')).values(
+            voucher_entry_id=bindparam('b_entry_id'),
+            reconciled=bindparam('b_reconciled'),
+            updated_at=datetime.utcnow()
+        ),
+        params
+    )
+    adjust_statement_counters(statement_id, reconciled_delta=reconciled_delta, amount_delta=amount_delta)
@@ -1,10 +1,50 @@
-from flask import Blueprint, request, jsonify, session
-from models import db, User, Account, Voucher, VoucherEntry, Vendor, BankStatement, BankStatementItem, PurchaseOrder, PurchaseOrderItem, TaxDeclaration, Bill, Payment
-from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, session, current_app, stream_with_context, send_file
+from models import db, User, Account, AccountPeriodBalance, AccountingPeriod, Voucher, VoucherEntry, Vendor, BankStatement, BankStatementItem, PurchaseOrder, PurchaseOrderItem, TaxDeclaration, Bill, Job
+from sqlalchemy.exc import OperationalError
+from posting import apply_vouchers, post_vouchers, unpost_vouchers
+from ledger import chunked, shift_account_balance, balance_at, balance_before, ledger_page, balances_as_of, activity_between, period_key, ensure_periods_open, PeriodClosedError, DEBIT_NORMAL_TYPES
+from cache import dashboard_cache, mark_ledger_changed
+from sequences import next_number
+from voucher_import import import_vouchers, detect_format as detect_voucher_format, IMPORT_FORMATS
+from ledger_export import export_general_ledger, EXPORT_FORMATS
+from statement_import import import_statement_file, detect_format, line_hash, StatementParseError, STATEMENT_FORMATS
+from money import ZERO, to_money
+from payments import prepare_payment_run, execute_payment_run, PaymentRunError, PAYMENT_BATCH_SIZE
+from jobs import JOB_HANDLERS, JOB_STATUSES, FILE_JOB_KINDS, enqueue_job, cancel_job, job_to_dict, job_file_path, export_file_path
+from hierarchy import account_hierarchy, subtree_ids, subtree_select, rollup_activity
+from closing import close_period, reopen_period, has_closed_snapshots, closing_movements, ClosingError
+from tax import calculate_tax as calculate_period_tax, TaxCalculationError
+from reconcile import auto_reconcile, items_added, set_item_reconciliations, unreconciled_condition, DEFAULT_WINDOW_DAYS
+from serializers import (
+    VOUCHER_LOAD_OPTIONS, VOUCHER_ENTRY_LOAD_OPTIONS, BANK_STATEMENT_LOAD_OPTIONS, PURCHASE_ORDER_LOAD_OPTIONS, TAX_DECLARATION_LOAD_OPTIONS, BILL_LOAD_OPTIONS,
+    serialize_accounts, serialize_account_tree, serialize_account_brief, serialize_voucher, serialize_voucher_entry, serialize_vendor,
+    serialize_bank_statement, serialize_bank_statement_item, serialize_purchase_order,
+    purchase_order_amount, serialize_tax_declaration, serialize_bill
+)
+from datetime import datetime, timedelta
+import os
+import base64
+from xml.etree.ElementTree import ParseError
+import json
 
 # 创建蓝图
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# 凭证列表分页大小
+VOUCHER_PAGE_SIZE = 50
+VOUCHER_PAGE_SIZE_MAX = 500
+
+# 游标编解码：将排序键编码为不透明字符串
+def _encode_cursor(*values):
+    raw = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        raise ValueError('invalid cursor')
+
 # 用户相关路由
 @api_bp.route('/auth/register', methods=['POST'])
 def register():
@@ -138,8 +178,110 @@ def get_vouchers():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    vouchers = Voucher.query.filter_by(user_id=user_id).all()
-    return jsonify([voucher.to_dict() for voucher in vouchers])
+    # 分页参数：按 (date, id) 倒序的游标分页
+    try:
+        limit = min(max(int(request.args.get('limit', VOUCHER_PAGE_SIZE)), 1), VOUCHER_PAGE_SIZE_MAX)
+    except ValueError:
+        return jsonify({'message': 'limit参数无效'}), 400
+    
+    cursor = request.args.get('cursor')
+    include = set(filter(None, request.args.get('include', '').split(',')))
+    
+    query = Voucher.query.filter(Voucher.user_id == user_id)
+    
+    # 服务端筛选条件
+    try:
+        if request.args.get('date_from'):
+            query = query.filter(Voucher.date >= datetime.fromisoformat(request.args['date_from']))
+        if request.args.get('date_to'):
+            date_to = datetime.fromisoformat(request.args['date_to'])
+            # 仅传日期时包含当天全部凭证
+            if len(request.args['date_to']) == 10:
+                date_to += timedelta(days=1)
+                query = query.filter(Voucher.date < date_to)
+            else:
+                query = query.filter(Voucher.date <= date_to)
+    except ValueError:
+        return jsonify({'message': '日期格式无效'}), 400
+    
+    if request.args.get('status'):
+        query = query.filter(Voucher.status == request.args['status'])
+    
+    if request.args.get('posted') in ('true', '1'):
+        query = query.filter(Voucher.posted == True)
+    elif request.args.get('posted') in ('false', '0'):
+        query = query.filter(db.or_(Voucher.posted == False, Voucher.posted.is_(None)))
+    
+    if request.args.get('account_id'):
+        query = query.filter(
+            db.session.query(VoucherEntry.id).filter(
+                VoucherEntry.voucher_id == Voucher.id,
+                VoucherEntry.account_id == request.args.get('account_id', type=int)
+            ).exists()
+        )
+    
+    if cursor:
+        try:
+            cursor_date, cursor_id = _decode_cursor(cursor)
+            cursor_date, cursor_id = datetime.fromisoformat(cursor_date), int(cursor_id)
+        except (ValueError, TypeError):
+            return jsonify({'message': 'cursor参数无效'}), 400
+        query = query.filter(db.or_(
+            Voucher.date < cursor_date,
+            db.and_(Voucher.date == cursor_date, Voucher.id < cursor_id)
+        ))
+    
+    # 多取一条用于判断是否还有下一页
+    vouchers = query.order_by(Voucher.date.desc(), Voucher.id.desc()).limit(limit + 1).all()
+    has_more = len(vouchers) > limit
+    vouchers = vouchers[:limit]
+    
+    # 汇总投影：每页一次分组查询得到借方合计和分录数
+    voucher_ids = [voucher.id for voucher in vouchers]
+    totals = {}
+    if voucher_ids:
+        totals = {row.voucher_id: row for row in db.session.query(
+            VoucherEntry.voucher_id,
+            db.func.count(VoucherEntry.id).label('entry_count'),
+            db.func.sum(db.case((VoucherEntry.direction == '借方', VoucherEntry.amount), else_=0)).label('total_amount')
+        ).filter(VoucherEntry.voucher_id.in_(voucher_ids)).group_by(VoucherEntry.voucher_id)}
+    
+    items = []
+    for voucher in vouchers:
+        row = totals.get(voucher.id)
+        items.append({
+            'id': voucher.id,
+            'voucher_no': voucher.voucher_no,
+            'date': voucher.date.isoformat() if voucher.date else None,
+            'description': voucher.description,
+            'status': voucher.status,
+            'posted': voucher.posted,
+            'posted_at': voucher.posted_at.isoformat() if voucher.posted_at else None,
+            'entry_count': row.entry_count if row else 0,
+            'total_amount': row.total_amount if row else ZERO
+        })
+    
+    # 按需展开分录：一次查询取回本页全部分录及科目
+    if 'entries' in include and voucher_ids:
+        entries_by_voucher = {}
+        entries = VoucherEntry.query.options(*VOUCHER_ENTRY_LOAD_OPTIONS).filter(
+            VoucherEntry.voucher_id.in_(voucher_ids)
+        ).order_by(VoucherEntry.id).all()
+        for entry in entries:
+            entries_by_voucher.setdefault(entry.voucher_id, []).append(serialize_voucher_entry(entry))
+        for item in items:
+            item['entries'] = entries_by_voucher.get(item['id'], [])
+    
+    next_cursor = None
+    if has_more and vouchers:
+        last = vouchers[-1]
+        next_cursor = _encode_cursor(last.date.isoformat(), last.id)
+    
+    return jsonify({
+        'items': items,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    })
 
 @api_bp.route('/vouchers/<int:id>', methods=['GET'])
 def get_voucher(id):
@@ -148,8 +290,8 @@ def get_voucher(id):
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    voucher = Voucher.query.filter_by(id=id, user_id=user_id).first_or_404()
-    return jsonify(voucher.to_dict())
+    voucher = Voucher.query.options(*VOUCHER_LOAD_OPTIONS).filter_by(id=id, user_id=user_id).first_or_404()
+    return jsonify(serialize_voucher(voucher))
 
 @api_bp.route('/vouchers', methods=['POST'])
 def create_voucher():
@@ -161,25 +303,30 @@ def create_voucher():
     data = request.get_json()
     
     # 验证借贷平衡
-    debit_total = sum(float(entry['amount']) for entry in data['entries'] if entry['direction'] == '借方')
-    credit_total = sum(float(entry['amount']) for entry in data['entries'] if entry['direction'] == '贷方')
+    debit_total = sum((to_money(entry['amount']) for entry in data['entries'] if entry['direction'] == '借方'), ZERO)
+    credit_total = sum((to_money(entry['amount']) for entry in data['entries'] if entry['direction'] == '贷方'), ZERO)
     
     if debit_total != credit_total:
         return jsonify({'message': '借贷不平衡，借方合计: {}, 贷方合计: {}'.format(debit_total, credit_total)}), 400
     
+    date = datetime.fromisoformat(data['date'])
+    try:
+        ensure_periods_open(user_id, [period_key(date)])
+    except PeriodClosedError as e:
+        return jsonify({'message': str(e)}), 400
+    
     # 生成凭证号
-    now = datetime.now()
-    voucher_no = now.strftime('%Y%m%d') + '-' + str(Voucher.query.count() + 1).zfill(4)
+    voucher_no = next_number(user_id, 'voucher')
     
     new_voucher = Voucher(
         voucher_no=voucher_no,
-        date=datetime.fromisoformat(data['date']),
+        date=date,
         description=data['description'],
         status=data.get('status', '未审核'),
         user_id=user_id
     )
     db.session.add(new_voucher)
-    db.session.commit()
+    db.session.flush()
     
     # 创建凭证分录，暂不更新账户余额（仅在过账时更新）
     for entry_data in data['entries']:
@@ -187,11 +334,12 @@ def create_voucher():
             voucher_id=new_voucher.id,
             account_id=entry_data['account_id'],
             direction=entry_data['direction'],
-            amount=float(entry_data['amount']),
+            amount=to_money(entry_data['amount']),
             description=entry_data.get('description')
         )
         db.session.add(new_entry)
     
+    mark_ledger_changed(user_id, [period_key(date)])
     db.session.commit()
     return jsonify(new_voucher.to_dict()), 201
 
@@ -206,36 +354,30 @@ def update_voucher(id):
     data = request.get_json()
     
     # 验证借贷平衡
-    debit_total = sum(float(entry['amount']) for entry in data['entries'] if entry['direction'] == '借方')
-    credit_total = sum(float(entry['amount']) for entry in data['entries'] if entry['direction'] == '贷方')
+    debit_total = sum((to_money(entry['amount']) for entry in data['entries'] if entry['direction'] == '借方'), ZERO)
+    credit_total = sum((to_money(entry['amount']) for entry in data['entries'] if entry['direction'] == '贷方'), ZERO)
     
     if debit_total != credit_total:
         return jsonify({'message': '借贷不平衡，借方合计: {}, 贷方合计: {}'.format(debit_total, credit_total)}), 400
     
+    # 原日期和新日期所在期间都不能已结账
+    date = datetime.fromisoformat(data['date'])
+    periods = [period_key(voucher.date), period_key(date)]
+    try:
+        ensure_periods_open(user_id, periods)
+    except PeriodClosedError as e:
+        return jsonify({'message': str(e)}), 400
+    
     # 只有已过账的凭证才需要恢复原余额
     if voucher.posted:
         # 恢复原凭证分录对账户余额的影响
-        for entry in voucher.entries:
-            account = Account.query.get(entry.account_id)
-            # 根据科目类型调整余额恢复逻辑
-            if account.type in ['资产', '费用']:
-                # 资产和费用类：借方增加，贷方减少
-                if entry.direction == '借方':
-                    account.balance -= entry.amount
-                else:
-                    account.balance += entry.amount
-            else:  # 负债、权益、收入类
-                # 负债、权益、收入类：贷方增加，借方减少
-                if entry.direction == '借方':
-                    account.balance += entry.amount
-                else:
-                    account.balance -= entry.amount
+        apply_vouchers([voucher.id], -1)
     
     # 删除原凭证分录
     VoucherEntry.query.filter_by(voucher_id=id).delete()
     
     # 更新凭证基本信息
-    voucher.date = datetime.fromisoformat(data['date'])
+    voucher.date = date
     voucher.description = data['description']
     voucher.status = data.get('status', '未审核')
     
@@ -245,11 +387,17 @@ def update_voucher(id):
             voucher_id=voucher.id,
             account_id=entry_data['account_id'],
             direction=entry_data['direction'],
-            amount=float(entry_data['amount']),
+            amount=to_money(entry_data['amount']),
             description=entry_data.get('description')
         )
         db.session.add(new_entry)
     
+    # 已过账凭证按新分录重新计入余额，保持余额与期间快照一致
+    if voucher.posted:
+        db.session.flush()
+        apply_vouchers([voucher.id], 1)
+    
+    mark_ledger_changed(user_id, periods)
     db.session.commit()
     return jsonify(voucher.to_dict())
 
@@ -261,27 +409,18 @@ def delete_voucher(id):
         return jsonify({'message': '未登录'}), 401
     
     voucher = Voucher.query.filter_by(id=id, user_id=user_id).first_or_404()
+    try:
+        ensure_periods_open(user_id, [period_key(voucher.date)])
+    except PeriodClosedError as e:
+        return jsonify({'message': str(e)}), 400
     
     # 只有已过账的凭证才需要恢复余额
     if voucher.posted:
         # 恢复账户余额
-        for entry in voucher.entries:
-            account = Account.query.get(entry.account_id)
-            # 根据科目类型调整余额恢复逻辑
-            if account.type in ['资产', '费用']:
-                # 资产和费用类：借方增加，贷方减少
-                if entry.direction == '借方':
-                    account.balance -= entry.amount
-                else:
-                    account.balance += entry.amount
-            else:  # 负债、权益、收入类
-                # 负债、权益、收入类：贷方增加，借方减少
-                if entry.direction == '借方':
-                    account.balance += entry.amount
-                else:
-                    account.balance -= entry.amount
+        apply_vouchers([voucher.id], -1)
     
     db.session.delete(voucher)
+    mark_ledger_changed(user_id, [period_key(voucher.date)])
     db.session.commit()
     return jsonify({'message': '凭证删除成功'})
 
@@ -299,28 +438,12 @@ def post_voucher(id):
     if voucher.posted:
         return jsonify({'message': '该凭证已过账，不能重复过账'}), 400
     
-    # 更新账户余额
-    for entry in voucher.entries:
-        account = Account.query.get(entry.account_id)
-        # 根据科目类型调整余额更新逻辑
-        if account.type in ['资产', '费用']:
-            # 资产和费用类：借方增加，贷方减少
-            if entry.direction == '借方':
-                account.balance += entry.amount
-            else:
-                account.balance -= entry.amount
-        else:  # 负债、权益、收入类
-            # 负债、权益、收入类：贷方增加，借方减少
-            if entry.direction == '借方':
-                account.balance -= entry.amount
-            else:
-                account.balance += entry.amount
-    
-    # 标记为已过账
-    voucher.status = '已审核'
-    voucher.posted = True
-    voucher.posted_at = datetime.utcnow()
-    voucher.updated_at = datetime.utcnow()
+    # 更新账户余额并标记为已过账
+    try:
+        post_vouchers(user_id, [voucher.id])
+    except PeriodClosedError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
     
     db.session.commit()
     return jsonify({'message': '凭证过账成功', 'voucher': voucher.to_dict()})
@@ -339,32 +462,108 @@ def unpost_voucher(id):
     if not voucher.posted:
         return jsonify({'message': '只有已过账的凭证才能取消过账'}), 400
     
-    # 恢复账户余额
-    for entry in voucher.entries:
-        account = Account.query.get(entry.account_id)
-        # 根据科目类型调整余额恢复逻辑
-        if account.type in ['资产', '费用']:
-            # 资产和费用类：反向恢复
-            if entry.direction == '借方':
-                account.balance -= entry.amount  # 之前增加的现在减少
-            else:
-                account.balance += entry.amount  # 之前减少的现在增加
-        else:  # 负债、权益、收入类
-            # 负债、权益、收入类：反向恢复
-            if entry.direction == '借方':
-                account.balance += entry.amount  # 之前减少的现在增加
-            else:
-                account.balance -= entry.amount  # 之前增加的现在减少
-    
-    # 标记为未审核和未过账
-    voucher.status = '未审核'
-    voucher.posted = False
-    voucher.posted_at = None
-    voucher.updated_at = datetime.utcnow()
+    # 恢复账户余额并标记为未审核和未过账
+    try:
+        unpost_vouchers(user_id, [voucher.id])
+    except PeriodClosedError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
     
     db.session.commit()
     return jsonify({'message': '取消过账成功', 'voucher': voucher.to_dict()})
 
+def _batch_voucher_ids():
+    data = request.get_json() or {}
+    voucher_ids = data.get('voucher_ids') or []
+    try:
+        return [int(voucher_id) for voucher_id in voucher_ids]
+    except (TypeError, ValueError):
+        return None
+
+# 批量过账：按科目汇总余额变动，在一个事务内完成
+@api_bp.route('/vouchers/post-batch', methods=['POST'])
+def post_vouchers_batch():
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    voucher_ids = _batch_voucher_ids()
+    if not voucher_ids:
+        return jsonify({'message': '请选择要过账的凭证'}), 400
+    
+    try:
+        posted_ids, skipped_ids = post_vouchers(user_id, voucher_ids)
+        db.session.commit()
+    except PeriodClosedError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'批量过账失败: {str(e)}'}), 500
+    
+    return jsonify({
+        'message': '批量过账成功',
+        'posted_count': len(posted_ids),
+        'posted_ids': posted_ids,
+        'skipped_ids': skipped_ids
+    })
+
+# 批量取消过账
+@api_bp.route('/vouchers/unpost-batch', methods=['POST'])
+def unpost_vouchers_batch():
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    voucher_ids = _batch_voucher_ids()
+    if not voucher_ids:
+        return jsonify({'message': '请选择要取消过账的凭证'}), 400
+    
+    try:
+        unposted_ids, skipped_ids = unpost_vouchers(user_id, voucher_ids)
+        db.session.commit()
+    except PeriodClosedError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'批量取消过账失败: {str(e)}'}), 500
+    
+    return jsonify({
+        'message': '批量取消过账成功',
+        'unposted_count': len(unposted_ids),
+        'unposted_ids': unposted_ids,
+        'skipped_ids': skipped_ids
+    })
+
+# 批量导入凭证：请求体或上传文件为 CSV / JSON Lines，流式解析并分批写入
+@api_bp.route('/vouchers/import', methods=['POST'])
+def import_vouchers_file():
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    upload = request.files.get('file')
+    file_format = request.args.get('format') or detect_voucher_format(
+        upload.filename if upload else None,
+        upload.mimetype if upload else request.mimetype
+    )
+    if file_format not in IMPORT_FORMATS:
+        return jsonify({'message': '无法识别的导入格式，支持 csv、jsonl'}), 400
+    
+    post = request.args.get('post', '').lower() in ('1', 'true')
+    stream = upload.stream if upload else request.stream
+    result = import_vouchers(user_id, stream, file_format, post=post)
+    # 全部失败时返回400，部分成功时在 errors 中列出失败的凭证
+    if result['error_count'] and not result['imported_count']:
+        result['message'] = '导入失败'
+        return jsonify(result), 400
+    result['message'] = '导入完成'
+    return jsonify(result)
+
 # 获取所有科目
 @api_bp.route('/accounts', methods=['GET'])
 def get_accounts():
@@ -373,8 +572,17 @@ def get_accounts():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    accounts = Account.query.filter_by(user_id=user_id).all()
-    return jsonify([account.to_dict() for account in accounts])
+    return jsonify(serialize_accounts(account_hierarchy(user_id)))
+
+# 获取科目树：单次查询取回全部科目及汇总余额，在内存中按上级组装
+@api_bp.route('/accounts/tree', methods=['GET'])
+def get_account_tree():
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    return jsonify(serialize_account_tree(account_hierarchy(user_id)))
 
 # 获取单个科目
 @api_bp.route('/accounts/<int:id>', methods=['GET'])
@@ -387,6 +595,108 @@ def get_account(id):
     account = Account.query.filter_by(id=id, user_id=user_id).first_or_404()
     return jsonify(account.to_dict())
 
+# 获取科目期间余额快照
+@api_bp.route('/accounts/<int:id>/period-balances', methods=['GET'])
+def get_account_period_balances(id):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    account = Account.query.filter_by(id=id, user_id=user_id).first_or_404()
+    query = AccountPeriodBalance.query.filter_by(account_id=account.id)
+    if request.args.get('from'):
+        query = query.filter(AccountPeriodBalance.period >= request.args['from'])
+    if request.args.get('to'):
+        query = query.filter(AccountPeriodBalance.period <= request.args['to'])
+    
+    return jsonify([row.to_dict() for row in query.order_by(AccountPeriodBalance.period)])
+
+# 获取科目在指定时点的余额
+@api_bp.route('/accounts/<int:id>/balance', methods=['GET'])
+def get_account_balance_at(id):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    account = Account.query.filter_by(id=id, user_id=user_id).first_or_404()
+    try:
+        as_of = datetime.fromisoformat(request.args['as_of']) if request.args.get('as_of') else datetime.now()
+    except ValueError:
+        return jsonify({'message': '日期格式无效'}), 400
+    # 仅传日期时取当天结束时的余额
+    if request.args.get('as_of') and len(request.args['as_of']) == 10:
+        as_of = as_of.replace(hour=23, minute=59, second=59, microsecond=999999)
+    
+    return jsonify({
+        'account_id': account.id,
+        'as_of': as_of.isoformat(),
+        'balance': balance_at(account.id, as_of)
+    })
+
+# 科目明细账：已过账分录按日期升序，逐行余额由窗口函数累计；游标携带上一页末行的键和余额，翻页不重新计算之前的行
+@api_bp.route('/accounts/<int:id>/ledger', methods=['GET'])
+def get_account_ledger(id):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    account = Account.query.filter_by(id=id, user_id=user_id).first_or_404()
+    try:
+        limit = min(max(int(request.args.get('limit', VOUCHER_PAGE_SIZE)), 1), VOUCHER_PAGE_SIZE_MAX)
+    except ValueError:
+        return jsonify({'message': 'limit参数无效'}), 400
+    try:
+        date_from = _parse_report_date('from')
+        date_to = _parse_report_date('to', end_of_day=True)
+    except ValueError:
+        return jsonify({'message': '日期格式无效'}), 400
+    
+    opening_balance = None
+    after = None
+    if request.args.get('cursor'):
+        try:
+            cursor_date, voucher_id, entry_id, seed = _decode_cursor(request.args['cursor'])
+            after = (datetime.fromisoformat(cursor_date), int(voucher_id), int(entry_id))
+            seed = to_money(seed)
+        except (ValueError, TypeError, ArithmeticError):
+            return jsonify({'message': 'cursor参数无效'}), 400
+    else:
+        # 首页以区间起点之前的余额为起点
+        seed = opening_balance = balance_before(account.id, date_from)
+    
+    # 多取一条用于判断是否还有下一页
+    rows = ledger_page(account, date_from, date_to, after=after, seed=seed, limit=limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = _encode_cursor(last.date.isoformat(), last.voucher_id, last.entry_id, str(last.balance))
+    
+    return jsonify({
+        'account': serialize_account_brief(account),
+        'from': date_from.isoformat() if date_from else None,
+        'to': date_to.isoformat() if date_to else None,
+        'opening_balance': opening_balance,
+        'items': [{
+            'entry_id': row.entry_id,
+            'voucher_id': row.voucher_id,
+            'voucher_no': row.voucher_no,
+            'date': row.date.isoformat(),
+            'voucher_description': row.voucher_description,
+            'description': row.description,
+            'debit': row.amount if row.direction == '借方' else ZERO,
+            'credit': row.amount if row.direction == '贷方' else ZERO,
+            'balance': row.balance
+        } for row in rows],
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    })
+
 # 创建科目
 @api_bp.route('/accounts', methods=['POST'])
 def create_account():
@@ -396,6 +706,8 @@ def create_account():
         return jsonify({'message': '未登录'}), 401
     
     data = request.get_json()
+    if data.get('parent_id') and not Account.query.filter_by(id=data['parent_id'], user_id=user_id).first():
+        return jsonify({'message': '上级科目不存在'}), 400
     
     # 处理科目编码：如果未提供，则自动生成
     code = data.get('code')
@@ -433,6 +745,7 @@ def create_account():
         user_id=user_id
     )
     db.session.add(new_account)
+    mark_ledger_changed(user_id)
     db.session.commit()
     return jsonify(new_account.to_dict()), 201
 
@@ -446,12 +759,27 @@ def update_account(id):
     
     account = Account.query.filter_by(id=id, user_id=user_id).first_or_404()
     data = request.get_json()
+    parent_id = data.get('parent_id', account.parent_id)
+    if parent_id and parent_id != account.parent_id:
+        if not Account.query.filter_by(id=parent_id, user_id=user_id).first():
+            return jsonify({'message': '上级科目不存在'}), 400
+        # 上级不能是本科目或其下级科目，否则层级成环
+        if parent_id in subtree_ids(account.id):
+            return jsonify({'message': '上级科目不能是本科目或其下级科目'}), 400
     account.code = data.get('code', account.code)
     account.name = data.get('name', account.name)
     account.type = data.get('type', account.type)
-    account.parent_id = data.get('parent_id', account.parent_id)
+    account.parent_id = parent_id
     account.description = data.get('description', account.description)
-    account.balance = data.get('balance', account.balance)
+    if 'balance' in data and to_money(data['balance']) != account.balance:
+        # 已结账期间的快照不可变，平移快照前先拒绝
+        if has_closed_snapshots(user_id, account.id):
+            return jsonify({'message': '科目在已结账期间有余额，不能直接修改余额'}), 400
+        # 手工调整余额视为调整期初，期间快照整体平移
+        balance = to_money(data['balance'])
+        shift_account_balance(account.id, balance - (account.balance or ZERO))
+        account.balance = balance
+    mark_ledger_changed(user_id)
     db.session.commit()
     return jsonify(account.to_dict())
 
@@ -464,7 +792,11 @@ def delete_account(id):
         return jsonify({'message': '未登录'}), 401
     
     account = Account.query.filter_by(id=id, user_id=user_id).first_or_404()
+    if has_closed_snapshots(user_id, account.id):
+        return jsonify({'message': '科目在已结账期间有余额，不能删除'}), 400
+    AccountPeriodBalance.query.filter_by(account_id=account.id).delete()
     db.session.delete(account)
+    mark_ledger_changed(user_id)
     db.session.commit()
     return jsonify({'message': '科目删除成功'})
 
@@ -477,7 +809,7 @@ def get_vendors():
         return jsonify({'message': '未登录'}), 401
     
     vendors = Vendor.query.filter_by(user_id=user_id).all()
-    return jsonify([vendor.to_dict() for vendor in vendors])
+    return jsonify([serialize_vendor(vendor) for vendor in vendors])
 
 @api_bp.route('/vendors/<int:id>', methods=['GET'])
 def get_vendor(id):
@@ -548,8 +880,8 @@ def get_bank_statements():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    statements = BankStatement.query.filter_by(user_id=user_id).all()
-    return jsonify([statement.to_dict() for statement in statements])
+    statements = BankStatement.query.options(*BANK_STATEMENT_LOAD_OPTIONS).filter_by(user_id=user_id).all()
+    return jsonify([serialize_bank_statement(statement) for statement in statements])
 
 @api_bp.route('/bank-statements/<int:id>', methods=['GET'])
 def get_bank_statement(id):
@@ -624,18 +956,22 @@ def add_bank_statement_item(statement_id):
     statement = BankStatement.query.filter_by(id=statement_id, user_id=user_id).first_or_404()
     data = request.get_json()
     
+    transaction_date = datetime.strptime(data['transaction_date'], '%Y-%m-%d').date()
+    amount, balance = to_money(data['amount']), to_money(data['balance'])
     new_item = BankStatementItem(
         bank_statement_id=statement_id,
-        transaction_date=datetime.strptime(data['transaction_date'], '%Y-%m-%d').date(),
+        transaction_date=transaction_date,
         description=data['description'],
-        amount=data['amount'],
-        balance=data['balance'],
-        reconciled=data.get('reconciled', False)
+        amount=amount,
+        balance=balance,
+        reconciled=data.get('reconciled', False),
+        line_hash=line_hash(transaction_date, amount, data['description'], balance)
     )
     
     db.session.add(new_item)
+    items_added(statement_id, [new_item])
     db.session.commit()
-    return jsonify(new_item.to_dict()), 201
+    return jsonify(serialize_bank_statement_item(new_item)), 201
 
 # 批量添加银行对账单明细
 @api_bp.route('/bank-statements/<int:statement_id>/items/batch', methods=['POST'])
@@ -652,19 +988,53 @@ def add_bank_statement_items_batch(statement_id):
     new_items = []
     
     for item_data in items:
+        transaction_date = datetime.strptime(item_data['transaction_date'], '%Y-%m-%d').date()
+        amount, balance = to_money(item_data['amount']), to_money(item_data['balance'])
         new_item = BankStatementItem(
             bank_statement_id=statement_id,
-            transaction_date=datetime.strptime(item_data['transaction_date'], '%Y-%m-%d').date(),
+            transaction_date=transaction_date,
             description=item_data['description'],
-            amount=item_data['amount'],
-            balance=item_data['balance'],
-            reconciled=item_data.get('reconciled', False)
+            amount=amount,
+            balance=balance,
+            reconciled=item_data.get('reconciled', False),
+            line_hash=line_hash(transaction_date, amount, item_data['description'], balance)
         )
         new_items.append(new_item)
     
     db.session.add_all(new_items)
+    items_added(statement_id, new_items)
     db.session.commit()
-    return jsonify([item.to_dict() for item in new_items]), 201
+    return jsonify([serialize_bank_statement_item(item) for item in new_items]), 201
+
+# 导入银行对账单文件：CSV / MT940 / CAMT.053，流式解析、去重后批量写入，只返回导入汇总
+@api_bp.route('/bank-statements/<int:statement_id>/import', methods=['POST'])
+def import_bank_statement_file(statement_id):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    statement = BankStatement.query.filter_by(id=statement_id, user_id=user_id).first_or_404()
+    upload = request.files.get('file')
+    file_format = request.args.get('format') or detect_format(
+        upload.filename if upload else None,
+        upload.mimetype if upload else request.mimetype
+    )
+    if file_format not in STATEMENT_FORMATS:
+        return jsonify({'message': '无法识别的对账单格式，支持 csv、mt940、camt053'}), 400
+    
+    try:
+        result = import_statement_file(statement, upload.stream if upload else request.stream, file_format)
+        db.session.commit()
+    except (StatementParseError, ParseError) as e:
+        db.session.rollback()
+        return jsonify({'message': f'对账单文件解析失败: {str(e)}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'对账单导入失败: {str(e)}'}), 500
+    
+    result['message'] = '对账单导入完成'
+    return jsonify(result)
 
 # 银行对账：关联凭证分录
 @api_bp.route('/bank-statement-items/<int:item_id>/reconcile', methods=['POST'])
@@ -674,8 +1044,11 @@ def reconcile_bank_statement_item(item_id):
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    item = BankStatementItem.query.get(item_id)
-    if not item or item.bank_statement.user_id != user_id:
+    item = BankStatementItem.query.join(BankStatement).filter(
+        BankStatementItem.id == item_id,
+        BankStatement.user_id == user_id
+    ).first()
+    if not item:
         return jsonify({'message': '银行对账单明细不存在'}), 404
     
     data = request.get_json()
@@ -683,33 +1056,103 @@ def reconcile_bank_statement_item(item_id):
     
     # 验证凭证分录是否属于当前用户
     if voucher_entry_id:
-        voucher_entry = VoucherEntry.query.get(voucher_entry_id)
-        if not voucher_entry or voucher_entry.voucher.user_id != user_id:
+        voucher_entry = VoucherEntry.query.join(Voucher).filter(
+            VoucherEntry.id == voucher_entry_id,
+            Voucher.user_id == user_id
+        ).first()
+        if not voucher_entry:
             return jsonify({'message': '凭证分录不存在'}), 404
-        
-        item.voucher_entry_id = voucher_entry_id
-        item.reconciled = True
-    else:
-        # 取消对账
-        item.voucher_entry_id = None
-        item.reconciled = False
-    
-    # 更新银行对账单状态：根据对账进度更新状态
-    bank_statement = item.bank_statement
-    all_reconciled = all(item.reconciled for item in bank_statement.items)
-    any_reconciled = any(item.reconciled for item in bank_statement.items)
-    
-    if all_reconciled:
-        bank_statement.status = '已完成'  # 所有明细都已对账，更新为已完成
-    elif any_reconciled:
-        bank_statement.status = '已对账'  # 部分明细已对账，更新为已对账
-    else:
-        bank_statement.status = '待对账'  # 没有明细已对账，保持待对账状态
     
+    # 设置对账关联（不传分录即取消对账），对账单计数和状态增量更新
+    set_item_reconciliations(item.bank_statement_id, [item], {item.id: voucher_entry_id or None})
     db.session.commit()
-    return jsonify(item.to_dict())
+    return jsonify(serialize_bank_statement_item(item))
+
+# 批量对账：pairs 为 [{item_id, voucher_entry_id}]，voucher_entry_id 为空表示取消对账
+@api_bp.route('/bank-statements/<int:id>/reconcile-batch', methods=['POST'])
+def reconcile_bank_statement_items_batch(id):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    statement = BankStatement.query.filter_by(id=id, user_id=user_id).first_or_404()
+    data = request.get_json(silent=True) or {}
+    try:
+        links = {int(pair['item_id']): int(pair['voucher_entry_id']) if pair.get('voucher_entry_id') else None for pair in data.get('pairs') or []}
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'message': '对账数据格式错误'}), 400
+    if not links:
+        return jsonify({'message': '请选择要对账的明细'}), 400
+    
+    items = []
+    for chunk in chunked(list(links)):
+        items.extend(BankStatementItem.query.filter(
+            BankStatementItem.bank_statement_id == statement.id,
+            BankStatementItem.id.in_(chunk)
+        ).all())
+    missing_items = sorted(set(links) - {item.id for item in items})
+    if missing_items:
+        return jsonify({'message': '银行对账单明细不存在', 'item_ids': missing_items}), 404
+    
+    entry_ids = {entry_id for entry_id in links.values() if entry_id}
+    found_entries = set()
+    for chunk in chunked(list(entry_ids)):
+        found_entries.update(row.id for row in db.session.query(VoucherEntry.id).join(Voucher).filter(
+            Voucher.user_id == user_id,
+            VoucherEntry.id.in_(chunk)
+        ))
+    missing_entries = sorted(entry_ids - found_entries)
+    if missing_entries:
+        return jsonify({'message': '凭证分录不存在', 'voucher_entry_ids': missing_entries}), 404
+    
+    try:
+        set_item_reconciliations(statement.id, items, links)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'批量对账失败: {str(e)}'}), 500
+    
+    return jsonify({
+        'message': '批量对账成功',
+        'updated_count': len(items),
+        'status': statement.status,
+        'item_count': statement.item_count,
+        'reconciled_count': statement.reconciled_count,
+        'reconciled_amount': statement.reconciled_amount
+    })
+
+# 自动对账：按金额、方向和日期窗口为未对账明细匹配凭证分录，dry_run 时只返回匹配方案
+@api_bp.route('/bank-statements/<int:id>/auto-reconcile', methods=['POST'])
+def auto_reconcile_bank_statement(id):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    statement = BankStatement.query.filter_by(id=id, user_id=user_id).first_or_404()
+    data = request.get_json(silent=True) or {}
+    dry_run = bool(data.get('dry_run', False))
+    try:
+        window_days = int(data.get('window_days', DEFAULT_WINDOW_DAYS))
+    except (TypeError, ValueError):
+        return jsonify({'message': '日期窗口无效'}), 400
+    if window_days < 0:
+        return jsonify({'message': '日期窗口无效'}), 400
+    
+    try:
+        result = auto_reconcile(statement, window_days=window_days, dry_run=dry_run)
+        if not dry_run:
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'自动对账失败: {str(e)}'}), 500
+    
+    result['dry_run'] = dry_run
+    result['status'] = statement.status
+    return jsonify(result)
 
-# 获取待对账的凭证分录
+# 获取待对账的凭证分录：银行科目分录与已对账明细做反连接，按 (date, id) 倒序游标分页，单条查询返回
 @api_bp.route('/unreconciled-voucher-entries', methods=['GET'])
 def get_unreconciled_voucher_entries():
     # 获取当前用户
@@ -717,34 +1160,102 @@ def get_unreconciled_voucher_entries():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    # 获取用户的银行科目
-    bank_accounts = Account.query.filter(
-        Account.user_id == user_id,
-        Account.type == '资产',
-        (Account.name.contains('银行') | Account.code.startswith('1002'))
-    ).all()
+    try:
+        limit = min(max(int(request.args.get('limit', VOUCHER_PAGE_SIZE)), 1), VOUCHER_PAGE_SIZE_MAX)
+    except ValueError:
+        return jsonify({'message': 'limit参数无效'}), 400
+    
+    query = db.session.query(
+        VoucherEntry.id,
+        Voucher.voucher_no,
+        Voucher.date,
+        VoucherEntry.account_id,
+        Account.name.label('account_name'),
+        VoucherEntry.description,
+        VoucherEntry.amount,
+        VoucherEntry.direction
+    ).join(Voucher, Voucher.id == VoucherEntry.voucher_id).join(
+        Account, Account.id == VoucherEntry.account_id
+    ).filter(
+        Voucher.user_id == user_id,
+        unreconciled_condition()
+    )
+    
+    # 指定银行科目时包含其各级下级科目，否则取用户的全部银行科目
+    account_id = request.args.get('account_id', type=int)
+    if account_id:
+        query = query.filter(Account.id.in_(subtree_select(account_id)))
+    else:
+        query = query.filter(
+            Account.type == '资产',
+            db.or_(Account.name.contains('银行'), Account.code.startswith('1002'))
+        )
     
-    bank_account_ids = [account.id for account in bank_accounts]
+    try:
+        date_from = _parse_report_date('date_from')
+        date_to = _parse_report_date('date_to', end_of_day=True)
+        amount_min = to_money(request.args['amount_min']) if request.args.get('amount_min') else None
+        amount_max = to_money(request.args['amount_max']) if request.args.get('amount_max') else None
+    except (ValueError, ArithmeticError):
+        return jsonify({'message': '筛选参数无效'}), 400
+    if date_from:
+        query = query.filter(Voucher.date >= date_from)
+    if date_to:
+        query = query.filter(Voucher.date <= date_to)
+    if amount_min is not None:
+        query = query.filter(VoucherEntry.amount >= amount_min)
+    if amount_max is not None:
+        query = query.filter(VoucherEntry.amount <= amount_max)
+    if request.args.get('direction'):
+        query = query.filter(VoucherEntry.direction == request.args['direction'])
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_date, cursor_id = _decode_cursor(cursor)
+            cursor_date, cursor_id = datetime.fromisoformat(cursor_date), int(cursor_id)
+        except (ValueError, TypeError):
+            return jsonify({'message': 'cursor参数无效'}), 400
+        query = query.filter(db.or_(
+            Voucher.date < cursor_date,
+            db.and_(Voucher.date == cursor_date, VoucherEntry.id < cursor_id)
+        ))
+    
+    # 多取一条用于判断是否还有下一页
+    rows = query.order_by(Voucher.date.desc(), VoucherEntry.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
-    # 获取这些科目的未对账凭证分录
-    unreconciled_entries = VoucherEntry.query.join(Voucher).filter(
-        Voucher.user_id == user_id,
-        VoucherEntry.account_id.in_(bank_account_ids),
-        ~VoucherEntry.id.in_(db.session.query(BankStatementItem.voucher_entry_id).filter(BankStatementItem.reconciled == True).subquery())
-    ).all()
-    
-    return jsonify([{
-        'id': entry.id,
-        'voucher_no': entry.voucher.voucher_no,
-        'date': entry.voucher.date.isoformat() if entry.voucher.date else None,
-        'account_id': entry.account_id,
-        'account_name': entry.account.name if entry.account else None,
-        'description': entry.description,
-        'amount': entry.amount,
-        'direction': entry.direction
-    } for entry in unreconciled_entries])
+    return jsonify({
+        'items': [{
+            'id': row.id,
+            'voucher_no': row.voucher_no,
+            'date': row.date.isoformat() if row.date else None,
+            'account_id': row.account_id,
+            'account_name': row.account_name,
+            'description': row.description,
+            'amount': row.amount,
+            'direction': row.direction
+        } for row in rows],
+        'next_cursor': _encode_cursor(rows[-1].date.isoformat(), rows[-1].id) if has_more else None,
+        'has_more': has_more
+    })
 
 # 财务报表相关路由
+
+# 解析报表日期参数；仅传日期时 end_of_day 决定取当天开始或结束时刻
+def _parse_report_date(name, end_of_day=False):
+    value = request.args.get(name)
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if len(value) == 10 and end_of_day:
+        moment = moment.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return moment
+
+def _report_rows(rows, field='balance'):
+    return [{'code': row.code, 'name': row.name, 'balance': getattr(row, field)} for row in rows]
+
 @api_bp.route('/reports/balance_sheet', methods=['GET'])
 def get_balance_sheet():
     # 获取当前用户
@@ -752,15 +1263,22 @@ def get_balance_sheet():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    # 资产负债表：资产 = 负债 + 所有者权益
-    assets = Account.query.filter_by(type='资产', user_id=user_id).all()
-    liabilities = Account.query.filter_by(type='负债', user_id=user_id).all()
-    equities = Account.query.filter_by(type='权益', user_id=user_id).all()
+    try:
+        as_of = _parse_report_date('as_of', end_of_day=True) or datetime.now()
+    except ValueError:
+        return jsonify({'message': '日期格式无效'}), 400
+    
+    # 资产负债表：资产 = 负债 + 所有者权益，一次分组查询取回三类科目的时点余额
+    rows = balances_as_of(user_id, as_of, types=['资产', '负债', '权益']).all()
+    assets = [row for row in rows if row.type == '资产']
+    liabilities = [row for row in rows if row.type == '负债']
+    equities = [row for row in rows if row.type == '权益']
     
     return jsonify({
-        'assets': [{'code': a.code, 'name': a.name, 'balance': a.balance} for a in assets],
-        'liabilities': [{'code': l.code, 'name': l.name, 'balance': l.balance} for l in liabilities],
-        'equities': [{'code': e.code, 'name': e.name, 'balance': e.balance} for e in equities],
+        'as_of': as_of.isoformat(),
+        'assets': _report_rows(assets),
+        'liabilities': _report_rows(liabilities),
+        'equities': _report_rows(equities),
         'total_assets': sum(a.balance for a in assets),
         'total_liabilities': sum(l.balance for l in liabilities),
         'total_equities': sum(e.balance for e in equities)
@@ -773,17 +1291,35 @@ def get_income_statement():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    # 利润表：收入 - 费用 = 利润
-    incomes = Account.query.filter_by(type='收入', user_id=user_id).all()
-    expenses = Account.query.filter_by(type='费用', user_id=user_id).all()
-    
-    total_income = sum(i.balance for i in incomes)
-    total_expense = sum(e.balance for e in expenses)
+    try:
+        date_from = _parse_report_date('from')
+        date_to = _parse_report_date('to', end_of_day=True) or datetime.now()
+    except ValueError:
+        return jsonify({'message': '日期格式无效'}), 400
+    
+    # 利润表：收入 - 费用 = 利润；指定起始日期时取区间发生额，否则取截至日累计数
+    # 期末结转损益凭证不属于经营发生额，从对应科目中剔除
+    closing = closing_movements(user_id, date_from, date_to)
+    if date_from:
+        rows = activity_between(user_id, date_from, date_to, types=['收入', '费用']).all()
+        field = 'amount'
+        rows = [{'code': row.code, 'name': row.name, 'type': row.type, field: row.closing_balance - row.opening_balance - closing.get(row.id, ZERO)} for row in rows]
+    else:
+        rows = balances_as_of(user_id, date_to, types=['收入', '费用']).all()
+        field = 'balance'
+        rows = [{'code': row.code, 'name': row.name, 'type': row.type, field: row.balance - closing.get(row.id, ZERO)} for row in rows]
+    incomes = [{'code': row['code'], 'name': row['name'], 'balance': row[field]} for row in rows if row['type'] == '收入']
+    expenses = [{'code': row['code'], 'name': row['name'], 'balance': row[field]} for row in rows if row['type'] == '费用']
+    
+    total_income = sum(i['balance'] for i in incomes)
+    total_expense = sum(e['balance'] for e in expenses)
     profit = total_income - total_expense
     
     return jsonify({
-        'incomes': [{'code': i.code, 'name': i.name, 'balance': i.balance} for i in incomes],
-        'expenses': [{'code': e.code, 'name': e.name, 'balance': e.balance} for e in expenses],
+        'from': date_from.isoformat() if date_from else None,
+        'to': date_to.isoformat(),
+        'incomes': incomes,
+        'expenses': expenses,
         'total_income': total_income,
         'total_expense': total_expense,
         'profit': profit
@@ -796,14 +1332,186 @@ def get_cash_flow():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
+    try:
+        date_from = _parse_report_date('from')
+        date_to = _parse_report_date('to', end_of_day=True) or datetime.now()
+    except ValueError:
+        return jsonify({'message': '日期格式无效'}), 400
+    
     # 现金流量表：简化版，只考虑现金相关科目
-    cash_accounts = Account.query.filter(Account.code.in_(['1001', '1002']), Account.user_id == user_id).all()
+    cash_codes = ['1001', '1002']
+    if not date_from:
+        cash_accounts = balances_as_of(user_id, date_to, codes=cash_codes).all()
+        return jsonify({
+            'from': None,
+            'to': date_to.isoformat(),
+            'cash_accounts': _report_rows(cash_accounts),
+            'total_cash': sum(c.balance for c in cash_accounts)
+        })
+    
+    # 指定区间时给出期初、流入（借方）、流出（贷方）和期末
+    cash_accounts = activity_between(user_id, date_from, date_to, codes=cash_codes).all()
+    return jsonify({
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'cash_accounts': [{
+            'code': c.code,
+            'name': c.name,
+            'opening_balance': c.opening_balance,
+            'inflow': c.debit_total,
+            'outflow': c.credit_total,
+            'balance': c.closing_balance
+        } for c in cash_accounts],
+        'total_opening_cash': sum(c.opening_balance for c in cash_accounts),
+        'total_inflow': sum(c.debit_total for c in cash_accounts),
+        'total_outflow': sum(c.credit_total for c in cash_accounts),
+        'total_cash': sum(c.closing_balance for c in cash_accounts)
+    })
+
+# 余额按科目性质拆分到借方或贷方列：借方性质科目正数记借方，贷方性质科目正数记贷方，负数记对方
+def _balance_sides(account_type, balance):
+    balance = balance or ZERO
+    if account_type not in DEBIT_NORMAL_TYPES:
+        balance = -balance
+    return (balance, ZERO) if balance >= 0 else (ZERO, -balance)
+
+# 试算平衡表：各科目（含下级汇总）期初余额、本期借贷方发生额和期末余额，level 限定输出的科目层级
+@api_bp.route('/reports/trial-balance', methods=['GET'])
+def get_trial_balance():
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    try:
+        date_to = _parse_report_date('to', end_of_day=True) or datetime.now()
+        # 未指定起始日期时取截止日期所在年度年初
+        date_from = _parse_report_date('from') or datetime(date_to.year, 1, 1)
+    except ValueError:
+        return jsonify({'message': '日期格式无效'}), 400
+    if date_from > date_to:
+        return jsonify({'message': '起始日期不能晚于截止日期'}), 400
+    try:
+        level = int(request.args['level']) if request.args.get('level') else None
+    except ValueError:
+        return jsonify({'message': 'level参数无效'}), 400
+    
+    rows = rollup_activity(user_id, date_from, date_to, max_level=level).all()
+    accounts = []
+    totals = dict.fromkeys(('opening_debit', 'opening_credit', 'debit_total', 'credit_total', 'closing_debit', 'closing_credit'), ZERO)
+    for row in rows:
+        opening_debit, opening_credit = _balance_sides(row.type, row.opening_balance)
+        closing_debit, closing_credit = _balance_sides(row.type, row.closing_balance)
+        item = {
+            'id': row.id,
+            'code': row.code,
+            'name': row.name,
+            'type': row.type,
+            'parent_id': row.parent_id,
+            'level': row.level,
+            'has_children': row.descendant_count > 0,
+            'opening_balance': row.opening_balance,
+            'opening_debit': opening_debit,
+            'opening_credit': opening_credit,
+            'debit_total': row.debit_total,
+            'credit_total': row.credit_total,
+            'closing_balance': row.closing_balance,
+            'closing_debit': closing_debit,
+            'closing_credit': closing_credit
+        }
+        accounts.append(item)
+        # 合计只取顶级科目，下级科目已包含在其汇总中
+        if row.level == 0:
+            for key in totals:
+                totals[key] += item[key]
     
     return jsonify({
-        'cash_accounts': [{'code': c.code, 'name': c.name, 'balance': c.balance} for c in cash_accounts],
-        'total_cash': sum(c.balance for c in cash_accounts)
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'level': level,
+        'accounts': accounts,
+        'totals': totals,
+        'balanced': (
+            totals['opening_debit'] == totals['opening_credit']
+            and totals['debit_total'] == totals['credit_total']
+            and totals['closing_debit'] == totals['closing_credit']
+        )
     })
 
+# 已结账期间列表
+@api_bp.route('/periods', methods=['GET'])
+def get_closed_periods():
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    periods = AccountingPeriod.query.filter_by(user_id=user_id).order_by(AccountingPeriod.period.desc()).all()
+    return jsonify([period.to_dict() for period in periods])
+
+# 期末结账：结转损益、年末转入利润分配、补齐快照并锁定期间
+@api_bp.route('/periods/<period>/close', methods=['POST'])
+def close_accounting_period(period):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    try:
+        record = close_period(user_id, period)
+        db.session.commit()
+    except ClosingError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'message': '结账成功', 'period': record.to_dict()})
+
+# 反结账：冲回并删除结账凭证，解除最近一个已结账期间的锁定
+@api_bp.route('/periods/<period>/reopen', methods=['POST'])
+def reopen_accounting_period(period):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    try:
+        voucher_ids = reopen_period(user_id, period)
+        db.session.commit()
+    except ClosingError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'message': '反结账成功', 'period': period, 'deleted_voucher_ids': voucher_ids})
+
+# 导出总账（已过账分录明细），流式输出 CSV / JSON Lines / XLSX
+@api_bp.route('/reports/general-ledger/export', methods=['GET'])
+def export_general_ledger_file():
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    file_format = request.args.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        return jsonify({'message': '不支持的导出格式，支持 csv、jsonl、xlsx'}), 400
+    try:
+        date_from = _parse_report_date('from')
+        date_to = _parse_report_date('to', end_of_day=True)
+    except ValueError:
+        return jsonify({'message': '日期格式无效'}), 400
+    account_id = request.args.get('account_id', type=int)
+    
+    mimetype, extension = EXPORT_FORMATS[file_format]
+    filename = 'general-ledger-{}-{}.{}'.format(
+        date_from.strftime('%Y%m%d') if date_from else 'all',
+        date_to.strftime('%Y%m%d') if date_to else datetime.now().strftime('%Y%m%d'),
+        extension
+    )
+    body = export_general_ledger(user_id, file_format, date_from, date_to, account_id)
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 # 获取仪表盘数据
 @api_bp.route('/dashboard', methods=['GET'])
 def get_dashboard_data():
@@ -812,68 +1520,62 @@ def get_dashboard_data():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    # 获取用户总数
-    total_users = User.query.count()
+    cached = dashboard_cache.get(user_id)
+    if cached is not None:
+        return jsonify(cached)
     
     # 计算本月收入和支出
     now = datetime.now()
     month_start = datetime(now.year, now.month, 1)
     
-    # 获取本月凭证
-    vouchers = Voucher.query.filter(
-        Voucher.user_id == user_id,
-        Voucher.date >= month_start
-    ).all()
-    
-    monthly_income = 0.0
-    monthly_expense = 0.0
-    
-    for voucher in vouchers:
-        for entry in voucher.entries:
-            account = Account.query.get(entry.account_id)
-            # 确保科目存在才进行后续操作
-            if account:
-                if account.type == '收入' and entry.direction == '贷方':
-                    monthly_income += entry.amount
-                elif account.type == '费用' and entry.direction == '借方':
-                    monthly_expense += entry.amount
-    
-    monthly_balance = monthly_income - monthly_expense
-    
-    # 获取总资产、总负债、总权益
-    assets = Account.query.filter_by(type='资产', user_id=user_id).all()
-    liabilities = Account.query.filter_by(type='负债', user_id=user_id).all()
-    equities = Account.query.filter_by(type='权益', user_id=user_id).all()
-    
-    total_assets = sum(a.balance for a in assets)
-    total_liabilities = sum(l.balance for l in liabilities)
-    total_equities = sum(e.balance for e in equities)
-    
-    # 获取当前用户的实际数据
-    # 科目数量
-    total_accounts = Account.query.filter_by(user_id=user_id).count()
-    
-    # 本月凭证数量
-    monthly_vouchers = Voucher.query.filter(
-        Voucher.user_id == user_id,
-        Voucher.date >= month_start
-    ).count()
-    
-    # 供应商数量
-    total_vendors = Vendor.query.filter_by(user_id=user_id).count()
-    
-    return jsonify({
-        'total_users': total_users,
-        'monthly_income': monthly_income,
-        'monthly_expense': monthly_expense,
-        'monthly_balance': monthly_balance,
-        'total_assets': total_assets,
-        'total_liabilities': total_liabilities,
-        'total_equities': total_equities,
-        'total_accounts': total_accounts,
-        'monthly_vouchers': monthly_vouchers,
-        'total_vendors': total_vendors
-    })
+    def monthly_amount(account_type, direction):
+        return db.select(db.func.coalesce(db.func.sum(VoucherEntry.amount), ZERO)).select_from(VoucherEntry).join(
+            Voucher, Voucher.id == VoucherEntry.voucher_id
+        ).join(
+            Account, Account.id == VoucherEntry.account_id
+        ).where(
+            Voucher.user_id == user_id,
+            Voucher.date >= month_start,
+            Account.type == account_type,
+            VoucherEntry.direction == direction
+        ).scalar_subquery()
+    
+    # 一次查询取回用户数、供应商数、本月凭证数及本月收入、支出
+    totals = db.session.query(
+        db.select(db.func.count(User.id)).scalar_subquery().label('total_users'),
+        db.select(db.func.count(Vendor.id)).where(Vendor.user_id == user_id).scalar_subquery().label('total_vendors'),
+        db.select(db.func.count(Voucher.id)).where(
+            Voucher.user_id == user_id,
+            Voucher.date >= month_start
+        ).scalar_subquery().label('monthly_vouchers'),
+        monthly_amount('收入', '贷方').label('monthly_income'),
+        monthly_amount('费用', '借方').label('monthly_expense')
+    ).one()
+    
+    # 按科目类型分组汇总余额和科目数量
+    by_type = {row.type: row for row in db.session.query(
+        Account.type,
+        db.func.coalesce(db.func.sum(Account.balance), ZERO).label('balance'),
+        db.func.count(Account.id).label('count')
+    ).filter(Account.user_id == user_id).group_by(Account.type)}
+    
+    def type_balance(account_type):
+        return by_type[account_type].balance if account_type in by_type else ZERO
+    
+    data = {
+        'total_users': totals.total_users,
+        'monthly_income': totals.monthly_income,
+        'monthly_expense': totals.monthly_expense,
+        'monthly_balance': totals.monthly_income - totals.monthly_expense,
+        'total_assets': type_balance('资产'),
+        'total_liabilities': type_balance('负债'),
+        'total_equities': type_balance('权益'),
+        'total_accounts': sum(row.count for row in by_type.values()),
+        'monthly_vouchers': totals.monthly_vouchers,
+        'total_vendors': totals.total_vendors
+    }
+    dashboard_cache.set(user_id, data, ttl=current_app.config['DASHBOARD_CACHE_TTL'])
+    return jsonify(data)
 
 # 采购订单相关路由
 @api_bp.route('/purchase-orders', methods=['GET'])
@@ -883,8 +1585,8 @@ def get_purchase_orders():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    purchase_orders = PurchaseOrder.query.filter_by(user_id=user_id).all()
-    return jsonify([order.to_dict() for order in purchase_orders])
+    purchase_orders = PurchaseOrder.query.options(*PURCHASE_ORDER_LOAD_OPTIONS).filter_by(user_id=user_id).all()
+    return jsonify([serialize_purchase_order(order) for order in purchase_orders])
 
 @api_bp.route('/purchase-orders/<int:id>', methods=['GET'])
 def get_purchase_order(id):
@@ -906,8 +1608,7 @@ def create_purchase_order():
     data = request.get_json()
     
     # 生成订单编号
-    now = datetime.now()
-    order_no = now.strftime('%Y%m%d') + '-' + str(PurchaseOrder.query.count() + 1).zfill(4)
+    order_no = next_number(user_id, 'purchase_order')
     
     new_order = PurchaseOrder(
         order_number=order_no,
@@ -991,8 +1692,8 @@ def get_tax_declarations():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    declarations = TaxDeclaration.query.filter_by(user_id=user_id).all()
-    return jsonify([declaration.to_dict() for declaration in declarations])
+    declarations = TaxDeclaration.query.options(*TAX_DECLARATION_LOAD_OPTIONS).filter_by(user_id=user_id).all()
+    return jsonify([serialize_tax_declaration(declaration) for declaration in declarations])
 
 @api_bp.route('/tax-declarations/<int:id>', methods=['GET'])
 def get_tax_declaration(id):
@@ -1077,22 +1778,17 @@ def calculate_tax():
     if not user_id:
         return jsonify({'message': '未登录'}), 401
     
-    data = request.get_json()
-    period = data['period']
-    tax_type = data['tax_type']
-    
-    # 模拟税款计算逻辑
-    # 实际应用中，这里应该根据财务数据进行复杂计算
-    calculation_result = {
-        'period': period,
-        'tax_type': tax_type,
-        'taxable_income': 1000000.00,
-        'input_tax': 80000.00,
-        'output_tax': 130000.00,
-        'taxable_amount': 500000.00,
-        'deduction_amount': 50000.00,
-        'tax_payable': 95000.00  # 示例计算结果
-    }
+    data = request.get_json() or {}
+    try:
+        tax_rate = float(data['tax_rate']) if data.get('tax_rate') not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({'message': '税率无效'}), 400
+    
+    # 按申报所属期的已过账发生额计算，期间汇总有缓存
+    try:
+        calculation_result = calculate_period_tax(user_id, data.get('period'), data.get('tax_type'), tax_rate)
+    except TaxCalculationError as e:
+        return jsonify({'message': str(e)}), 400
     
     return jsonify(calculation_result)
 
@@ -1142,26 +1838,26 @@ def get_awaiting_payment_bills():
         return jsonify({'message': '未登录'}), 401
     
     # 查询状态为"已核对待付款"的账单
-    bills = Bill.query.filter_by(user_id=user_id, status='已核对待付款').all()
+    bills = Bill.query.options(*BILL_LOAD_OPTIONS).filter_by(user_id=user_id, status='已核对待付款').all()
     
     # 查询状态为"success"的税务申报（需要付款）
-    tax_declarations = TaxDeclaration.query.filter_by(user_id=user_id, status='success').all()
+    tax_declarations = TaxDeclaration.query.options(*TAX_DECLARATION_LOAD_OPTIONS).filter_by(user_id=user_id, status='success').all()
     
     # 查询状态为"approved"的采购订单（需要付款）
-    purchase_orders = PurchaseOrder.query.filter_by(user_id=user_id, status='approved').all()
+    purchase_orders = PurchaseOrder.query.options(*PURCHASE_ORDER_LOAD_OPTIONS).filter_by(user_id=user_id, status='approved').all()
     
     # 组合所有待付款记录
     all_payments = []
     
     # 添加账单记录
     for bill in bills:
-        bill_dict = bill.to_dict()
+        bill_dict = serialize_bill(bill)
         bill_dict['type'] = 'bill'  # 添加类型标识
         all_payments.append(bill_dict)
     
     # 添加税务申报记录
     for tax in tax_declarations:
-        tax_dict = tax.to_dict()
+        tax_dict = serialize_tax_declaration(tax)
         tax_dict['type'] = 'tax'  # 添加类型标识
         tax_dict['vendor_name'] = '税务部门'  # 税务部门作为供应商
         tax_dict['due_date'] = datetime.now().date().isoformat()  # 默认为当前日期
@@ -1169,15 +1865,22 @@ def get_awaiting_payment_bills():
     
     # 添加采购订单记录
     for po in purchase_orders:
-        po_dict = po.to_dict()
+        po_dict = serialize_purchase_order(po)
         po_dict['type'] = 'purchase_order'  # 添加类型标识
         po_dict['vendor_name'] = po.vendor.name if po.vendor else '未知供应商'
-        po_dict['amount'] = sum(item.quantity * item.unit_price for item in po.items) if po.items else 0.0  # 计算订单总金额
+        po_dict['amount'] = purchase_order_amount(po)  # 计算订单总金额
         po_dict['due_date'] = datetime.now().date().isoformat()  # 默认为当前日期
         all_payments.append(po_dict)
     
     return jsonify(all_payments)
 
+# 付款结果中各类型记录的键名及序列化函数
+PAYMENT_RESULT_SERIALIZERS = {
+    'bill': ('bills', serialize_bill),
+    'tax': ('tax_declarations', serialize_tax_declaration),
+    'purchase_order': ('purchase_orders', serialize_purchase_order)
+}
+
 # 执行付款
 @api_bp.route('/payments/execute', methods=['POST'])
 def execute_payment():
@@ -1187,366 +1890,49 @@ def execute_payment():
         return jsonify({'message': '未登录'}), 401
     
     data = request.get_json()
-    bill_ids = data.get('bill_ids', [])
-    tax_ids = data.get('tax_ids', [])
-    purchase_order_ids = data.get('purchase_order_ids', [])
+    try:
+        bank_account, payables = prepare_payment_run(user_id, data)
+    except PaymentRunError as e:
+        return jsonify({'message': str(e)}), e.status
     payment_method = data.get('payment_method', '银企直连')
-    bank_account_id = data.get('bank_account_id')
-    
-    # 检查是否选择了任何付款记录
-    if not bill_ids and not tax_ids and not purchase_order_ids:
-        return jsonify({'message': '请选择要支付的记录'}), 400
-    
-    if not bank_account_id:
-        return jsonify({'message': '请选择付款银行账户'}), 400
-    
-    # 检查银行账户是否存在且属于当前用户
-    bank_account = Account.query.filter_by(id=bank_account_id, user_id=user_id).first()
-    if not bank_account:
-        return jsonify({'message': '银行账户不存在'}), 404
-    
-    # 获取所有要支付的记录
-    bills = []
-    taxes = []
-    purchase_orders = []
-    
-    total_amount = 0.0
-    
-    # 处理账单记录
-    if bill_ids:
-        bills = Bill.query.filter(Bill.id.in_(bill_ids), Bill.user_id == user_id).all()
-        if len(bills) != len(bill_ids):
-            return jsonify({'message': '部分账单不存在或无权限访问'}), 400
-        total_amount += sum(bill.amount for bill in bills)
-    
-    # 处理税务申报记录
-    if tax_ids:
-        taxes = TaxDeclaration.query.filter(TaxDeclaration.id.in_(tax_ids), TaxDeclaration.user_id == user_id).all()
-        if len(taxes) != len(tax_ids):
-            return jsonify({'message': '部分税务申报不存在或无权限访问'}), 400
-        total_amount += sum(tax.tax_payable for tax in taxes)
-    
-    # 处理采购订单记录
-    if purchase_order_ids:
-        purchase_orders = PurchaseOrder.query.filter(PurchaseOrder.id.in_(purchase_order_ids), PurchaseOrder.user_id == user_id).all()
-        if len(purchase_orders) != len(purchase_order_ids):
-            return jsonify({'message': '部分采购订单不存在或无权限访问'}), 400
-        for po in purchase_orders:
-            po_amount = sum(item.quantity * item.unit_price for item in po.items) if po.items else 0.0
-            total_amount += po_amount
-    
-    # 检查银行账户余额是否充足
-    if bank_account.balance < total_amount:
-        return jsonify({'message': '银行账户余额不足'}), 400
+    
+    def report_progress(done, total):
+        current_app.logger.info('付款处理进度: %s/%s', done, total)
     
     try:
         # 模拟银企直连调用，这里应该调用真实的银行API
         # 假设调用成功
-        receipt_number = f"PAY-{datetime.now().strftime('%Y%m%d%H%M%S')}-{user_id}"
-        
-        # 开始事务
-        
-        # 1. 处理账单付款
-        for bill in bills:
-            # 创建付款记录
-            # 使用text()函数包装SQL语句，符合SQLAlchemy要求
-            db.session.execute(
-                db.text("INSERT INTO payments (bill_id, amount, payment_method, bank_account_id, receipt_number, status, user_id, payment_date, created_at, updated_at) "
-                "VALUES (:bill_id, :amount, :method, :bank_id, :receipt, :status, :user_id, :date, :created, :updated)"),
-                {
-                    'bill_id': bill.id,
-                    'amount': bill.amount,
-                    'method': payment_method,
-                    'bank_id': bank_account_id,
-                    'receipt': receipt_number,
-                    'status': 'success',
-                    'user_id': user_id,
-                    'date': datetime.utcnow(),
-                    'created': datetime.utcnow(),
-                    'updated': datetime.utcnow()
-                }
-            )
-            
-            # 更新账单状态为已支付
-            bill.status = '已支付'
-            
-            # 生成付款凭证（借：应付账款，贷：银行存款）
-            # 生成凭证号
-            voucher_no = datetime.now().strftime('%Y%m%d') + '-' + str(Voucher.query.count() + 1).zfill(4)
-            
-            # 安全获取供应商名称
-            vendor_name = bill.vendor.name if bill.vendor else '未知供应商'
-            
-            # 创建凭证
-            voucher = Voucher(
-                voucher_no=voucher_no,
-                date=datetime.utcnow(),
-                description=f'支付{vendor_name}账单 {bill.bill_no}',
-                status='已审核',
-                posted=True,
-                posted_at=datetime.utcnow(),
-                user_id=user_id
-            )
-            db.session.add(voucher)
-            db.session.flush()  # 获取voucher.id
-            
-            # 查找应付账款科目
-            accounts_payable = Account.query.filter(
-                Account.user_id == user_id,
-                Account.code.startswith('2202')
-            ).first()
-            
-            if not accounts_payable:
-                # 如果没有应付账款科目，创建一个
-                accounts_payable = Account(
-                    code='2202',
-                    name='应付账款',
-                    type='负债',
-                    parent_id=None,
-                    description='应付账款',
-                    balance=0.0,
-                    user_id=user_id
-                )
-                db.session.add(accounts_payable)
-                db.session.flush()
-            
-            # 创建凭证分录
-            # 借：应付账款
-            debit_entry = VoucherEntry(
-                voucher_id=voucher.id,
-                account_id=accounts_payable.id,
-                direction='借方',
-                amount=bill.amount,
-                description=f'支付{vendor_name}账单'
-            )
-            db.session.add(debit_entry)
-            
-            # 贷：银行存款
-            credit_entry = VoucherEntry(
-                voucher_id=voucher.id,
-                account_id=bank_account_id,
-                direction='贷方',
-                amount=bill.amount,
-                description=f'从{bank_account.name}支付'
-            )
-            db.session.add(credit_entry)
-            
-            # 关联凭证到付款记录 - 注释掉，因为直接使用SQL插入
-            
-            # 更新银行账户余额
-            bank_account.balance -= bill.amount
-            
-            # 更新应付账款科目余额
-            accounts_payable.balance -= bill.amount
-        
-        # 2. 处理税务申报付款
-        for tax in taxes:
-            # 创建付款记录
-            # 使用text()函数包装SQL语句，符合SQLAlchemy要求
-            db.session.execute(
-                db.text("INSERT INTO payments (tax_declaration_id, amount, payment_method, bank_account_id, receipt_number, status, user_id, payment_date, created_at, updated_at) "
-                "VALUES (:tax_id, :amount, :method, :bank_id, :receipt, :status, :user_id, :date, :created, :updated)"),
-                {
-                    'tax_id': tax.id,
-                    'amount': tax.tax_payable,
-                    'method': payment_method,
-                    'bank_id': bank_account_id,
-                    'receipt': receipt_number,
-                    'status': 'success',
-                    'user_id': user_id,
-                    'date': datetime.utcnow(),
-                    'created': datetime.utcnow(),
-                    'updated': datetime.utcnow()
-                }
-            )
-            
-            # 更新税务申报状态为已支付
-            tax.status = 'paid'
-            
-            # 生成付款凭证（借：应交税费，贷：银行存款）
-            # 生成凭证号
-            voucher_no = datetime.now().strftime('%Y%m%d') + '-' + str(Voucher.query.count() + 1).zfill(4)
-            
-            # 创建凭证
-            voucher = Voucher(
-                voucher_no=voucher_no,
-                date=datetime.utcnow(),
-                description=f'支付{tax.tax_type}（所属期：{tax.period}）',
-                status='已审核',
-                posted=True,
-                posted_at=datetime.utcnow(),
-                user_id=user_id
-            )
-            db.session.add(voucher)
-            db.session.flush()  # 获取voucher.id
-            
-            # 查找应交税费科目
-            tax_payable_account = Account.query.filter(
-                Account.user_id == user_id,
-                Account.code.startswith('2221')
-            ).first()
-            
-            if not tax_payable_account:
-                # 如果没有应交税费科目，创建一个
-                tax_payable_account = Account(
-                    code='2221',
-                    name='应交税费',
-                    type='负债',
-                    parent_id=None,
-                    description='应交税费',
-                    balance=0.0,
-                    user_id=user_id
-                )
-                db.session.add(tax_payable_account)
-                db.session.flush()
-            
-            # 创建凭证分录
-            # 借：应交税费
-            debit_entry = VoucherEntry(
-                voucher_id=voucher.id,
-                account_id=tax_payable_account.id,
-                direction='借方',
-                amount=tax.tax_payable,
-                description=f'支付{tax.tax_type}（所属期：{tax.period}）'
-            )
-            db.session.add(debit_entry)
-            
-            # 贷：银行存款
-            credit_entry = VoucherEntry(
-                voucher_id=voucher.id,
-                account_id=bank_account_id,
-                direction='贷方',
-                amount=tax.tax_payable,
-                description=f'从{bank_account.name}支付'
-            )
-            db.session.add(credit_entry)
-            
-            # 关联凭证到付款记录 - 注释掉，因为直接使用SQL插入
-            
-            # 更新银行账户余额
-            bank_account.balance -= tax.tax_payable
-            
-            # 更新应交税费科目余额
-            tax_payable_account.balance -= tax.tax_payable
-        
-        # 3. 处理采购订单付款
-        for po in purchase_orders:
-            # 计算采购订单总金额
-            po_amount = sum(item.quantity * item.unit_price for item in po.items) if po.items else 0.0
-            
-            # 创建付款记录
-            # 使用text()函数包装SQL语句，符合SQLAlchemy要求
-            db.session.execute(
-                db.text("INSERT INTO payments (purchase_order_id, amount, payment_method, bank_account_id, receipt_number, status, user_id, payment_date, created_at, updated_at) "
-                "VALUES (:po_id, :amount, :method, :bank_id, :receipt, :status, :user_id, :date, :created, :updated)"),
-                {
-                    'po_id': po.id,
-                    'amount': po_amount,
-                    'method': payment_method,
-                    'bank_id': bank_account_id,
-                    'receipt': receipt_number,
-                    'status': 'success',
-                    'user_id': user_id,
-                    'date': datetime.utcnow(),
-                    'created': datetime.utcnow(),
-                    'updated': datetime.utcnow()
-                }
-            )
-            
-            # 更新采购订单状态为已完成
-            po.status = 'completed'
-            
-            # 生成付款凭证（借：应付账款，贷：银行存款）
-            # 生成凭证号
-            voucher_no = datetime.now().strftime('%Y%m%d') + '-' + str(Voucher.query.count() + 1).zfill(4)
-            
-            # 安全获取供应商名称
-            vendor_name = po.vendor.name if po.vendor else '未知供应商'
-            
-            # 创建凭证
-            voucher = Voucher(
-                voucher_no=voucher_no,
-                date=datetime.utcnow(),
-                description=f'支付{vendor_name}采购订单 {po.order_number}',
-                status='已审核',
-                posted=True,
-                posted_at=datetime.utcnow(),
-                user_id=user_id
-            )
-            db.session.add(voucher)
-            db.session.flush()  # 获取voucher.id
-            
-            # 查找应付账款科目
-            accounts_payable = Account.query.filter(
-                Account.user_id == user_id,
-                Account.code.startswith('2202')
-            ).first()
-            
-            if not accounts_payable:
-                # 如果没有应付账款科目，创建一个
-                accounts_payable = Account(
-                    code='2202',
-                    name='应付账款',
-                    type='负债',
-                    parent_id=None,
-                    description='应付账款',
-                    balance=0.0,
-                    user_id=user_id
-                )
-                db.session.add(accounts_payable)
-                db.session.flush()
-            
-            # 创建凭证分录
-            # 借：应付账款
-            debit_entry = VoucherEntry(
-                voucher_id=voucher.id,
-                account_id=accounts_payable.id,
-                direction='借方',
-                amount=po_amount,
-                description=f'支付{vendor_name}采购订单'
-            )
-            db.session.add(debit_entry)
-            
-            # 贷：银行存款
-            credit_entry = VoucherEntry(
-                voucher_id=voucher.id,
-                account_id=bank_account_id,
-                direction='贷方',
-                amount=po_amount,
-                description=f'从{bank_account.name}支付'
-            )
-            db.session.add(credit_entry)
-            
-            # 关联凭证到付款记录 - 注释掉，因为直接使用SQL插入
-            
-            # 更新银行账户余额
-            bank_account.balance -= po_amount
-            
-            # 更新应付账款科目余额
-            accounts_payable.balance -= po_amount
-        
-        # 提交事务
-        db.session.commit()
+        run = execute_payment_run(
+            user_id,
+            bank_account,
+            payables,
+            payment_method=payment_method,
+            consolidate=bool(data.get('consolidate')),
+            progress=report_progress if len(payables) > PAYMENT_BATCH_SIZE else None
+        )
         
-        # 准备返回结果
+        # 准备返回结果（提交前序列化，避免提交后逐条刷新记录）
         result = {
             'message': '付款成功',
-            'total_amount': total_amount,
-            'receipt_number': receipt_number
+            'total_amount': run['total_amount'],
+            'receipt_number': run['receipt_number'],
+            'payment_count': run['payment_count'],
+            'voucher_ids': run['voucher_ids']
         }
+        for kind, record, _, _, _ in payables:
+            key, serialize = PAYMENT_RESULT_SERIALIZERS[kind]
+            result.setdefault(key, []).append(serialize(record))
         
-        # 添加各类型付款记录到结果
-        if bills:
-            result['bills'] = [bill.to_dict() for bill in bills]
-        if taxes:
-            result['tax_declarations'] = [tax.to_dict() for tax in taxes]
-        if purchase_orders:
-            result['purchase_orders'] = [po.to_dict() for po in purchase_orders]
-        
-        return jsonify(result)
+        mark_ledger_changed(user_id)
+        db.session.commit()
+    except PeriodClosedError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'付款失败: {str(e)}'}), 500
+    
+    return jsonify(result)
 
 # 获取银行账户列表（用于付款选择）
 @api_bp.route('/accounts/bank', methods=['GET'])
@@ -1557,10 +1943,104 @@ def get_bank_accounts():
         return jsonify({'message': '未登录'}), 401
     
     # 查询资产类且名称包含银行的账户
-    bank_accounts = Account.query.filter(
-        Account.user_id == user_id,
-        Account.type == '资产',
-        (Account.name.contains('银行') | Account.code.startswith('1002'))
-    ).all()
+    # 一次取回全部科目及汇总余额，在内存中筛选银行账户
+    rows = [
+        row for row in account_hierarchy(user_id)
+        if row[0].type == '资产' and (('银行' in (row[0].name or '')) or (row[0].code or '').startswith('1002'))
+    ]
+    
+    return jsonify(serialize_accounts(rows))
+
+# 提交后台任务：JSON 请求体为 {kind, params}；导入类任务以表单上传文件，kind 及其余参数为表单字段
+@api_bp.route('/jobs', methods=['POST'])
+def create_job():
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    upload = request.files.get('file')
+    if upload:
+        params = request.form.to_dict()
+        kind = params.pop('kind', None)
+        params.update(filename=upload.filename, content_type=upload.mimetype)
+    else:
+        data = request.get_json(silent=True) or {}
+        kind = data.get('kind')
+        params = data.get('params') or {}
+    if kind not in JOB_HANDLERS:
+        return jsonify({'message': '不支持的任务类型'}), 400
+    if kind in FILE_JOB_KINDS and not upload:
+        return jsonify({'message': '请上传文件'}), 400
+    
+    job = enqueue_job(user_id, kind, params)
+    if upload:
+        # 上传文件先保存到任务目录，由工作进程读取
+        path = job_file_path(job.id, '.upload')
+        upload.save(path)
+        job.params = json.dumps(dict(params, path=path), ensure_ascii=False)
+    db.session.commit()
+    return jsonify({'message': '任务已提交', 'job': job_to_dict(job)}), 202
+
+# 获取最近的后台任务
+@api_bp.route('/jobs', methods=['GET'])
+def get_jobs():
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    query = Job.query.filter(Job.user_id == user_id)
+    status = request.args.get('status')
+    if status in JOB_STATUSES:
+        query = query.filter(Job.status == status)
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    jobs = query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit).all()
+    return jsonify([job_to_dict(job) for job in jobs])
+
+# 查询后台任务状态及进度
+@api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    job = Job.query.filter_by(id=job_id, user_id=user_id).first_or_404()
+    return jsonify(job_to_dict(job))
+
+# 取消后台任务
+@api_bp.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job_request(job_id):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
+    
+    job = Job.query.filter_by(id=job_id, user_id=user_id).first_or_404()
+    if job.status in ('succeeded', 'failed'):
+        return jsonify({'message': '任务已结束，无法取消'}), 400
+    try:
+        cancel_job(job)
+        db.session.commit()
+    except OperationalError:
+        db.session.rollback()
+        return jsonify({'message': '数据库繁忙，请稍后重试'}), 503
+    return jsonify({'message': '已取消' if job.status == 'cancelled' else '已请求取消', 'job': job_to_dict(job)})
+
+# 下载导出类任务的结果文件
+@api_bp.route('/jobs/<int:job_id>/download', methods=['GET'])
+def download_job_file(job_id):
+    # 获取当前用户
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'message': '未登录'}), 401
     
-    return jsonify([account.to_dict() for account in bank_accounts])
+    job = Job.query.filter_by(id=job_id, user_id=user_id).first_or_404()
+    result = json.loads(job.result) if job.result else {}
+    if job.status != 'succeeded' or 'filename' not in result:
+        return jsonify({'message': '任务没有可下载的文件'}), 400
+    path = export_file_path(job.id, result['filename'].rsplit('.', 1)[-1])
+    if not os.path.exists(path):
+        return jsonify({'message': '文件已过期'}), 404
+    return send_file(path, mimetype=result['mimetype'], as_attachment=True, download_name=result['filename'])
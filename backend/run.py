@@ -18,6 +18,6 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from app import app
 
 if __name__ == '__main__':
-    # 使用不同的端口和禁用调试模式自动重载
+    # 开发服务器：使用不同的端口并禁用自动重载；生产环境请使用 serve.py
     logger.info('启动Flask应用...')
-    app.run(host='127.0.0.1', port=5001, debug=True, use_reloader=False)
+    app.run(host='127.0.0.1', port=5001, debug=app.config['DEBUG'], use_reloader=False)
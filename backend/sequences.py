@@ -0,0 +1,45 @@
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, DocumentSequence
+
+# 单据编号生成：计数器表上的原子自增（INSERT ... ON CONFLICT DO UPDATE ... RETURNING），
+# 与 COUNT(*) 无关，多进程并发下也不会重复
+
+# 编号格式；单据编号全局唯一，因此包含用户ID
+NUMBER_FORMATS = {
+    'voucher': '{day}-{user_id}-{seq:04d}',
+    'purchase_order': '{day}-{user_id}-{seq:04d}',
+    'bill': 'B{day}-{user_id}-{seq:04d}',
+    'payment': 'PAY-{day}-{user_id}-{seq:04d}',
+}
+
+def _insert():
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert
+    return sqlite.insert
+
+# 预留 count 个序号，返回本次分配的最后一个序号；随所在事务提交或回滚
+def allocate(user_id, doc_type, day, count=1):
+    table = DocumentSequence.__table__
+    statement = _insert()(table).values(
+        user_id=user_id,
+        doc_type=doc_type,
+        day=day,
+        last_value=count
+    ).on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.doc_type, table.c.day],
+        set_={'last_value': table.c.last_value + count}
+    ).returning(table.c.last_value)
+    return db.session.execute(statement).scalar_one()
+
+# 批量生成单据编号
+def next_numbers(user_id, doc_type, count, now=None):
+    if count <= 0:
+        return []
+    day = (now or datetime.now()).strftime('%Y%m%d')
+    last = allocate(user_id, doc_type, day, count)
+    number_format = NUMBER_FORMATS[doc_type]
+    return [number_format.format(day=day, user_id=user_id, seq=seq) for seq in range(last - count + 1, last + 1)]
+
+def next_number(user_id, doc_type, now=None):
+    return next_numbers(user_id, doc_type, 1, now)[0]
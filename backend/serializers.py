@@ -0,0 +1,210 @@
+from sqlalchemy.orm import joinedload, selectinload
+from money import ZERO, money_mul
+from models import Voucher, VoucherEntry, BankStatement, PurchaseOrder, PurchaseOrderItem, TaxDeclaration, Bill
+
+# 序列化层：列表接口配合预加载策略使用，序列化过程中不再触发懒加载查询
+
+# 预加载策略
+VOUCHER_LOAD_OPTIONS = (
+    selectinload(Voucher.entries).joinedload(VoucherEntry.account),
+)
+VOUCHER_ENTRY_LOAD_OPTIONS = (
+    joinedload(VoucherEntry.account),
+)
+BANK_STATEMENT_LOAD_OPTIONS = (
+    joinedload(BankStatement.account),
+    selectinload(BankStatement.items),
+)
+PURCHASE_ORDER_LOAD_OPTIONS = (
+    joinedload(PurchaseOrder.vendor),
+    selectinload(PurchaseOrder.items).joinedload(PurchaseOrderItem.account),
+)
+TAX_DECLARATION_LOAD_OPTIONS = (
+    joinedload(TaxDeclaration.user),
+)
+BILL_LOAD_OPTIONS = (
+    joinedload(Bill.vendor),
+    joinedload(Bill.purchase_order),
+)
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+# 科目
+def serialize_account(account):
+    return {
+        'id': account.id,
+        'code': account.code,
+        'name': account.name,
+        'type': account.type,
+        'parent_id': account.parent_id,
+        'description': account.description,
+        'balance': account.balance,
+        'user_id': account.user_id,
+        'created_at': _iso(account.created_at),
+        'updated_at': _iso(account.updated_at)
+    }
+
+def serialize_account_brief(account):
+    return {
+        'id': account.id,
+        'code': account.code,
+        'name': account.name,
+        'type': account.type
+    }
+
+# 科目列表行来自 hierarchy.account_hierarchy：(科目, 汇总余额, 下级科目数, 层级)
+def serialize_account_row(row):
+    account, total_balance, descendant_count, level = row
+    data = serialize_account(account)
+    data['total_balance'] = total_balance if total_balance is not None else account.balance
+    data['descendant_count'] = descendant_count or 0
+    data['level'] = level or 0
+    return data
+
+def serialize_accounts(rows):
+    return [serialize_account_row(row) for row in rows]
+
+# 按 parent_id 在内存中一次组装科目树，每个科目只序列化一次
+def serialize_account_tree(rows):
+    nodes = {}
+    for row in rows:
+        node = serialize_account_row(row)
+        node['children'] = []
+        nodes[node['id']] = node
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node['parent_id'])
+        (parent['children'] if parent is not None else roots).append(node)
+    return roots
+
+# 凭证
+def serialize_voucher_entry(entry):
+    return {
+        'id': entry.id,
+        'voucher_id': entry.voucher_id,
+        'account_id': entry.account_id,
+        'direction': entry.direction,
+        'amount': entry.amount,
+        'description': entry.description,
+        'account': serialize_account_brief(entry.account) if entry.account else None
+    }
+
+def serialize_voucher(voucher, entries=True):
+    data = {
+        'id': voucher.id,
+        'voucher_no': voucher.voucher_no,
+        'date': _iso(voucher.date),
+        'description': voucher.description,
+        'status': voucher.status,
+        'posted': voucher.posted,
+        'posted_at': _iso(voucher.posted_at),
+        'user_id': voucher.user_id,
+        'created_at': _iso(voucher.created_at),
+        'updated_at': _iso(voucher.updated_at)
+    }
+    if entries:
+        data['entries'] = [serialize_voucher_entry(entry) for entry in voucher.entries]
+    return data
+
+# 供应商
+def serialize_vendor(vendor):
+    return vendor.to_dict()
+
+# 银行对账单
+def serialize_bank_statement_item(item):
+    return item.to_dict()
+
+def serialize_bank_statement(statement, items=True):
+    data = {
+        'id': statement.id,
+        'account_id': statement.account_id,
+        'account_name': statement.account.name if statement.account else None,
+        'statement_date': _iso(statement.statement_date),
+        'opening_balance': statement.opening_balance,
+        'closing_balance': statement.closing_balance,
+        'status': statement.status,
+        'item_count': statement.item_count,
+        'reconciled_count': statement.reconciled_count,
+        'reconciled_amount': statement.reconciled_amount,
+        'user_id': statement.user_id,
+        'created_at': _iso(statement.created_at),
+        'updated_at': _iso(statement.updated_at)
+    }
+    if items:
+        data['items'] = [serialize_bank_statement_item(item) for item in statement.items]
+    return data
+
+# 采购订单
+def serialize_purchase_order_item(item):
+    return {
+        'id': item.id,
+        'purchase_order_id': item.purchase_order_id,
+        'product_name': item.product_name,
+        'quantity': item.quantity,
+        'unit_price': item.unit_price,
+        'account_id': item.account_id,
+        'account_name': item.account.name if item.account else None,
+        'description': item.description,
+        'created_at': _iso(item.created_at),
+        'updated_at': _iso(item.updated_at)
+    }
+
+def serialize_purchase_order(order):
+    return {
+        'id': order.id,
+        'order_number': order.order_number,
+        'vendor_id': order.vendor_id,
+        'vendor': serialize_vendor(order.vendor) if order.vendor else None,
+        'order_date': _iso(order.order_date),
+        'description': order.description,
+        'status': order.status,
+        'user_id': order.user_id,
+        'created_at': _iso(order.created_at),
+        'updated_at': _iso(order.updated_at),
+        'items': [serialize_purchase_order_item(item) for item in order.items]
+    }
+
+def purchase_order_amount(order):
+    return sum((money_mul(item.unit_price, item.quantity) for item in order.items), ZERO)
+
+# 税务申报
+def serialize_tax_declaration(declaration):
+    return {
+        'id': declaration.id,
+        'period': declaration.period,
+        'tax_type': declaration.tax_type,
+        'taxable_income': declaration.taxable_income,
+        'tax_rate': declaration.tax_rate,
+        'input_tax': declaration.input_tax,
+        'output_tax': declaration.output_tax,
+        'taxable_amount': declaration.taxable_amount,
+        'deduction_amount': declaration.deduction_amount,
+        'tax_payable': declaration.tax_payable,
+        'status': declaration.status,
+        'declaration_time': _iso(declaration.declaration_time),
+        'receipt_number': declaration.receipt_number,
+        'failure_reason': declaration.failure_reason,
+        'user_id': declaration.user_id,
+        'user_name': declaration.user.username if declaration.user else None,
+        'created_at': _iso(declaration.created_at),
+        'updated_at': _iso(declaration.updated_at)
+    }
+
+# 应付账单
+def serialize_bill(bill):
+    return {
+        'id': bill.id,
+        'bill_no': bill.bill_no,
+        'vendor_id': bill.vendor_id,
+        'vendor_name': bill.vendor.name if bill.vendor else None,
+        'purchase_order_id': bill.purchase_order_id,
+        'purchase_order_number': bill.purchase_order.order_number if bill.purchase_order else None,
+        'amount': bill.amount,
+        'due_date': _iso(bill.due_date),
+        'status': bill.status,
+        'description': bill.description,
+        'user_id': bill.user_id,
+        'created_at': _iso(bill.created_at),
+        'updated_at': _iso(bill.updated_at)
+    }
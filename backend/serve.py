@@ -0,0 +1,84 @@
+import os
+import sys
+import logging
+import argparse
+import importlib.util
+import multiprocessing
+
+# 生产环境启动入口：Linux/macOS 使用 gunicorn 多进程多线程，Windows 或未安装 gunicorn 时使用 waitress 多线程
+#   python serve.py                     按配置启动
+#   python serve.py -w 4 -t 8 -p 8000   指定工作进程数、线程数和端口
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+
+logger = logging.getLogger('serve')
+
+# 工作进程数默认按CPU核数计算；SQLite 写入串行，进程再多也不会提高写吞吐，默认最多4个
+def default_workers():
+    workers = multiprocessing.cpu_count() * 2 + 1
+    if Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        workers = min(workers, 4)
+    return workers
+
+def serve_gunicorn(host, port, workers, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': f'{host}:{port}',
+                'workers': workers,
+                'threads': threads,
+                'worker_class': 'gthread',
+                'timeout': 120,
+                # 主进程先导入应用并执行数据库迁移，避免多个工作进程同时迁移
+                'preload_app': True,
+                'post_fork': post_fork,
+                'accesslog': '-',
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    Application().run()
+
+# 主进程中建立的数据库连接不能跨 fork 共用，工作进程启动后丢弃并重新建立
+def post_fork(server, worker):
+    from app import app
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+def serve_waitress(host, port, threads):
+    from waitress import serve
+    from app import app
+    serve(app, host=host, port=port, threads=threads)
+
+def main():
+    parser = argparse.ArgumentParser(description='会计财务系统API生产服务')
+    parser.add_argument('-H', '--host', default=Config.SERVER_HOST)
+    parser.add_argument('-p', '--port', type=int, default=Config.SERVER_PORT)
+    parser.add_argument('-w', '--workers', type=int, default=Config.WEB_CONCURRENCY or None, help='工作进程数（仅 gunicorn）')
+    parser.add_argument('-t', '--threads', type=int, default=Config.WEB_THREADS, help='每个工作进程的线程数')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if Config.DEBUG:
+        logger.warning('DEBUG 已开启，生产环境请设置 DEBUG=False')
+    if args.threads > Config.DB_POOL_SIZE + Config.DB_MAX_OVERFLOW:
+        logger.warning('线程数 %s 超过数据库连接池上限 %s', args.threads, Config.DB_POOL_SIZE + Config.DB_MAX_OVERFLOW)
+
+    if sys.platform != 'win32':
+        if importlib.util.find_spec('gunicorn'):
+            serve_gunicorn(args.host, args.port, args.workers or default_workers(), args.threads)
+            return
+        logger.warning('未安装 gunicorn，改用 waitress 单进程多线程运行')
+    serve_waitress(args.host, args.port, args.threads)
+
+if __name__ == '__main__':
+    main()
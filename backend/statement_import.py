@@ -0,0 +1,281 @@
+import io
+import re
+import csv
+import hashlib
+from datetime import datetime
+from xml.etree.ElementTree import iterparse
+from sqlalchemy import insert
+from models import db, BankStatement, BankStatementItem
+from reconcile import adjust_statement_counters
+from money import ZERO, to_money, to_cents
+
+# 银行对账单文件导入：流式解析 CSV / MT940 / CAMT.053，按行哈希去重，Core 批量插入，只返回汇总
+# 去重范围为同一银行科目下所有对账单的明细，哈希由日期、金额、摘要、余额计算
+
+STATEMENT_IMPORT_BATCH_SIZE = 500
+STATEMENT_ERROR_LIMIT = 1000
+STATEMENT_FORMATS = ('csv', 'mt940', 'camt053')
+DESCRIPTION_MAX_LENGTH = 200
+
+# CSV 表头别名
+CSV_COLUMNS = {
+    'transaction_date': ('transaction_date', 'date', '交易日期', '日期'),
+    'description': ('description', '摘要', '交易摘要'),
+    'amount': ('amount', '金额', '交易金额'),
+    'balance': ('balance', '余额'),
+}
+
+class StatementParseError(ValueError):
+    pass
+
+def line_hash(transaction_date, amount, description, balance):
+    raw = f'{transaction_date.isoformat()}|{to_cents(amount)}|{(description or "").strip()}|{to_cents(balance)}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _parse_date(value, formats=('%Y-%m-%d', '%Y/%m/%d', '%Y%m%d')):
+    value = (value or '').strip()
+    for date_format in formats:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise StatementParseError(f'日期无效: {value}')
+
+def _parse_amount(value, decimal_comma=False):
+    value = (value or '').strip().replace(' ', '')
+    if decimal_comma:
+        value = value.replace('.', '').replace(',', '.')
+    else:
+        value = value.replace(',', '')
+    # 空金额不能按 0 入账
+    if not value:
+        raise StatementParseError('金额为空')
+    try:
+        return to_money(value)
+    except ArithmeticError:
+        raise StatementParseError(f'金额无效: {value}')
+
+# CSV：每行一笔交易，余额列可省略（按期初余额累计）
+def read_csv_lines(stream, meta):
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        columns[field] = next((name for name in (reader.fieldnames or []) if name.strip() in aliases), None)
+    if not all(columns[field] for field in ('transaction_date', 'description', 'amount')):
+        raise StatementParseError('CSV表头缺少 transaction_date、description 或 amount 列')
+    for row in reader:
+        try:
+            balance = row.get(columns['balance']) if columns['balance'] else None
+            yield reader.line_num, {
+                'transaction_date': _parse_date(row[columns['transaction_date']]),
+                'description': row[columns['description']],
+                'amount': _parse_amount(row[columns['amount']]),
+                'balance': _parse_amount(balance) if balance and balance.strip() else None
+            }
+        except StatementParseError as e:
+            yield reader.line_num, e
+
+MT940_BALANCE = re.compile(r'^([CD])(\d{6})([A-Z]{3})([\d,]+)$')
+MT940_STATEMENT_LINE = re.compile(r'^(\d{6})(\d{4})?(RC|RD|C|D)[A-Z]?([\d,]+)(.*)$')
+
+def _mt940_balance(value):
+    match = MT940_BALANCE.match(value.strip())
+    if not match:
+        raise StatementParseError(f'余额格式无效: {value}')
+    amount = _parse_amount(match.group(4), decimal_comma=True)
+    return -amount if match.group(1) == 'D' else amount
+
+# MT940：:61: 为交易行，其后的 :86: 为附加说明；:60F:/:62F: 为期初、期末余额
+def read_mt940_lines(stream, meta):
+    pending = None
+    tag, value, tag_line = None, '', 0
+
+    def finish_tag():
+        nonlocal pending
+        if tag is None:
+            return
+        if tag in ('60F', '60M'):
+            if meta.get('opening_balance') is None:
+                meta['opening_balance'] = _mt940_balance(value)
+        elif tag in ('62F', '62M'):
+            meta['closing_balance'] = _mt940_balance(value)
+        elif tag == '61':
+            match = MT940_STATEMENT_LINE.match(value.split('\n')[0].strip())
+            if not match:
+                raise StatementParseError(f'交易行格式无效: {value}')
+            value_date, _, mark, amount, rest = match.groups()
+            amount = _parse_amount(amount, decimal_comma=True)
+            pending = {
+                'transaction_date': _parse_date(value_date, ('%y%m%d',)),
+                'description': rest.split('//')[0][4:].strip() or 'MT940',
+                'amount': amount if mark in ('C', 'RD') else -amount,
+                'balance': None
+            }
+        elif tag == '86' and pending is not None:
+            pending['description'] = ' '.join(part.strip() for part in value.split('\n') if part.strip())
+
+    for line_no, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8-sig'), start=1):
+        line = line.rstrip('\r\n')
+        match = re.match(r'^:(\d{2}[A-Z]?):(.*)$', line)
+        if not match:
+            if tag is not None and line and line != '-}':
+                value += '\n' + line
+            continue
+        new_tag = match.group(1)
+        # 新交易行或余额行开始前，先输出上一笔交易
+        try:
+            finish_tag()
+        except StatementParseError as e:
+            yield tag_line, e
+        if pending is not None and new_tag in ('61', '62F', '62M', '20'):
+            yield pending_line, pending
+            pending = None
+        tag, value, tag_line = new_tag, match.group(2), line_no
+        if new_tag == '61':
+            pending_line = line_no
+    try:
+        finish_tag()
+    except StatementParseError as e:
+        yield tag_line, e
+    if pending is not None:
+        yield pending_line, pending
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def _find(element, path):
+    for name in path.split('/'):
+        element = next((child for child in element if _local(child.tag) == name), None)
+        if element is None:
+            return None
+    return element
+
+def _text(element, path):
+    found = _find(element, path)
+    return found.text.strip() if found is not None and found.text else None
+
+# CAMT.053：iterparse 逐个处理 Bal / Ntry 元素并及时释放
+def read_camt053_lines(stream, meta):
+    entry_no = 0
+    for _, element in iterparse(stream, events=('end',)):
+        name = _local(element.tag)
+        if name == 'Bal':
+            code = _text(element, 'Tp/CdOrPrtry/Cd')
+            amount = _parse_amount(_text(element, 'Amt'))
+            if _text(element, 'CdtDbtInd') == 'DBIT':
+                amount = -amount
+            if code in ('OPBD', 'PRCD') and meta.get('opening_balance') is None:
+                meta['opening_balance'] = amount
+            elif code == 'CLBD':
+                meta['closing_balance'] = amount
+            element.clear()
+        elif name == 'Ntry':
+            entry_no += 1
+            try:
+                amount = _parse_amount(_text(element, 'Amt'))
+                if _text(element, 'CdtDbtInd') == 'DBIT':
+                    amount = -amount
+                booked = _text(element, 'BookgDt/Dt') or _text(element, 'BookgDt/DtTm') or _text(element, 'ValDt/Dt')
+                description = (
+                    _text(element, 'NtryDtls/TxDtls/RmtInf/Ustrd')
+                    or _text(element, 'AddtlNtryInf')
+                    or _text(element, 'NtryDtls/TxDtls/AddtlTxInf')
+                    or 'CAMT.053'
+                )
+                yield entry_no, {
+                    'transaction_date': _parse_date((booked or '')[:10]),
+                    'description': description,
+                    'amount': amount,
+                    'balance': None
+                }
+            except StatementParseError as e:
+                yield entry_no, e
+            element.clear()
+
+READERS = {
+    'csv': read_csv_lines,
+    'mt940': read_mt940_lines,
+    'camt053': read_camt053_lines,
+}
+
+def detect_format(filename, content_type):
+    name = (filename or '').lower()
+    if name.endswith('.csv') or content_type == 'text/csv':
+        return 'csv'
+    if name.endswith(('.sta', '.mt940', '.940')):
+        return 'mt940'
+    if name.endswith('.xml') or content_type in ('application/xml', 'text/xml'):
+        return 'camt053'
+    return None
+
+def _existing_hashes(statement):
+    rows = db.session.query(BankStatementItem.line_hash).join(BankStatement).filter(
+        BankStatement.account_id == statement.account_id,
+        BankStatement.user_id == statement.user_id,
+        BankStatementItem.line_hash.isnot(None)
+    )
+    return {row.line_hash for row in rows}
+
+# 导入入口：解析错误的行只记录不中断，全部写入在一个事务内，由调用方提交
+# progress(已读取行数, None) 在每批写入后调用
+def import_statement_file(statement, stream, file_format, progress=None):
+    meta = {}
+    seen = _existing_hashes(statement)
+    result = {
+        'format': file_format,
+        'line_count': 0,
+        'inserted_count': 0,
+        'duplicate_count': 0,
+        'error_count': 0,
+        'errors': []
+    }
+    batch = []
+    now = datetime.utcnow()
+    table = BankStatementItem.__table__
+
+    def flush_batch():
+        db.session.execute(insert(table).values(batch))
+        result['inserted_count'] += len(batch)
+        batch.clear()
+        if progress:
+            progress(result['line_count'], None)
+
+    running = None
+    for line_no, record in READERS[file_format](stream, meta):
+        result['line_count'] += 1
+        if isinstance(record, StatementParseError):
+            result['error_count'] += 1
+            if len(result['errors']) < STATEMENT_ERROR_LIMIT:
+                result['errors'].append({'line': line_no, 'message': str(record)})
+            continue
+        if running is None:
+            opening = meta.get('opening_balance')
+            running = opening if opening is not None else (statement.opening_balance or ZERO)
+        # 文件未给出逐笔余额时按期初余额累计
+        running = record['balance'] if record['balance'] is not None else running + record['amount']
+        description = (record['description'] or '').strip()[:DESCRIPTION_MAX_LENGTH]
+        digest = line_hash(record['transaction_date'], record['amount'], description, running)
+        if digest in seen:
+            result['duplicate_count'] += 1
+            continue
+        seen.add(digest)
+        batch.append({
+            'bank_statement_id': statement.id,
+            'transaction_date': record['transaction_date'],
+            'description': description,
+            'amount': record['amount'],
+            'balance': running,
+            'reconciled': False,
+            'line_hash': digest,
+            'created_at': now,
+            'updated_at': now
+        })
+        if len(batch) >= STATEMENT_IMPORT_BATCH_SIZE:
+            flush_batch()
+    if batch:
+        flush_batch()
+
+    adjust_statement_counters(statement.id, item_delta=result['inserted_count'])
+    result['file_opening_balance'] = meta.get('opening_balance')
+    result['file_closing_balance'] = meta.get('closing_balance')
+    return result
@@ -0,0 +1,127 @@
+from decimal import Decimal
+from models import db, Account, AccountPeriodBalance
+from money import ZERO, money_mul
+from ledger import period_key, period_start
+from cache import tax_cache
+
+# 税款计算引擎：按申报所属期从科目期间余额快照汇总相关一级科目的借贷方发生额，不扫描凭证分录
+# 期间汇总按 (用户, 期间) 缓存，该期间有凭证过账、取消过账时失效（见 cache.py）
+
+# 默认税率（百分比），请求中传入 tax_rate 时覆盖
+DEFAULT_TAX_RATES = {
+    '增值税': 13.0,
+    '企业所得税': 25.0,
+    '附加税': 12.0,  # 城市维护建设税7%、教育费附加3%、地方教育附加2%
+    '个人所得税': 3.0
+}
+
+# 收入类取贷方发生额、成本费用类取借方发生额，期末结转损益凭证的反向发生额因此不计入
+SALES_CODES = ('6001', '6051')  # 增值税销售额：主营业务收入、其他业务收入
+PURCHASE_CODES = ('1403', '1405', '1601')  # 进项税额的采购额：原材料、库存商品、固定资产
+INCOME_CODES = ('6001', '6051', '6111', '6301')  # 企业所得税收入总额
+DEDUCTIBLE_CODES = ('6401', '6402', '6403', '6601', '6602', '6603', '6711')  # 准予扣除的成本费用，不含所得税费用
+PAYROLL_CODES = ('2211',)  # 个人所得税代扣基数：本期计提的应付职工薪酬
+
+class TaxCalculationError(Exception):
+    pass
+
+# 期间内各一级科目（编码前4位，含下级科目）的借方、贷方发生额：{编码: (借方, 贷方)}
+def period_aggregates(user_id, period):
+    key = (user_id, period)
+    aggregates = tax_cache.get(key)
+    if aggregates is not None:
+        return aggregates
+    prefix = db.func.substr(Account.code, 1, 4)
+    rows = db.session.query(
+        prefix,
+        db.func.sum(AccountPeriodBalance.debit_total),
+        db.func.sum(AccountPeriodBalance.credit_total)
+    ).join(Account, Account.id == AccountPeriodBalance.account_id).filter(
+        AccountPeriodBalance.user_id == user_id,
+        AccountPeriodBalance.period == period
+    ).group_by(prefix)
+    aggregates = {code: (debit or ZERO, credit or ZERO) for code, debit, credit in rows}
+    tax_cache.set(key, aggregates)
+    return aggregates
+
+def _debits(aggregates, codes):
+    return sum((aggregates.get(code, (ZERO, ZERO))[0] for code in codes), ZERO)
+
+def _credits(aggregates, codes):
+    return sum((aggregates.get(code, (ZERO, ZERO))[1] for code in codes), ZERO)
+
+def _apply_rate(amount, rate):
+    return money_mul(amount, Decimal(str(rate)) / 100)
+
+# 增值税：销项按销售额计税，进项按存货、固定资产采购额计税，进项大于销项时本期应纳为0
+def _vat(aggregates, rate):
+    sales = _credits(aggregates, SALES_CODES)
+    output_tax = _apply_rate(sales, rate)
+    input_tax = _apply_rate(_debits(aggregates, PURCHASE_CODES), rate)
+    return {
+        'taxable_income': sales,
+        'input_tax': input_tax,
+        'output_tax': output_tax,
+        'taxable_amount': sales,
+        'tax_payable': max(output_tax - input_tax, ZERO)
+    }
+
+# 附加税：以本期应纳增值税（按默认增值税税率计算）为计税依据
+def _surcharge(aggregates, rate):
+    vat = _vat(aggregates, DEFAULT_TAX_RATES['增值税'])
+    return {
+        'taxable_income': vat['taxable_income'],
+        'taxable_amount': vat['tax_payable'],
+        'tax_payable': _apply_rate(vat['tax_payable'], rate)
+    }
+
+# 企业所得税：收入总额减准予扣除的成本费用，亏损时应纳税所得额为0
+def _income_tax(aggregates, rate):
+    income = _credits(aggregates, INCOME_CODES)
+    taxable_amount = max(income - _debits(aggregates, DEDUCTIBLE_CODES), ZERO)
+    return {
+        'taxable_income': income,
+        'taxable_amount': taxable_amount,
+        'tax_payable': _apply_rate(taxable_amount, rate)
+    }
+
+# 个人所得税：按本期计提的职工薪酬和统一税率估算代扣税额
+def _payroll_tax(aggregates, rate):
+    payroll = _credits(aggregates, PAYROLL_CODES)
+    return {
+        'taxable_income': payroll,
+        'taxable_amount': payroll,
+        'tax_payable': _apply_rate(payroll, rate)
+    }
+
+CALCULATORS = {
+    '增值税': _vat,
+    '企业所得税': _income_tax,
+    '附加税': _surcharge,
+    '个人所得税': _payroll_tax
+}
+
+def calculate_tax(user_id, period, tax_type, tax_rate=None):
+    calculator = CALCULATORS.get(tax_type)
+    if calculator is None:
+        raise TaxCalculationError(f'不支持的税种: {tax_type}')
+    try:
+        valid = period_key(period_start(period)) == period
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise TaxCalculationError('申报所属期格式无效，应为 YYYY-MM')
+    rate = DEFAULT_TAX_RATES[tax_type] if tax_rate is None else tax_rate
+    result = {
+        'period': period,
+        'tax_type': tax_type,
+        'tax_rate': rate,
+        'taxable_income': ZERO,
+        'input_tax': ZERO,
+        'output_tax': ZERO,
+        'taxable_amount': ZERO,
+        'deduction_amount': ZERO,
+        'tax_payable': ZERO
+    }
+    result.update(calculator(period_aggregates(user_id, period), rate))
+    return result
@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from models import db, Account
+
+
+def test_account_ledger_running_balance_pages(client, user, count_queries):
+    accounts = {account.code: account.id for account in Account.query.filter_by(user_id=user['id'])}
+    voucher_ids = []
+    for day, direction, amount in [(1, '借方', 100), (2, '贷方', 30), (2, '借方', '0.10'), (3, '借方', 5), (5, '贷方', '20.05')]:
+        counter = '贷方' if direction == '借方' else '借方'
+        voucher_ids.append(client.post('/api/vouchers', json={
+            'date': f'2025-03-{day:02d}',
+            'description': f'凭证{day}',
+            'entries': [
+                {'account_id': accounts['1002'], 'direction': direction, 'amount': amount, 'description': '银行'},
+                {'account_id': accounts['6001'], 'direction': counter, 'amount': amount},
+            ]
+        }).get_json()['id'])
+    # 未过账凭证不进入明细账
+    client.post('/api/vouchers/post-batch', json={'voucher_ids': voucher_ids[:-1]})
+
+    url = f"/api/accounts/{accounts['1002']}/ledger"
+    first = client.get(f'{url}?limit=2').get_json()
+    assert first['opening_balance'] == 0
+    assert [(item['debit'], item['credit'], item['balance']) for item in first['items']] == [(100, 0, 100), (0, 30, 70)]
+    assert first['has_more']
+
+    with count_queries() as statements:
+        second = client.get(f"{url}?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [item['balance'] for item in second['items']] == [70.1, 75.1]
+    assert not second['has_more']
+    assert len(statements) == 2
+
+    # 区间起点之前的余额作为期初；收入类科目贷方增加
+    ranged = client.get(f"/api/accounts/{accounts['6001']}/ledger?from=2025-03-02&to=2025-03-02").get_json()
+    assert ranged['opening_balance'] == 100
+    assert [item['balance'] for item in ranged['items']] == [70, 70.1]
+
+    assert client.get(f'{url}?cursor=bad').status_code == 400
+    assert client.get('/api/accounts/999999/ledger').status_code == 404
+    assert db.session.get(Account, accounts['1002']).balance == Decimal('75.10')
@@ -0,0 +1,32 @@
+from models import Voucher, Bill, BankStatementItem
+from benchmark import seed_ledger, run_benchmark, compare_results, SCENARIOS
+
+
+def test_seed_and_run_all_scenarios(app):
+    contexts, counts = seed_ledger(app, {
+        'vouchers': 60, 'months': 2, 'vendors': 3, 'purchase_orders': 4, 'bills': 20, 'statements': 2, 'statement_items': 10
+    }, seed=1)
+    assert counts['vouchers'] == 61
+    assert Voucher.query.filter_by(posted=True).count() == 61
+    assert Bill.query.count() == 20
+    assert BankStatementItem.query.count() > 0
+
+    contexts[0].payment_batch = 5
+    results = run_benchmark(app, contexts, iterations=2, warmup=1)
+    assert set(results) == set(SCENARIOS)
+    for name, result in results.items():
+        assert (name, result['errors']) == (name, 0)
+        assert result['requests'] == 2
+        assert result['latency_ms']['p50'] <= result['latency_ms']['max']
+    assert Bill.query.filter_by(status='已支付').count() == 15
+
+
+def test_compare_results_flags_regressions():
+    baseline = {'scenarios': {'a': {'latency_ms': {'p95': 10.0}}, 'b': {'latency_ms': {'p95': 10.0}}}}
+    current = {'scenarios': {
+        'a': {'latency_ms': {'p95': 11.0}},
+        'b': {'latency_ms': {'p95': 15.0}},
+        'c': {'latency_ms': {'p95': 1.0}},
+    }}
+    rows = compare_results(current, baseline, threshold=0.2)
+    assert [(row['scenario'], row['regressed']) for row in rows] == [('a', False), ('b', True)]
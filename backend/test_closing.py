@@ -0,0 +1,141 @@
+from decimal import Decimal
+
+from models import db, Account, AccountPeriodBalance, Voucher
+
+
+def setup_books(client, user):
+    accounts = {account.code: account for account in Account.query.filter_by(user_id=user['id'])}
+    accounts['4001'].balance = Decimal('0.00')
+    db.session.commit()
+    return {code: account.id for code, account in accounts.items()}
+
+
+def create_voucher(client, day, debit, credit, amount, post=True):
+    voucher_id = client.post('/api/vouchers', json={
+        'date': day,
+        'description': '测试',
+        'entries': [
+            {'account_id': debit, 'direction': '借方', 'amount': amount},
+            {'account_id': credit, 'direction': '贷方', 'amount': amount},
+        ]
+    }).get_json()['id']
+    if post:
+        client.post(f'/api/vouchers/{voucher_id}/post')
+    return voucher_id
+
+
+def balances(user):
+    return {account.code: account.balance for account in Account.query.filter_by(user_id=user['id'])}
+
+
+def test_close_locks_period_and_reports_read_snapshots(client, user, count_queries):
+    accounts = setup_books(client, user)
+    sale = create_voucher(client, '2025-01-10', accounts['1002'], accounts['6001'], 100)
+    create_voucher(client, '2025-01-20', accounts['6602'], accounts['1002'], 30)
+    draft = create_voucher(client, '2025-01-25', accounts['6602'], accounts['1002'], 5, post=False)
+
+    response = client.post('/api/periods/2025-01/close')
+    assert response.status_code == 400 and '未过账' in response.get_json()['message']
+    client.delete(f'/api/vouchers/{draft}')
+
+    response = client.post('/api/periods/2025-01/close')
+    assert response.status_code == 200
+    record = response.get_json()['period']
+    assert record['net_profit'] == 70 and record['transfer_voucher_id'] is None
+    closing = db.session.get(Voucher, record['closing_voucher_id'])
+    assert closing.posted and closing.date.day == 31
+    assert {(entry.account_id, entry.direction, entry.amount) for entry in closing.entries} == {
+        (accounts['6001'], '借方', 100), (accounts['6602'], '贷方', 30), (accounts['4103'], '贷方', 70)
+    }
+    current = balances(user)
+    assert (current['6001'], current['6602'], current['4103'], current['1002']) == (0, 0, 70, 70)
+    # 全部科目都有本期快照
+    assert AccountPeriodBalance.query.filter_by(user_id=user['id'], period='2025-01').count() == len(current)
+
+    # 已结账期间拒绝新增、修改、删除、过账和取消过账
+    locked = [
+        client.post('/api/vouchers', json={'date': '2025-01-15', 'description': '补录', 'entries': []}),
+        client.put(f'/api/vouchers/{sale}', json={'date': '2025-02-01', 'description': '改期', 'entries': []}),
+        client.delete(f'/api/vouchers/{sale}'),
+        client.post(f'/api/vouchers/{sale}/unpost'),
+        client.post('/api/vouchers/unpost-batch', json={'voucher_ids': [sale]}),
+        client.put(f"/api/accounts/{accounts['1002']}", json={'balance': 1}),
+    ]
+    assert [response.status_code for response in locked] == [400] * len(locked)
+    assert '已结账' in locked[0].get_json()['message']
+    assert db.session.get(Voucher, sale).posted
+
+    assert client.post('/api/periods/2025-01/close').status_code == 400
+    assert client.post('/api/periods/2025-03/close').get_json()['message'] == '请先结账 2025-02'
+    assert client.post('/api/periods/2025-1/close').status_code == 400
+
+    # 已结账期间的报表只读取快照，不扫描分录
+    with count_queries() as statements:
+        report = client.get('/api/reports/trial-balance?from=2025-01-01&to=2025-01-31').get_json()
+        bank = client.get(f"/api/accounts/{accounts['1002']}/balance?as_of=2025-01-31").get_json()
+    assert not any('voucher_entries' in statement for statement in statements)
+    rows = {row['code']: row for row in report['accounts']}
+    assert (rows['6001']['credit_total'], rows['6001']['closing_balance'], rows['4103']['closing_balance']) == (100, 0, 70)
+    assert report['balanced'] and bank['balance'] == 70
+
+    # 反结账删除结账凭证并解除锁定
+    assert [period['period'] for period in client.get('/api/periods').get_json()] == ['2025-01']
+    response = client.post('/api/periods/2025-01/reopen')
+    assert response.get_json()['deleted_voucher_ids'] == [record['closing_voucher_id']]
+    assert db.session.get(Voucher, record['closing_voucher_id']) is None
+    current = balances(user)
+    assert (current['6001'], current['6602'], current['4103']) == (100, 30, 0)
+    assert client.post(f'/api/vouchers/{sale}/unpost').status_code == 200
+    assert client.post('/api/periods/2025-01/reopen').status_code == 400
+
+
+def test_year_end_transfers_profit_to_distribution(client, user):
+    accounts = setup_books(client, user)
+    create_voucher(client, '2025-12-05', accounts['1002'], accounts['6001'], 80)
+    create_voucher(client, '2025-12-06', accounts['6401'], accounts['1002'], 120)
+    create_voucher(client, '2025-12-07', accounts['1002'], accounts['6051'], 90)
+
+    record = client.post('/api/periods/2025-12/close').get_json()['period']
+    assert record['net_profit'] == 50
+    transfer = db.session.get(Voucher, record['transfer_voucher_id'])
+    assert {(entry.account_id, entry.direction, entry.amount) for entry in transfer.entries} == {
+        (accounts['4103'], '借方', 50), (accounts['4104'], '贷方', 50)
+    }
+    current = balances(user)
+    assert (current['6001'], current['6051'], current['6401'], current['4103'], current['4104']) == (0, 0, 0, 0, 50)
+    assert client.post('/api/periods/2026-01/close').status_code == 200
+
+
+def test_close_leaves_income_statement_unchanged(client, user):
+    accounts = setup_books(client, user)
+    create_voucher(client, '2025-01-10', accounts['1002'], accounts['6001'], 100)
+    create_voucher(client, '2025-01-20', accounts['6602'], accounts['1002'], 30)
+
+    def statements():
+        return [
+            client.get('/api/reports/income_statement?from=2025-01-01&to=2025-01-31').get_json(),
+            client.get('/api/reports/income_statement?to=2025-01-31').get_json(),
+        ]
+
+    before = statements()
+    assert [report['profit'] for report in before] == [70, 70]
+    assert client.post('/api/periods/2025-01/close').status_code == 200
+    after = statements()
+    assert after == before
+    assert {row['code']: row['balance'] for row in after[0]['incomes']}['6001'] == 100
+
+
+def test_close_requires_earlier_vouchers_posted(client, user):
+    accounts = setup_books(client, user)
+    create_voucher(client, '2025-02-10', accounts['1002'], accounts['6001'], 100)
+    draft = create_voucher(client, '2025-01-05', accounts['6602'], accounts['1002'], 20, post=False)
+
+    response = client.post('/api/periods/2025-02/close')
+    assert response.status_code == 400
+    assert response.get_json()['message'] == '截至本期末还有 1 张凭证未过账（最早在 2025-01）'
+    assert client.get('/api/periods').get_json() == []
+
+    client.post(f'/api/vouchers/{draft}/post')
+    record = client.post('/api/periods/2025-02/close').get_json()['period']
+    # 结转截至期末的损益余额，含1月费用
+    assert record['net_profit'] == 80
@@ -0,0 +1,52 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import cache
+from models import db, Account, Vendor, Bill
+from ledger import period_key
+
+
+def test_dashboard_cache_invalidated_by_ledger_changes(client, user, monkeypatch):
+    changes = []
+    monkeypatch.setattr(cache, '_listeners', cache._listeners + [lambda user_id, periods: changes.append((user_id, set(periods)))])
+    accounts = {account.code: account.id for account in Account.query.filter_by(user_id=user['id'])}
+    db.session.get(Account, accounts['1002']).balance = Decimal('500.00')
+    db.session.commit()
+    today = datetime.now()
+    voucher_id = client.post('/api/vouchers', json={
+        'date': today.strftime('%Y-%m-%d'),
+        'description': '收款',
+        'entries': [
+            {'account_id': accounts['1002'], 'direction': '借方', 'amount': 100},
+            {'account_id': accounts['6001'], 'direction': '贷方', 'amount': 100},
+        ]
+    }).get_json()['id']
+    before = client.get('/api/dashboard').get_json()
+    assert before['monthly_vouchers'] == 1
+
+    changes.clear()
+    client.post(f'/api/vouchers/{voucher_id}/post')
+    assert changes == [(user['id'], {period_key(today)})]
+    assert client.get('/api/dashboard').get_json()['total_assets'] == before['total_assets'] + 100
+
+    changes.clear()
+    client.post(f'/api/vouchers/{voucher_id}/unpost')
+    assert [user_id for user_id, _ in changes] == [user['id']]
+    assert client.get('/api/dashboard').get_json()['total_assets'] == before['total_assets']
+
+    vendor = Vendor(name='供应商A', user_id=user['id'])
+    db.session.add(vendor)
+    db.session.flush()
+    bill = Bill(bill_no='B-1', vendor_id=vendor.id, amount=Decimal('10.00'), due_date=date(2025, 5, 1), status='已核对待付款', user_id=user['id'])
+    db.session.add(bill)
+    db.session.commit()
+    cached = client.get('/api/dashboard').get_json()
+    assert cached['total_vendors'] == before['total_vendors']
+
+    changes.clear()
+    response = client.post('/api/payments/execute', json={'bill_ids': [bill.id], 'bank_account_id': accounts['1002']})
+    assert response.status_code == 200
+    assert [user_id for user_id, _ in changes] == [user['id']]
+    after = client.get('/api/dashboard').get_json()
+    assert (after['total_assets'], after['total_liabilities']) == (cached['total_assets'] - 10, cached['total_liabilities'] - 10)
+    assert after['total_vendors'] == before['total_vendors'] + 1
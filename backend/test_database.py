@@ -0,0 +1,27 @@
+from sqlalchemy import create_engine, text
+
+from config import Config
+from database import normalize_database_url, engine_options, install_sqlite_pragmas
+
+
+def test_engine_options_by_backend():
+    assert engine_options('sqlite://') == {}
+    sqlite_options = engine_options('sqlite:////tmp/accounting.db', pool_size=8, busy_timeout=2000)
+    assert sqlite_options['pool_size'] == 8
+    assert sqlite_options['connect_args'] == {'timeout': 2.0, 'check_same_thread': False}
+    postgres_options = engine_options(normalize_database_url('postgres://user:secret@db/accounting'))
+    assert postgres_options['pool_pre_ping']
+    assert 'connect_args' not in postgres_options
+
+
+def test_sqlite_pragmas_applied_per_connection(tmp_path):
+    config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    url = f"sqlite:///{tmp_path / 'pragmas.db'}"
+    engine = create_engine(url, **engine_options(url))
+    install_sqlite_pragmas(engine, config)
+    with engine.connect() as conn, engine.connect() as other:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert conn.execute(text('PRAGMA busy_timeout')).scalar() == Config.SQLITE_BUSY_TIMEOUT
+        # synchronous=NORMAL 为 1
+        assert other.execute(text('PRAGMA synchronous')).scalar() == 1
+    engine.dispose()
@@ -0,0 +1,69 @@
+from decimal import Decimal
+
+from models import db, Account, AccountClosure
+from hierarchy import rebuild_account_closure
+
+
+def paths(user_id):
+    rows = db.session.query(AccountClosure).join(Account, Account.id == AccountClosure.descendant_id).filter(Account.user_id == user_id)
+    return {(row.ancestor_id, row.descendant_id, row.depth) for row in rows}
+
+
+def create_child(client, parent_id, code, balance=0):
+    response = client.post('/api/accounts', json={'code': code, 'name': code, 'type': '资产', 'parent_id': parent_id, 'balance': balance})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_tree_rollup_and_closure_maintenance(client, user):
+    bank = Account.query.filter_by(user_id=user['id'], code='1002').one()
+    bank.balance = Decimal('1.00')
+    db.session.commit()
+    icbc = create_child(client, bank.id, '100201', 10)
+    branch = create_child(client, icbc, '10020101', Decimal('2.50'))
+    boc = create_child(client, bank.id, '100202', 5)
+    assert {(bank.id, branch, 2), (icbc, branch, 1), (branch, branch, 0), (bank.id, boc, 1)} <= paths(user['id'])
+
+    tree = client.get('/api/accounts/tree').get_json()
+    node = next(node for node in tree if node['id'] == bank.id)
+    assert node['total_balance'] == 18.5
+    assert node['descendant_count'] == 3
+    assert [child['code'] for child in node['children']] == ['100201', '100202']
+    assert node['children'][0]['children'][0]['level'] == 2
+    flat = client.get('/api/accounts').get_json()
+    assert len(flat) == Account.query.filter_by(user_id=user['id']).count()
+    assert 'children' not in flat[0]
+
+    # 移动子树后路径随之更新
+    cash = Account.query.filter_by(user_id=user['id'], code='1001').one()
+    assert client.put(f'/api/accounts/{icbc}', json={'parent_id': cash.id}).status_code == 200
+    current = paths(user['id'])
+    assert (cash.id, branch, 2) in current
+    assert not any(ancestor == bank.id and descendant in (icbc, branch) for ancestor, descendant, _ in current)
+
+    response = client.put(f'/api/accounts/{icbc}', json={'parent_id': branch})
+    assert response.status_code == 400
+
+    # 删除中间科目后下级科目成为顶级科目
+    assert client.delete(f'/api/accounts/{icbc}').status_code == 200
+    assert db.session.get(Account, branch).parent_id is None
+    assert {(ancestor, depth) for ancestor, descendant, depth in paths(user['id']) if descendant == branch} == {(branch, 0)}
+
+    before = paths(user['id'])
+    rebuild_account_closure(user['id'])
+    assert paths(user['id']) == before
+
+
+def test_tree_is_single_query(client, user, count_queries):
+    bank = Account.query.filter_by(user_id=user['id'], code='1002').one()
+    parent = bank.id
+    for i in range(5):
+        parent = create_child(client, parent, f'1002{i:02d}')
+    with count_queries() as statements:
+        tree = client.get('/api/accounts/tree').get_json()
+    assert len(statements) == 1
+    depth, node = 0, next(node for node in tree if node['id'] == bank.id)
+    while node['children']:
+        node = node['children'][0]
+        depth += 1
+    assert (depth, node['level']) == (5, 5)
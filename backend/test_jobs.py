@@ -0,0 +1,195 @@
+import io
+import os
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+
+import payments
+from config import Config
+from database import engine_options, install_sqlite_pragmas
+from migrate import upgrade_database
+from models import db, Account, Voucher, Vendor, Bill, Payment, Job
+from money import MoneyJSONProvider
+from jobs import JobContext, run_next_job
+from routes import api_bp
+
+
+@pytest.fixture(autouse=True)
+def job_dir(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'JOB_FILE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def create_vouchers(client, user, count):
+    accounts = {account.code: account.id for account in Account.query.filter_by(user_id=user['id'])}
+    for i in range(count):
+        client.post('/api/vouchers', json={
+            'date': f'2025-06-{i + 1:02d}',
+            'description': f'收款{i}',
+            'entries': [
+                {'account_id': accounts['1002'], 'direction': '借方', 'amount': 10},
+                {'account_id': accounts['6001'], 'direction': '贷方', 'amount': 10},
+            ]
+        })
+
+
+def test_post_vouchers_job(client, user):
+    create_vouchers(client, user, 3)
+    response = client.post('/api/jobs', json={'kind': 'post_vouchers', 'params': {'date_to': '2025-06-02'}})
+    assert response.status_code == 202
+    job = response.get_json()['job']
+    assert job['status'] == 'queued'
+
+    assert run_next_job('test') == job['id']
+    assert run_next_job('test') is None
+    job = client.get(f"/api/jobs/{job['id']}").get_json()
+    assert job['status'] == 'succeeded'
+    assert (job['progress_done'], job['progress_total']) == (2, 2)
+    assert job['result']['posted_count'] == 2
+    assert Voucher.query.filter_by(posted=True).count() == 2
+    assert Account.query.filter_by(user_id=user['id'], code='1002').one().balance == Decimal('20.00')
+
+
+def test_voucher_import_job(client, user, job_dir):
+    body = (
+        'voucher_ref,date,description,account_code,direction,amount,entry_description\n'
+        'A,2025-01-05,收款,1002,借方,100,\n'
+        'A,2025-01-05,收款,6001,贷方,100,\n'
+    )
+    response = client.post('/api/jobs', data={
+        'kind': 'voucher_import',
+        'post': 'true',
+        'file': (io.BytesIO(body.encode('utf-8')), 'vouchers.csv')
+    }, content_type='multipart/form-data')
+    job_id = response.get_json()['job']['id']
+    assert os.listdir(job_dir) == [f'job-{job_id}.upload']
+
+    run_next_job('test')
+    job = db.session.get(Job, job_id)
+    assert job.status == 'succeeded'
+    assert job.to_dict()['result']['imported_count'] == 1
+    assert Voucher.query.filter_by(posted=True).count() == 1
+    assert os.listdir(job_dir) == []
+
+
+def test_export_job_download(client, user):
+    create_vouchers(client, user, 2)
+    client.post('/api/vouchers/post-batch', json={'voucher_ids': [voucher.id for voucher in Voucher.query]})
+    job_id = client.post('/api/jobs', json={'kind': 'general_ledger_export', 'params': {'format': 'jsonl'}}).get_json()['job']['id']
+    assert client.get(f'/api/jobs/{job_id}/download').status_code == 400
+
+    run_next_job('test')
+    response = client.get(f'/api/jobs/{job_id}/download')
+    assert response.status_code == 200
+    assert len(response.get_data().splitlines()) == 4
+
+
+def test_cancel_queued_job(client, user):
+    job_id = client.post('/api/jobs', json={'kind': 'post_vouchers'}).get_json()['job']['id']
+    response = client.post(f'/api/jobs/{job_id}/cancel')
+    assert response.get_json()['job']['status'] == 'cancelled'
+    assert run_next_job('test') is None
+
+
+# 文件数据库：执行中的任务持有写锁时，其他请求须能查询进度并取消
+@pytest.fixture
+def file_app(tmp_path):
+    app = Flask('file_app')
+    app.config.from_object(Config)
+    url = f"sqlite:///{tmp_path / 'jobs.db'}"
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=url,
+        SQLALCHEMY_ENGINE_OPTIONS=engine_options(url, busy_timeout=2000),
+        SQLITE_BUSY_TIMEOUT=2000,
+        JOB_FILE_DIR=str(tmp_path)
+    )
+    app.json = MoneyJSONProvider(app)
+    db.init_app(app)
+    app.register_blueprint(api_bp)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, app.config)
+        upgrade_database()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_cancel_during_payment_run(file_app, monkeypatch):
+    monkeypatch.setattr(payments, 'PAYMENT_BATCH_SIZE', 1)
+    client = file_app.test_client()
+    user = client.post('/api/auth/register', json={
+        'username': 'tester', 'email': 'tester@example.com', 'password': 'secret', 'full_name': 'Tester'
+    }).get_json()['user']
+    with file_app.app_context():
+        bank = Account.query.filter_by(user_id=user['id'], code='1002').one()
+        bank.balance = Decimal('100.00')
+        vendor = Vendor(name='供应商A', user_id=user['id'])
+        db.session.add(vendor)
+        db.session.flush()
+        bills = [
+            Bill(bill_no=f'B-{i}', vendor_id=vendor.id, amount=Decimal('10.00'), due_date=date(2025, 5, 1), user_id=user['id'])
+            for i in range(3)
+        ]
+        db.session.add_all(bills)
+        db.session.commit()
+        bank_id, bill_ids = bank.id, [bill.id for bill in bills]
+    job_id = client.post('/api/jobs', json={
+        'kind': 'payment_run',
+        'params': {'bill_ids': bill_ids, 'bank_account_id': bank_id}
+    }).get_json()['job']['id']
+
+    # 第一批写入后暂停，此时处理函数的事务未提交
+    reached, resume = threading.Event(), threading.Event()
+    progress = JobContext.progress
+
+    def paused_progress(self, done, total=None):
+        progress(self, done, total)
+        if done == 1:
+            reached.set()
+            resume.wait(10)
+
+    monkeypatch.setattr(JobContext, 'progress', paused_progress)
+
+    def work():
+        with file_app.app_context():
+            run_next_job('test')
+
+    worker = threading.Thread(target=work)
+    worker.start()
+    try:
+        assert reached.wait(10)
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        assert (job['status'], job['progress_done'], job['progress_total']) == ('running', 1, 3)
+
+        started = time.monotonic()
+        response = client.post(f'/api/jobs/{job_id}/cancel')
+        assert time.monotonic() - started < 1
+        assert response.status_code == 200
+        assert response.get_json()['message'] == '已请求取消'
+        assert response.get_json()['job']['cancel_requested']
+    finally:
+        resume.set()
+        worker.join(10)
+
+    with file_app.app_context():
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.progress_done) == ('cancelled', 2)
+        assert Payment.query.count() == 0
+        assert db.session.get(Account, bank_id).balance == Decimal('100.00')
+        db.session.remove()
+    # 结束后状态文件和取消标记已清理
+    assert not any(name.startswith('job-') for name in os.listdir(file_app.config['JOB_FILE_DIR']))
+
+
+def test_failed_and_unknown_jobs(client, user):
+    assert client.post('/api/jobs', json={'kind': 'unknown'}).status_code == 400
+    assert client.post('/api/jobs', json={'kind': 'voucher_import'}).status_code == 400
+    job_id = client.post('/api/jobs', json={'kind': 'payment_run', 'params': {'bill_ids': [1]}}).get_json()['job']['id']
+    run_next_job('test')
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert (job['status'], job['error']) == ('failed', '请选择付款银行账户')
+    assert client.post(f'/api/jobs/{job_id}/cancel').status_code == 400
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+import zipfile
+from datetime import datetime
+from xml.etree import ElementTree
+
+from models import db, Account, Voucher, VoucherEntry
+from posting import post_vouchers
+
+
+def seed_ledger(user_id, n=3):
+    accounts = {account.code: account for account in Account.query.filter_by(user_id=user_id)}
+    vouchers = []
+    for i in range(n):
+        voucher = Voucher(voucher_no=f'E-{i}', date=datetime(2025, 1, 1 + i), description=f'收款<{i}>', user_id=user_id)
+        voucher.entries = [
+            VoucherEntry(account_id=accounts['1002'].id, direction='借方', amount=10.0 + i),
+            VoucherEntry(account_id=accounts['6001'].id, direction='贷方', amount=10.0 + i),
+        ]
+        vouchers.append(voucher)
+    draft = Voucher(voucher_no='E-draft', date=datetime(2025, 1, 1), description='未过账', user_id=user_id)
+    draft.entries = [VoucherEntry(account_id=accounts['1002'].id, direction='借方', amount=1.0)]
+    db.session.add_all(vouchers + [draft])
+    db.session.flush()
+    post_vouchers(user_id, [voucher.id for voucher in vouchers])
+    db.session.commit()
+
+
+def test_export_csv(client, user):
+    seed_ledger(user['id'])
+    response = client.get('/api/reports/general-ledger/export?format=csv&from=2025-01-02&to=2025-01-03')
+    assert response.status_code == 200
+    assert 'attachment' in response.headers['Content-Disposition']
+    rows = list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))
+    assert rows[0][:3] == ['日期', '凭证号', '凭证摘要']
+    assert [(row[1], row[3], row[7], row[8]) for row in rows[1:]] == [
+        ('E-1', '1002', '11.00', '0.00'),
+        ('E-1', '6001', '0.00', '11.00'),
+        ('E-2', '1002', '12.00', '0.00'),
+        ('E-2', '6001', '0.00', '12.00'),
+    ]
+
+
+def test_export_jsonl(client, user):
+    seed_ledger(user['id'])
+    response = client.get('/api/reports/general-ledger/export?format=jsonl')
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(rows) == 6
+    assert all(row['voucher_no'] != 'E-draft' for row in rows)
+
+
+def test_export_xlsx(client, user):
+    seed_ledger(user['id'])
+    response = client.get('/api/reports/general-ledger/export?format=xlsx')
+    archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+    assert archive.testzip() is None
+    sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+    namespace = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+    rows = sheet.findall(f'{namespace}sheetData/{namespace}row')
+    assert len(rows) == 7
+    assert ''.join(rows[1].itertext()).startswith('2025-01-01E-0收款<0>')
+
+
+def test_export_rejects_unknown_format(client, user):
+    assert client.get('/api/reports/general-ledger/export?format=pdf').status_code == 400
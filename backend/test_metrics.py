@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+
+from models import Account
+from metrics import registry
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    registry.clear()
+
+
+def metric_value(text, name, **labels):
+    for line in text.splitlines():
+        if line.startswith(name + '{') and all(f'{key}="{value}"' in line for key, value in labels.items()):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_metrics_per_endpoint(app, client, user, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+    accounts = {account.code: account.id for account in Account.query.filter_by(user_id=user['id'])}
+    for i in range(3):
+        client.post('/api/vouchers', json={
+            'date': '2025-06-01',
+            'description': f'收款{i}',
+            'entries': [
+                {'account_id': accounts['1002'], 'direction': '借方', 'amount': 10},
+                {'account_id': accounts['6001'], 'direction': '贷方', 'amount': 10},
+            ]
+        })
+    client.get('/api/vouchers?limit=2')
+    client.get('/api/vouchers/999999')
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    labels = {'method': 'GET', 'endpoint': '/api/vouchers', 'status': '200'}
+    assert metric_value(text, 'accounting_http_requests_total', **labels) == 1
+    assert metric_value(text, 'accounting_db_queries_total', **labels) > 0
+    assert metric_value(text, 'accounting_serialized_rows_total', **labels) == 2
+    assert metric_value(text, 'accounting_http_request_duration_seconds_count', **labels) == 1
+    assert metric_value(text, 'accounting_http_request_duration_seconds_bucket', le='+Inf', **labels) == 1
+    assert metric_value(text, 'accounting_http_requests_total', method='POST', endpoint='/api/vouchers', status='201') == 3
+    assert metric_value(text, 'accounting_http_requests_total', endpoint='/api/vouchers/<int:id>', status='404') == 1
+
+
+def test_server_timing_and_slow_request_log(app, client, user, monkeypatch, caplog):
+    monkeypatch.setitem(app.config, 'METRICS_SERVER_TIMING', True)
+    monkeypatch.setitem(app.config, 'SLOW_REQUEST_MS', 0)
+    with caplog.at_level(logging.WARNING, logger='metrics'):
+        response = client.get('/api/accounts')
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    assert 'queries' in response.headers['Server-Timing']
+    assert '慢请求 GET /api/accounts -> 200' in caplog.text
+    assert 'SELECT' in caplog.text
+
+
+def test_metrics_token(app, client, monkeypatch):
+    # 默认未配置令牌时不开放
+    assert client.get('/metrics').status_code == 403
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
@@ -0,0 +1,136 @@
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from sqlalchemy import inspect, text
+
+from config import Config
+from models import db, Account, AccountClosure, VoucherEntry, AccountPeriodBalance
+from migrate import upgrade_database, migration_status, load_migrations
+from ledger import PERIOD_FORMAT
+
+
+# 代表性查询及升级后应命中的索引
+PLAN_QUERIES = [
+    ("SELECT id FROM vouchers WHERE user_id = 1 ORDER BY date DESC, id DESC LIMIT 50", 'ix_vouchers_user_date'),
+    ("SELECT id FROM vouchers WHERE user_id = 1 AND status = '未审核'", 'ix_vouchers_user_status'),
+    ("SELECT id, amount FROM voucher_entries WHERE voucher_id IN (1, 2, 3)", 'ix_voucher_entries_voucher'),
+    ("SELECT voucher_id FROM voucher_entries WHERE account_id = 1", 'ix_voucher_entries_account_voucher'),
+    ("SELECT id FROM accounts WHERE user_id = 1 AND type = '资产'", 'ix_accounts_user_type'),
+    ("SELECT id FROM bank_statement_items WHERE voucher_entry_id = 1", 'ix_bank_statement_items_voucher_entry'),
+]
+
+
+LEGACY_FLOAT_COLUMNS = [('accounts', 'balance'), ('voucher_entries', 'amount'), ('bills', 'amount')]
+
+
+# 使用独立连接查看执行计划：连接缓存的 EXPLAIN 语句不会因索引变化重新编译
+def query_plan(sql):
+    conn = sqlite3.connect(db.engine.url.database)
+    try:
+        return ' '.join(row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}'))
+    finally:
+        conn.close()
+
+
+# 模拟升级前的数据库：无组合索引、payments.bill_id 非空、缺少后加字段、金额为浮点元
+def make_legacy_schema():
+    db.create_all()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            db.session.execute(text(f'DROP INDEX {index.name}'))
+    db.session.execute(text('ALTER TABLE tax_declarations DROP COLUMN tax_rate'))
+    db.session.execute(text('DROP TABLE payments'))
+    db.session.execute(text('''
+        CREATE TABLE payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bill_id INTEGER NOT NULL,
+            voucher_id INTEGER,
+            payment_date DATETIME,
+            amount FLOAT NOT NULL,
+            payment_method VARCHAR(20) NOT NULL,
+            bank_account_id INTEGER,
+            receipt_number VARCHAR(100),
+            status VARCHAR(20) DEFAULT 'pending',
+            user_id INTEGER,
+            created_at DATETIME,
+            updated_at DATETIME
+        )
+    '''))
+    db.session.execute(text('DROP TABLE account_period_balances'))
+    for table, column in LEGACY_FLOAT_COLUMNS:
+        db.session.execute(text(f'ALTER TABLE {table} DROP COLUMN {column}'))
+        db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} FLOAT NOT NULL DEFAULT 0.0'))
+    db.session.commit()
+
+
+@pytest.fixture
+def legacy_app(tmp_path):
+    legacy = Flask(__name__)
+    legacy.config.from_object(Config)
+    legacy.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'legacy.db'}"
+    db.init_app(legacy)
+    with legacy.app_context():
+        make_legacy_schema()
+        yield legacy
+        db.session.remove()
+
+
+def test_fresh_database_is_stamped(app):
+    assert all(applied for _, _, applied in migration_status())
+    assert upgrade_database() == []
+
+
+def test_upgrade_legacy_database(legacy_app):
+    # 旧库金额为浮点元，直接以SQL写入
+    for statement in (
+        "INSERT INTO users (id, username, password_hash) VALUES (1, 'legacy', 'x')",
+        "INSERT INTO accounts (id, code, name, type, balance, user_id) VALUES (1, '1002', '银行存款', '资产', 30.3, 1)",
+        "INSERT INTO accounts (id, code, name, type, balance, user_id) VALUES (2, '6001', '主营业务收入', '收入', 30.3, 1)",
+        "INSERT INTO accounts (id, code, name, type, parent_id, balance, user_id) VALUES (3, '100201', '工商银行', '资产', 1, 0, 1)",
+        "INSERT INTO vouchers (id, voucher_no, date, description, status, posted, user_id) "
+        "VALUES (1, 'L-1', '2025-03-05 00:00:00.000000', '期初收款', '已审核', 1, 1)",
+        "INSERT INTO voucher_entries (voucher_id, account_id, direction, amount) VALUES (1, 1, '借方', 10.1)",
+        "INSERT INTO voucher_entries (voucher_id, account_id, direction, amount) VALUES (1, 1, '借方', 20.2)",
+        "INSERT INTO voucher_entries (voucher_id, account_id, direction, amount) VALUES (1, 2, '贷方', 30.3)",
+    ):
+        db.session.execute(text(statement))
+    db.session.commit()
+
+    applied = upgrade_database()
+    assert applied == [version for version, _, _ in load_migrations()]
+
+    inspector = inspect(db.engine)
+    payment_columns = {column['name']: column for column in inspector.get_columns('payments')}
+    assert payment_columns['bill_id']['nullable']
+    assert {'tax_declaration_id', 'purchase_order_id'} <= set(payment_columns)
+    assert 'tax_rate' in [column['name'] for column in inspector.get_columns('tax_declarations')]
+
+    assert db.session.get(Account, 1).balance == Decimal('30.30')
+    assert db.session.query(db.func.sum(VoucherEntry.amount)).filter(VoucherEntry.account_id == 1).scalar() == Decimal('30.30')
+    snapshot = AccountPeriodBalance.query.filter_by(account_id=1).one()
+    assert snapshot.period == datetime(2025, 3, 1).strftime(PERIOD_FORMAT)
+    assert snapshot.opening_balance == Decimal('0.00')
+    assert snapshot.debit_total == Decimal('30.30')
+    assert snapshot.closing_balance == Decimal('30.30')
+    closure = {(row.ancestor_id, row.descendant_id, row.depth) for row in AccountClosure.query}
+    assert closure == {(1, 1, 0), (2, 2, 0), (3, 3, 0), (1, 3, 1)}
+
+    # 再次执行不会重复迁移
+    assert upgrade_database() == []
+
+
+def test_indexes_change_query_plans(legacy_app):
+    before = {sql: query_plan(sql) for sql, _ in PLAN_QUERIES}
+    upgrade_database()
+    for sql, index_name in PLAN_QUERIES:
+        assert index_name not in before[sql]
+        assert index_name in query_plan(sql), sql
+
+
+def test_model_indexes_match_migration(app):
+    model_indexes = {index.name for table in db.metadata.sorted_tables for index in table.indexes}
+    migration_indexes = {name for _, _, module in load_migrations() for name, _, _ in getattr(module, 'INDEXES', ())}
+    assert model_indexes == migration_indexes
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from models import db, Account, VoucherEntry
+from money import Money, to_money, to_cents, money_mul
+
+
+def test_to_money_rounds_half_up():
+    assert to_money(0.1 + 0.2) == Decimal('0.30')
+    assert to_money('2.675') == Decimal('2.68')
+    assert to_money(2.675) == Decimal('2.68')
+    assert to_cents('-1.005') == -101
+    assert money_mul('19.99', 3) == Decimal('59.97')
+
+
+def test_money_expression_types():
+    # 金额加减仍按金额读取；乘以倍数时倍数不换算为分
+    assert isinstance((VoucherEntry.amount - VoucherEntry.amount).type, Money)
+    assert isinstance(db.func.sum(VoucherEntry.amount).type, Money)
+    assert not isinstance((VoucherEntry.amount * 2).right.type, Money)
+
+
+def test_voucher_amounts_are_exact(client, user):
+    response = client.post('/api/vouchers', json={
+        'date': '2025-04-01',
+        'description': '零钱收款',
+        'entries': [
+            {'account_id': _account_id(user, '1001'), 'direction': '借方', 'amount': 0.1},
+            {'account_id': _account_id(user, '1001'), 'direction': '借方', 'amount': 0.2},
+            {'account_id': _account_id(user, '6001'), 'direction': '贷方', 'amount': 0.3},
+        ]
+    })
+    assert response.status_code == 201
+    voucher_id = response.get_json()['id']
+
+    # 反复过账、取消过账后余额不产生累积误差
+    for _ in range(9):
+        client.post(f'/api/vouchers/{voucher_id}/post')
+        client.post(f'/api/vouchers/{voucher_id}/unpost')
+    client.post(f'/api/vouchers/{voucher_id}/post')
+    cash = Account.query.filter_by(user_id=user['id'], code='1001').one()
+    assert cash.balance == Decimal('0.30')
+
+    total = db.session.query(db.func.sum(VoucherEntry.amount)).filter(VoucherEntry.direction == '借方').scalar()
+    assert total == Decimal('0.30')
+
+    entries = client.get(f'/api/vouchers/{voucher_id}').get_json()['entries']
+    assert sorted(entry['amount'] for entry in entries) == [0.1, 0.2, 0.3]
+
+
+def _account_id(user, code):
+    return Account.query.filter_by(user_id=user['id'], code=code).one().id
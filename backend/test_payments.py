@@ -0,0 +1,98 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from models import db, Account, Voucher, VoucherEntry, Vendor, PurchaseOrder, PurchaseOrderItem, TaxDeclaration, Bill, Payment
+import payments
+from ledger import period_key
+
+
+def seed_payables(user_id, bill_count=3):
+    bank = Account.query.filter_by(user_id=user_id, code='1002').one()
+    bank.balance = Decimal('10000.00')
+    vendor = Vendor(name='供应商A', user_id=user_id)
+    db.session.add(vendor)
+    db.session.flush()
+    bills = [
+        Bill(bill_no=f'B-{i}', vendor_id=vendor.id, amount=Decimal('10.10'), due_date=date(2025, 5, 1), status='已核对待付款', user_id=user_id)
+        for i in range(bill_count)
+    ]
+    tax = TaxDeclaration(period='2025-04', tax_type='增值税', tax_payable=Decimal('5.25'), status='success', user_id=user_id)
+    order = PurchaseOrder(order_number='PO-1', vendor_id=vendor.id, order_date=date(2025, 4, 1), status='approved', user_id=user_id)
+    order.items = [PurchaseOrderItem(product_name='纸', quantity=3, unit_price=Decimal('1.99'))]
+    db.session.add_all(bills + [tax, order])
+    db.session.commit()
+    return bank, bills, tax, order
+
+
+def test_execute_payment_per_item_vouchers(client, user):
+    bank, bills, tax, order = seed_payables(user['id'])
+    response = client.post('/api/payments/execute', json={
+        'bill_ids': [bill.id for bill in bills],
+        'tax_ids': [tax.id],
+        'purchase_order_ids': [order.id],
+        'bank_account_id': bank.id
+    })
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['total_amount'] == 41.52
+    assert result['payment_count'] == 5
+    assert len(result['voucher_ids']) == 5
+    assert {bill['status'] for bill in result['bills']} == {'已支付'}
+    assert result['tax_declarations'][0]['status'] == 'paid'
+    assert result['purchase_orders'][0]['status'] == 'completed'
+
+    assert Payment.query.count() == 5
+    assert all(payment.voucher_id for payment in Payment.query)
+    assert Voucher.query.filter_by(posted=True).count() == 5
+    assert db.session.get(Account, bank.id).balance == Decimal('9958.48')
+    payable = Account.query.filter_by(user_id=user['id'], code='2202').one()
+    assert payable.balance == Decimal('-36.27')
+
+
+def test_execute_payment_consolidated_in_batches(client, user, monkeypatch):
+    monkeypatch.setattr(payments, 'PAYMENT_BATCH_SIZE', 2)
+    bank, bills, _, _ = seed_payables(user['id'], bill_count=5)
+    response = client.post('/api/payments/execute', json={
+        'bill_ids': [bill.id for bill in bills],
+        'bank_account_id': bank.id,
+        'consolidate': True
+    })
+    result = response.get_json()
+    assert len(result['voucher_ids']) == 1
+    voucher = db.session.get(Voucher, result['voucher_ids'][0])
+    assert voucher.posted
+    credits = VoucherEntry.query.filter_by(voucher_id=voucher.id, direction='贷方').all()
+    assert [entry.amount for entry in credits] == [Decimal('50.50')]
+    assert VoucherEntry.query.filter_by(voucher_id=voucher.id, direction='借方').count() == 5
+    assert {payment.voucher_id for payment in Payment.query} == {voucher.id}
+
+
+def test_payment_run_reports_progress(app, user, monkeypatch):
+    monkeypatch.setattr(payments, 'PAYMENT_BATCH_SIZE', 2)
+    bank, bills, _, _ = seed_payables(user['id'], bill_count=5)
+    calls = []
+    payables = payments.load_payables(user['id'], {'bill': [bill.id for bill in bills]})
+    payments.execute_payment_run(user['id'], bank, payables, progress=lambda done, total: calls.append((done, total)))
+    assert calls == [(2, 5), (4, 5), (5, 5)]
+
+
+def test_execute_payment_rejects_foreign_records(client, user):
+    bank, bills, _, _ = seed_payables(user['id'])
+    response = client.post('/api/payments/execute', json={
+        'bill_ids': [bills[0].id, 9999],
+        'bank_account_id': bank.id
+    })
+    assert response.status_code == 400
+    assert Payment.query.count() == 0
+
+
+def test_execute_payment_into_closed_period(client, user):
+    bank, bills, _, _ = seed_payables(user['id'])
+    # 付款凭证日期为当天，结账当月后付款被拒绝
+    assert client.post(f'/api/periods/{period_key(datetime.utcnow())}/close').status_code == 200
+    response = client.post('/api/payments/execute', json={'bill_ids': [bills[0].id], 'bank_account_id': bank.id})
+    assert response.status_code == 400
+    assert '已结账' in response.get_json()['message']
+    assert Payment.query.count() == 0
+    assert db.session.get(Bill, bills[0].id).status == '已核对待付款'
+    assert db.session.get(Account, bank.id).balance == Decimal('10000.00')
@@ -0,0 +1,99 @@
+from datetime import datetime
+
+from models import db, Account, AccountPeriodBalance, Voucher, VoucherEntry
+from money import ZERO
+from ledger import DEBIT_NORMAL_TYPES, balance_at, period_key
+
+
+def create_voucher(client, day, debit, credit, amount):
+    voucher_id = client.post('/api/vouchers', json={
+        'date': day,
+        'description': '测试',
+        'entries': [
+            {'account_id': debit, 'direction': '借方', 'amount': amount},
+            {'account_id': credit, 'direction': '贷方', 'amount': amount},
+        ]
+    }).get_json()['id']
+    client.post(f'/api/vouchers/{voucher_id}/post')
+    return voucher_id
+
+
+# 由已过账分录全量重算：{科目ID: [(日期, 借方, 贷方, 余额变动)]} 及过账前的初始余额
+def posted_entries(user_id):
+    entries = {}
+    rows = db.session.query(VoucherEntry, Voucher.date, Account.type).join(
+        Voucher, Voucher.id == VoucherEntry.voucher_id
+    ).join(Account, Account.id == VoucherEntry.account_id).filter(Voucher.user_id == user_id, Voucher.posted == True)
+    for entry, day, account_type in rows:
+        debit = entry.amount if entry.direction == '借方' else ZERO
+        credit = entry.amount if entry.direction == '贷方' else ZERO
+        net = debit - credit if account_type in DEBIT_NORMAL_TYPES else credit - debit
+        entries.setdefault(entry.account_id, []).append((day, debit, credit, net))
+    initial = {
+        account.id: account.balance - sum((net for _, _, _, net in entries.get(account.id, [])), ZERO)
+        for account in Account.query.filter_by(user_id=user_id)
+    }
+    return entries, initial
+
+
+def expected_balance(entries, initial, account_id, moment):
+    return initial[account_id] + sum((net for day, _, _, net in entries.get(account_id, []) if day <= moment), ZERO)
+
+
+def assert_snapshots_match_entries(user_id):
+    entries, initial = posted_entries(user_id)
+    snapshots = AccountPeriodBalance.query.filter_by(user_id=user_id).all()
+    covered = {(row.account_id, row.period) for row in snapshots}
+    for account_id, account_entries in entries.items():
+        assert {(account_id, period_key(day)) for day, _, _, _ in account_entries} <= covered
+    for row in snapshots:
+        in_period = [entry for entry in entries.get(row.account_id, []) if period_key(entry[0]) == row.period]
+        before = [entry for entry in entries.get(row.account_id, []) if period_key(entry[0]) < row.period]
+        opening = initial[row.account_id] + sum((net for _, _, _, net in before), ZERO)
+        assert (row.opening_balance, row.debit_total, row.credit_total, row.closing_balance) == (
+            opening,
+            sum((debit for _, debit, _, _ in in_period), ZERO),
+            sum((credit for _, _, credit, _ in in_period), ZERO),
+            opening + sum((net for _, _, _, net in in_period), ZERO)
+        ), (row.account_id, row.period)
+    return entries, initial
+
+
+def test_snapshots_follow_posting_across_months(client, user):
+    accounts = {account.code: account.id for account in Account.query.filter_by(user_id=user['id'])}
+    bank, sales, expense, payable = accounts['1002'], accounts['6001'], accounts['6602'], accounts['2202']
+    march = create_voucher(client, '2025-03-05', bank, sales, 100)
+    create_voucher(client, '2025-03-20', bank, sales, '40.50')
+    create_voucher(client, '2025-05-10', expense, bank, 30)
+    assert_snapshots_match_entries(user['id'])
+
+    # 早于已有快照的期间：期初取后一期期初，后续期间整体顺延
+    create_voucher(client, '2025-01-15', bank, sales, 50)
+    # 夹在中间的期间：期初取前一期期末
+    create_voucher(client, '2025-04-02', bank, payable, 20)
+    assert_snapshots_match_entries(user['id'])
+    rows = {row['period']: row for row in client.get(f'/api/accounts/{bank}/period-balances').get_json()}
+    assert [(rows[period]['opening_balance'], rows[period]['closing_balance']) for period in sorted(rows)] == [
+        (0, 50), (50, 190.5), (190.5, 210.5), (210.5, 180.5)
+    ]
+    ranged = client.get(f'/api/accounts/{bank}/period-balances?from=2025-03&to=2025-04').get_json()
+    assert [row['period'] for row in ranged] == ['2025-03', '2025-04']
+
+    # 取消过账冲回本期发生额，并回退后续期间
+    assert client.post(f'/api/vouchers/{march}/unpost').status_code == 200
+    entries, initial = assert_snapshots_match_entries(user['id'])
+    march_row = AccountPeriodBalance.query.filter_by(account_id=bank, period='2025-03').one()
+    assert (march_row.debit_total, march_row.closing_balance) == (40.5, 90.5)
+
+    moments = [
+        datetime(2024, 12, 31), datetime(2025, 1, 15), datetime(2025, 2, 28, 12), datetime(2025, 3, 10),
+        datetime(2025, 3, 31, 23, 59, 59, 999999), datetime(2025, 4, 30), datetime(2025, 5, 9), datetime(2025, 6, 1),
+    ]
+    for account_id in (bank, sales, expense, payable):
+        for moment in moments:
+            assert balance_at(account_id, moment) == expected_balance(entries, initial, account_id, moment), (account_id, moment)
+
+    # 仅传日期时取当天结束时的余额
+    assert client.get(f'/api/accounts/{bank}/balance?as_of=2025-03-20').get_json()['balance'] == 90.5
+    assert client.get(f'/api/accounts/{bank}/balance?as_of=2025-03-19').get_json()['balance'] == 50
+    assert client.get(f'/api/accounts/{bank}/balance?as_of=2025-13-01').status_code == 400
@@ -0,0 +1,120 @@
+from decimal import Decimal
+
+from models import db, Account, Voucher
+from posting import apply_vouchers, post_vouchers, unpost_vouchers
+
+
+def account_ids(user_id):
+    return {account.code: account.id for account in Account.query.filter_by(user_id=user_id)}
+
+
+def create_voucher(client, debit, credit, amount, day='2025-04-10'):
+    return client.post('/api/vouchers', json={
+        'date': day,
+        'description': '测试',
+        'entries': [
+            {'account_id': debit, 'direction': '借方', 'amount': amount},
+            {'account_id': credit, 'direction': '贷方', 'amount': amount},
+        ]
+    }).get_json()['id']
+
+
+def balances(user_id):
+    return {account.code: account.balance for account in Account.query.filter_by(user_id=user_id)}
+
+
+def create_other_voucher(app):
+    other = app.test_client()
+    other_user = other.post('/api/auth/register', json={
+        'username': 'other',
+        'email': 'other@example.com',
+        'password': 'secret',
+        'full_name': 'Other'
+    }).get_json()['user']
+    accounts = account_ids(other_user['id'])
+    return create_voucher(other, accounts['1002'], accounts['6001'], 10)
+
+
+def test_post_and_unpost_sign_rules(app, client, user):
+    accounts = account_ids(user['id'])
+    # 资产、费用类借方增加；负债、权益、收入类贷方增加
+    sale = create_voucher(client, accounts['1002'], accounts['6001'], 100)
+    expense = create_voucher(client, accounts['6602'], accounts['2202'], 30)
+    capital = create_voucher(client, accounts['1122'], accounts['4001'], 50)
+    refund = create_voucher(client, accounts['6001'], accounts['1002'], '12.50')
+    other = create_other_voucher(app)
+    before = balances(user['id'])
+
+    posted, skipped = post_vouchers(user['id'], [sale, expense, capital, refund, other, 999999])
+    db.session.commit()
+    assert posted == [sale, expense, capital, refund]
+    assert skipped == sorted([other, 999999])
+    after = balances(user['id'])
+    assert {code: after[code] - before[code] for code in ('1002', '6001', '6602', '2202', '1122', '4001')} == {
+        '1002': Decimal('87.50'),
+        '6001': Decimal('87.50'),
+        '6602': Decimal('30.00'),
+        '2202': Decimal('30.00'),
+        '1122': Decimal('50.00'),
+        '4001': Decimal('50.00'),
+    }
+    assert all(voucher.posted and voucher.status == '已审核' for voucher in Voucher.query.filter(Voucher.id.in_(posted)))
+    assert not db.session.get(Voucher, other).posted
+
+    # 已过账的凭证再次过账时跳过，余额不变
+    assert post_vouchers(user['id'], [sale]) == ([], [sale])
+    assert balances(user['id']) == after
+
+    draft = create_voucher(client, accounts['1002'], accounts['6001'], 5)
+    unposted, skipped = unpost_vouchers(user['id'], [sale, expense, draft, other])
+    db.session.commit()
+    assert unposted == [sale, expense]
+    assert skipped == sorted([draft, other])
+    current = balances(user['id'])
+    assert (current['1002'] - before['1002'], current['6001'] - before['6001']) == (Decimal('-12.50'), Decimal('-12.50'))
+    assert (current['6602'], current['2202']) == (before['6602'], before['2202'])
+    assert db.session.get(Voucher, sale).posted is False
+
+
+def test_apply_vouchers_returns_deltas_without_changing_status(client, user):
+    accounts = account_ids(user['id'])
+    voucher_ids = [
+        create_voucher(client, accounts['1002'], accounts['6001'], 100),
+        create_voucher(client, accounts['6602'], accounts['1002'], 40),
+    ]
+    deltas = apply_vouchers(voucher_ids)
+    assert {account_id: delta for account_id, delta in deltas.items() if delta} == {
+        accounts['1002']: Decimal('60.00'),
+        accounts['6001']: Decimal('100.00'),
+        accounts['6602']: Decimal('40.00'),
+    }
+    apply_vouchers(voucher_ids, -1)
+    db.session.commit()
+    assert balances(user['id'])['1002'] == 0
+    assert not any(voucher.posted for voucher in Voucher.query)
+
+
+def test_batch_endpoints_skip_and_update_in_constant_statements(app, client, user, count_queries):
+    accounts = account_ids(user['id'])
+    other = create_other_voucher(app)
+    update_counts = []
+    for n in (2, 10):
+        voucher_ids = [create_voucher(client, accounts['1002'], accounts['6001'], 10) for _ in range(n)]
+        with count_queries() as statements:
+            response = client.post('/api/vouchers/post-batch', json={'voucher_ids': voucher_ids + [other, 999999]})
+        update_counts.append(sum(statement.lstrip().upper().startswith('UPDATE') for statement in statements))
+        data = response.get_json()
+        assert (data['posted_count'], data['posted_ids'], data['skipped_ids']) == (n, voucher_ids, sorted([other, 999999]))
+    # 科目余额、期间快照和凭证状态均按批更新，UPDATE 条数与凭证数无关
+    assert update_counts[0] == update_counts[1]
+    assert balances(user['id'])['1002'] == Decimal('120.00')
+
+    again = client.post('/api/vouchers/post-batch', json={'voucher_ids': voucher_ids[:1]}).get_json()
+    assert (again['posted_count'], again['skipped_ids']) == (0, voucher_ids[:1])
+
+    response = client.post('/api/vouchers/unpost-batch', json={'voucher_ids': voucher_ids + [other]}).get_json()
+    assert (response['unposted_count'], response['skipped_ids']) == (len(voucher_ids), [other])
+    assert balances(user['id'])['1002'] == Decimal('20.00')
+
+    assert client.post('/api/vouchers/post-batch', json={'voucher_ids': []}).status_code == 400
+    assert client.post('/api/vouchers/unpost-batch', json={'voucher_ids': ['x']}).status_code == 400
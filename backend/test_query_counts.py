@@ -0,0 +1,87 @@
+from datetime import date, datetime
+
+import pytest
+
+from models import db, Account, Voucher, VoucherEntry, Vendor, BankStatement, BankStatementItem, PurchaseOrder, PurchaseOrderItem, TaxDeclaration, Bill
+from cache import dashboard_cache
+
+
+def seed(user_id, n):
+    accounts = {account.code: account for account in Account.query.filter_by(user_id=user_id)}
+    child = Account(code='100201', name='工商银行', type='资产', parent_id=accounts['1002'].id, user_id=user_id)
+    db.session.add(child)
+    for i in range(n):
+        vendor = Vendor(name=f'供应商{i}', user_id=user_id)
+        db.session.add(vendor)
+        voucher = Voucher(voucher_no=f'T-{n}-{i}', date=datetime(2025, 1, 1 + i), description='测试', user_id=user_id)
+        voucher.entries = [
+            VoucherEntry(account_id=accounts['1002'].id, direction='借方', amount=10.0),
+            VoucherEntry(account_id=accounts['6001'].id, direction='贷方', amount=10.0),
+        ]
+        db.session.add(voucher)
+        order = PurchaseOrder(order_number=f'PO-{n}-{i}', vendor=vendor, order_date=datetime(2025, 1, 1), status='approved', user_id=user_id)
+        order.items = [PurchaseOrderItem(product_name='物料', quantity=2, unit_price=5, account_id=accounts['1403'].id)]
+        db.session.add(order)
+        db.session.add(Bill(bill_no=f'B-{n}-{i}', vendor=vendor, purchase_order=order, amount=10.0, due_date=date(2025, 2, 1), status='已核对待付款', user_id=user_id))
+        db.session.add(TaxDeclaration(period='2025-01', tax_type='增值税', status='success', user_id=user_id))
+        statement = BankStatement(account_id=accounts['1002'].id, statement_date=date(2025, 1, 31), user_id=user_id)
+        statement.items = [BankStatementItem(transaction_date=date(2025, 1, 2), description='收款', amount=10.0, balance=10.0)]
+        db.session.add(statement)
+    db.session.commit()
+
+
+LIST_ENDPOINTS = [
+    '/api/vouchers?include=entries',
+    '/api/accounts',
+    '/api/accounts/bank',
+    '/api/vendors',
+    '/api/bank-statements',
+    '/api/purchase-orders',
+    '/api/tax-declarations',
+    '/api/bills/awaiting-payment',
+    '/api/unreconciled-voucher-entries',
+]
+
+
+@pytest.mark.parametrize('url', LIST_ENDPOINTS)
+def test_list_endpoint_query_count_is_constant(client, user, count_queries, url):
+    counts = []
+    for n in (2, 8):
+        seed(user['id'], n)
+        with count_queries() as statements:
+            response = client.get(url)
+        assert response.status_code == 200
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+
+def test_voucher_detail_query_count_is_constant(client, user, count_queries):
+    accounts = [(account.id, account.code) for account in Account.query.filter_by(user_id=user['id']).order_by(Account.code)]
+    counts = []
+    for n in (2, 8):
+        voucher = Voucher(voucher_no=f'D-{n}', date=datetime(2025, 1, 1), description='测试', user_id=user['id'])
+        voucher.entries = [VoucherEntry(account_id=account_id, direction='借方', amount=1.0) for account_id, _ in accounts[:n]]
+        db.session.add(voucher)
+        db.session.commit()
+        voucher_id = voucher.id
+        db.session.expunge_all()
+        with count_queries() as statements:
+            data = client.get(f'/api/vouchers/{voucher_id}').get_json()
+        assert [entry['account']['code'] for entry in data['entries']] == [code for _, code in accounts[:n]]
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+
+def test_dashboard_query_count_is_constant(client, user, count_queries):
+    counts = []
+    for n in (2, 8):
+        seed(user['id'], n)
+        dashboard_cache.clear()
+        with count_queries() as statements:
+            assert client.get('/api/dashboard').status_code == 200
+        counts.append(len(statements))
+        # 缓存命中时不查询数据库
+        with count_queries() as statements:
+            client.get('/api/dashboard')
+        assert statements == []
+    assert counts[0] == counts[1]
@@ -0,0 +1,177 @@
+from datetime import date, datetime
+
+from models import db, Account, Voucher, VoucherEntry, BankStatement, BankStatementItem
+
+
+def make_entry(user_id, account, amount, direction, day, voucher_no):
+    other = Account.query.filter_by(user_id=user_id, code='6001').one()
+    voucher = Voucher(voucher_no=voucher_no, date=datetime(2025, 3, day), description='测试', user_id=user_id)
+    entry = VoucherEntry(account_id=account.id, direction=direction, amount=amount)
+    voucher.entries = [entry, VoucherEntry(account_id=other.id, direction='贷方' if direction == '借方' else '借方', amount=amount)]
+    db.session.add(voucher)
+    return entry
+
+
+def seed_statement(user_id):
+    bank = Account.query.filter_by(user_id=user_id, code='1002').one()
+    entries = {
+        'deposit': make_entry(user_id, bank, 100.0, '借方', 10, 'R-1'),
+        'deposit_far': make_entry(user_id, bank, 100.0, '借方', 1, 'R-2'),
+        'payment': make_entry(user_id, bank, 45.5, '贷方', 12, 'R-3'),
+        'combined': make_entry(user_id, bank, 30.0, '借方', 15, 'R-4'),
+    }
+    statement = BankStatement(account_id=bank.id, statement_date=date(2025, 3, 31), user_id=user_id)
+    statement.items = [
+        BankStatementItem(transaction_date=date(2025, 3, 11), description='收款', amount=100.0, balance=100.0),
+        BankStatementItem(transaction_date=date(2025, 3, 12), description='付款', amount=-45.5, balance=54.5),
+        BankStatementItem(transaction_date=date(2025, 3, 15), description='收款A', amount=10.0, balance=64.5),
+        BankStatementItem(transaction_date=date(2025, 3, 15), description='收款B', amount=20.0, balance=84.5),
+        BankStatementItem(transaction_date=date(2025, 3, 20), description='手续费', amount=-5.0, balance=79.5),
+    ]
+    statement.item_count = len(statement.items)
+    db.session.add(statement)
+    db.session.commit()
+    return statement, entries
+
+
+def test_auto_reconcile_dry_run_and_apply(client, user):
+    statement, entries = seed_statement(user['id'])
+    item_ids = [item.id for item in statement.items]
+
+    response = client.post(f'/api/bank-statements/{statement.id}/auto-reconcile', json={'dry_run': True})
+    result = response.get_json()
+    matches = {tuple(match['item_ids']): (match['type'], match['voucher_entry_id']) for match in result['matches']}
+    assert matches == {
+        (item_ids[0],): ('one_to_one', entries['deposit'].id),
+        (item_ids[1],): ('one_to_one', entries['payment'].id),
+        (item_ids[2], item_ids[3]): ('many_to_one', entries['combined'].id),
+    }
+    assert result['unmatched_item_ids'] == [item_ids[4]]
+    assert BankStatementItem.query.filter_by(reconciled=True).count() == 0
+
+    response = client.post(f'/api/bank-statements/{statement.id}/auto-reconcile', json={})
+    result = response.get_json()
+    assert result['matched_item_count'] == 4
+    assert result['status'] == '已对账'
+    assert db.session.get(BankStatementItem, item_ids[3]).voucher_entry_id == entries['combined'].id
+
+    # 已对账的分录不会再次参与匹配
+    result = client.post(f'/api/bank-statements/{statement.id}/auto-reconcile', json={}).get_json()
+    assert result['matches'] == []
+
+
+def test_auto_reconcile_respects_window(client, user):
+    statement, entries = seed_statement(user['id'])
+    result = client.post(f'/api/bank-statements/{statement.id}/auto-reconcile', json={'dry_run': True, 'window_days': 0}).get_json()
+    assert entries['deposit'].id not in [match['voucher_entry_id'] for match in result['matches']]
+
+
+def test_reconcile_counters_track_changes(client, user):
+    statement, entries = seed_statement(user['id'])
+    statement_id = statement.id
+    item_ids = [item.id for item in statement.items]
+    client.post(f'/api/bank-statements/{statement_id}/items', json={
+        'transaction_date': '2025-03-25', 'description': '利息', 'amount': 1.5, 'balance': 81.0
+    })
+    statement = db.session.get(BankStatement, statement_id)
+    assert statement.item_count == 6
+
+    response = client.post(f'/api/bank-statement-items/{item_ids[0]}/reconcile', json={'voucher_entry_id': entries['deposit'].id})
+    assert response.status_code == 200
+    response = client.post(f'/api/bank-statements/{statement_id}/reconcile-batch', json={'pairs': [
+        {'item_id': item_ids[1], 'voucher_entry_id': entries['payment'].id},
+        {'item_id': item_ids[0], 'voucher_entry_id': None},
+    ]})
+    result = response.get_json()
+    assert result['reconciled_count'] == 1
+    assert result['reconciled_amount'] == -45.5
+    assert result['status'] == '已对账'
+
+    response = client.post(f'/api/bank-statements/{statement_id}/reconcile-batch', json={'pairs': [
+        {'item_id': item_ids[2], 'voucher_entry_id': 999999}
+    ]})
+    assert response.status_code == 404
+
+
+def test_add_reconciled_items_with_float_amounts(client, user):
+    statement, _ = seed_statement(user['id'])
+    statement_id = statement.id
+    response = client.post(f'/api/bank-statements/{statement_id}/items', json={
+        'transaction_date': '2025-03-25', 'description': '利息', 'amount': 12.5, 'balance': 92.0, 'reconciled': True
+    })
+    assert response.status_code == 201
+    assert response.get_json()['amount'] == 12.5
+    response = client.post(f'/api/bank-statements/{statement_id}/items/batch', json={'items': [
+        {'transaction_date': '2025-03-26', 'description': '退款', 'amount': 0.1, 'balance': 92.1, 'reconciled': True},
+        {'transaction_date': '2025-03-27', 'description': '手续费', 'amount': -0.2, 'balance': 91.9},
+    ]})
+    assert response.status_code == 201
+    result = client.get(f'/api/bank-statements/{statement_id}').get_json()
+    assert (result['item_count'], result['reconciled_count'], result['reconciled_amount']) == (8, 2, 12.6)
+
+
+def test_reconcile_batch_completes_statement(client, user):
+    statement, entries = seed_statement(user['id'])
+    statement_id = statement.id
+    items = BankStatementItem.query.filter_by(bank_statement_id=statement_id).all()
+
+    pairs = [{'item_id': item.id, 'voucher_entry_id': entries['combined'].id} for item in items]
+    result = client.post(f'/api/bank-statements/{statement_id}/reconcile-batch', json={'pairs': pairs}).get_json()
+    assert result['status'] == '已完成'
+    assert result['reconciled_count'] == 5
+    assert result['reconciled_amount'] == sum(item.amount for item in items)
+
+
+def test_unreconciled_entries_filters_and_pages(client, user, count_queries):
+    statement, entries = seed_statement(user['id'])
+    client.post(f'/api/bank-statement-items/{statement.items[0].id}/reconcile', json={'voucher_entry_id': entries['deposit'].id})
+
+    with count_queries() as statements:
+        result = client.get('/api/unreconciled-voucher-entries?limit=2').get_json()
+    assert len(statements) == 1
+    assert [item['id'] for item in result['items']] == [entries['combined'].id, entries['payment'].id]
+    assert result['has_more']
+
+    result = client.get(f"/api/unreconciled-voucher-entries?limit=2&cursor={result['next_cursor']}").get_json()
+    assert [item['id'] for item in result['items']] == [entries['deposit_far'].id]
+    assert not result['has_more']
+
+    bank_id = statement.account_id
+    result = client.get(f'/api/unreconciled-voucher-entries?account_id={bank_id}&date_from=2025-03-05&date_to=2025-03-12&amount_min=40').get_json()
+    assert [item['id'] for item in result['items']] == [entries['payment'].id]
+    result = client.get('/api/unreconciled-voucher-entries?direction=借方').get_json()
+    assert {item['id'] for item in result['items']} == {entries['combined'].id, entries['deposit_far'].id}
+
+
+def test_unreconciled_entries_include_nested_accounts(client, user):
+    statement, entries = seed_statement(user['id'])
+    bank_id = statement.account_id
+    child = client.post('/api/accounts', json={'code': '100201', 'name': '工商银行', 'type': '资产', 'parent_id': bank_id}).get_json()
+    grandchild = client.post('/api/accounts', json={'code': '10020101', 'name': '工商银行基本户', 'type': '资产', 'parent_id': child['id']}).get_json()
+    nested = make_entry(user['id'], db.session.get(Account, grandchild['id']), 12.34, '借方', 18, 'R-5')
+    db.session.commit()
+
+    result = client.get(f'/api/unreconciled-voucher-entries?account_id={bank_id}').get_json()
+    assert nested.id in [item['id'] for item in result['items']]
+    result = client.get(f"/api/unreconciled-voucher-entries?account_id={child['id']}").get_json()
+    assert [item['id'] for item in result['items']] == [nested.id]
+
+    # 金额边界按分精确比较
+    result = client.get(f'/api/unreconciled-voucher-entries?account_id={bank_id}&amount_min=12.34&amount_max=12.34').get_json()
+    assert [item['id'] for item in result['items']] == [nested.id]
+    result = client.get(f'/api/unreconciled-voucher-entries?account_id={bank_id}&amount_min=12.35&amount_max=45.49').get_json()
+    assert [item['id'] for item in result['items']] == [entries['combined'].id]
+    assert client.get('/api/unreconciled-voucher-entries?amount_min=abc').status_code == 400
+
+
+def test_auto_reconcile_matches_nested_bank_accounts(client, user):
+    statement, _ = seed_statement(user['id'])
+    statement_id, bank_id = statement.id, statement.account_id
+    child = client.post('/api/accounts', json={'code': '100201', 'name': '工商银行', 'type': '资产', 'parent_id': bank_id}).get_json()
+    grandchild = client.post('/api/accounts', json={'code': '10020101', 'name': '工商银行基本户', 'type': '资产', 'parent_id': child['id']}).get_json()
+    fee = make_entry(user['id'], db.session.get(Account, grandchild['id']), 5.0, '贷方', 20, 'R-5')
+    db.session.commit()
+
+    result = client.post(f'/api/bank-statements/{statement_id}/auto-reconcile', json={'dry_run': True}).get_json()
+    assert fee.id in [match['voucher_entry_id'] for match in result['matches']]
+    assert result['unmatched_item_ids'] == []
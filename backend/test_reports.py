@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Account, Voucher, VoucherEntry
+from money import ZERO
+from ledger import DEBIT_NORMAL_TYPES
+
+
+def create_voucher(client, day, debit, credit, amount, post=True):
+    voucher_id = client.post('/api/vouchers', json={
+        'date': day,
+        'description': '测试',
+        'entries': [
+            {'account_id': debit, 'direction': '借方', 'amount': amount},
+            {'account_id': credit, 'direction': '贷方', 'amount': amount},
+        ]
+    }).get_json()['id']
+    if post:
+        client.post(f'/api/vouchers/{voucher_id}/post')
+    return voucher_id
+
+
+@pytest.fixture
+def books(client, user):
+    accounts = {account.code: account.id for account in Account.query.filter_by(user_id=user['id'])}
+    create_voucher(client, '2025-01-10', accounts['1002'], accounts['4001'], 500)
+    create_voucher(client, '2025-01-31', accounts['1001'], accounts['6001'], 80)
+    create_voucher(client, '2025-02-05', accounts['1002'], accounts['6001'], 200)
+    create_voucher(client, '2025-02-10', accounts['6602'], accounts['1002'], 45)
+    create_voucher(client, '2025-02-10', accounts['1403'], accounts['2202'], 60)
+    create_voucher(client, '2025-02-20', accounts['2202'], accounts['1001'], 25)
+    create_voucher(client, '2025-03-15', accounts['1002'], accounts['6051'], 70)
+    create_voucher(client, '2025-02-12', accounts['6602'], accounts['1002'], 999, post=False)
+    return accounts
+
+
+# 由已过账分录重算 (start, end] 内各科目的借方、贷方、余额变动，start 为 None 时从最早开始
+def recompute(user_id, start, end):
+    totals = {}
+    rows = db.session.query(VoucherEntry, Voucher.date, Account.code, Account.type).join(
+        Voucher, Voucher.id == VoucherEntry.voucher_id
+    ).join(Account, Account.id == VoucherEntry.account_id).filter(Voucher.user_id == user_id, Voucher.posted == True)
+    for entry, day, code, account_type in rows:
+        if (start is not None and day <= start) or day > end:
+            continue
+        debit = entry.amount if entry.direction == '借方' else ZERO
+        credit = entry.amount if entry.direction == '贷方' else ZERO
+        net = debit - credit if account_type in DEBIT_NORMAL_TYPES else credit - debit
+        total = totals.setdefault(code, [ZERO, ZERO, ZERO])
+        total[0] += debit
+        total[1] += credit
+        total[2] += net
+    return totals
+
+
+def expected_balances(user_id, moment):
+    after = recompute(user_id, moment, datetime.max)
+    return {
+        account.code: account.balance - after.get(account.code, [ZERO] * 3)[2]
+        for account in Account.query.filter_by(user_id=user_id)
+    }
+
+
+def end_of_day(day):
+    return datetime.fromisoformat(day) + timedelta(days=1, microseconds=-1)
+
+
+CUTOFFS = ['2025-01-09', '2025-01-31', '2025-02-10', '2025-02-28', '2025-03-14']
+
+
+@pytest.mark.parametrize('as_of', CUTOFFS)
+def test_balance_sheet_as_of(client, user, books, as_of):
+    report = client.get(f'/api/reports/balance_sheet?as_of={as_of}').get_json()
+    expected = expected_balances(user['id'], end_of_day(as_of))
+    for section in ('assets', 'liabilities', 'equities'):
+        assert {row['code']: row['balance'] for row in report[section]} == {
+            row['code']: float(expected[row['code']]) for row in report[section]
+        }
+    assert (report['total_assets'], report['total_liabilities'], report['total_equities']) == tuple(
+        float(sum((expected[row['code']] for row in report[section]), ZERO)) for section in ('assets', 'liabilities', 'equities')
+    )
+
+
+@pytest.mark.parametrize('as_of', CUTOFFS)
+def test_income_statement_and_cash_as_of(client, user, books, as_of):
+    expected = expected_balances(user['id'], end_of_day(as_of))
+    report = client.get(f'/api/reports/income_statement?to={as_of}').get_json()
+    rows = {row['code']: row['balance'] for row in report['incomes'] + report['expenses']}
+    assert rows == {code: float(expected[code]) for code in rows}
+    assert report['profit'] == float(expected['6001'] + expected['6051'] - expected['6602'])
+
+    cash = client.get(f'/api/reports/cash_flow?to={as_of}').get_json()
+    assert {row['code']: row['balance'] for row in cash['cash_accounts']} == {code: float(expected[code]) for code in ('1001', '1002')}
+
+
+@pytest.mark.parametrize('date_from, date_to', [
+    ('2025-02-01', '2025-02-28'),
+    ('2025-01-15', '2025-02-10'),
+    ('2025-02-06', '2025-03-20'),
+    ('2025-01-31', '2025-01-31'),
+])
+def test_range_reports_match_entries(client, user, books, date_from, date_to):
+    start = datetime.fromisoformat(date_from) - timedelta(microseconds=1)
+    totals = recompute(user['id'], start, end_of_day(date_to))
+    opening = expected_balances(user['id'], start)
+
+    report = client.get(f'/api/reports/income_statement?from={date_from}&to={date_to}').get_json()
+    rows = {row['code']: row['balance'] for row in report['incomes'] + report['expenses']}
+    assert rows == {code: float(totals.get(code, [ZERO] * 3)[2]) for code in rows}
+
+    cash = client.get(f'/api/reports/cash_flow?from={date_from}&to={date_to}').get_json()
+    for row in cash['cash_accounts']:
+        debit, credit, net = totals.get(row['code'], [ZERO] * 3)
+        assert (row['opening_balance'], row['inflow'], row['outflow'], row['balance']) == (
+            float(opening[row['code']]), float(debit), float(credit), float(opening[row['code']] + net)
+        )
+
+
+def test_month_end_cutoff_reads_snapshots_only(client, user, books, count_queries):
+    with count_queries() as statements:
+        client.get('/api/reports/balance_sheet?as_of=2025-02-28')
+    assert not any('voucher_entries' in statement for statement in statements)
+    # 月中时点只扫描该月剩余分录
+    with count_queries() as statements:
+        client.get('/api/reports/balance_sheet?as_of=2025-02-10')
+    assert any('voucher_entries' in statement for statement in statements)
+    assert client.get('/api/reports/balance_sheet?as_of=2025-02-30').status_code == 400
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from models import db
+from sequences import next_number, next_numbers
+
+DAY = datetime(2025, 7, 1, 9, 30)
+
+
+def test_numbers_increase_without_gaps(app, user):
+    user_id = user['id']
+    numbers = [next_number(user_id, 'voucher', DAY) for _ in range(3)]
+    numbers += next_numbers(user_id, 'voucher', 4, DAY)
+    numbers.append(next_number(user_id, 'voucher', DAY))
+    db.session.commit()
+    assert numbers == [f'20250701-{user_id}-{seq:04d}' for seq in range(1, 9)]
+    assert next_numbers(user_id, 'voucher', 0, DAY) == []
+
+    # 每种单据、每天、每个用户独立计数
+    assert next_number(user_id, 'purchase_order', DAY) == f'20250701-{user_id}-0001'
+    assert next_number(user_id, 'voucher', datetime(2025, 7, 2)) == f'20250702-{user_id}-0001'
+    assert next_number(user_id + 1, 'voucher', DAY) == f'20250701-{user_id + 1}-0001'
+
+
+def test_number_formats_and_rollback(app, user):
+    user_id = user['id']
+    assert next_numbers(user_id, 'payment', 2, DAY) == [f'PAY-20250701-{user_id}-0001', f'PAY-20250701-{user_id}-0002']
+    assert next_number(user_id, 'bill', DAY) == f'B20250701-{user_id}-0001'
+    db.session.commit()
+
+    # 回滚的事务不占用序号
+    next_number(user_id, 'payment', DAY)
+    db.session.rollback()
+    assert next_number(user_id, 'payment', DAY) == f'PAY-20250701-{user_id}-0003'
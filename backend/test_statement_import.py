@@ -0,0 +1,104 @@
+import io
+from datetime import date
+
+from models import db, Account, BankStatement, BankStatementItem
+
+
+MT940 = '''{1:F01BANKCNBJAXXX0000000000}{2:I940BANKCNBJXXXXN}{4:
+:20:STMT-2025-03
+:25:6222000012345678
+:28C:1/1
+:60F:C250301CNY1000,00
+:61:2503050305C500,00NTRFNONREF//B1
+:86:货款 客户A
+:61:2503060306D120,50NMSCNONREF//B2
+:86:手续费
+ 及邮电费
+:62F:C250331CNY1379,50
+-}
+'''
+
+CAMT = '''<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+  <BkToCstmrStmt>
+    <Stmt>
+      <Bal><Tp><CdOrPrtry><Cd>OPBD</Cd></CdOrPrtry></Tp><Amt Ccy="CNY">200.00</Amt><CdtDbtInd>CRDT</CdtDbtInd></Bal>
+      <Bal><Tp><CdOrPrtry><Cd>CLBD</Cd></CdOrPrtry></Tp><Amt Ccy="CNY">250.00</Amt><CdtDbtInd>CRDT</CdtDbtInd></Bal>
+      <Ntry>
+        <Amt Ccy="CNY">80.00</Amt><CdtDbtInd>CRDT</CdtDbtInd>
+        <BookgDt><Dt>2025-03-10</Dt></BookgDt>
+        <NtryDtls><TxDtls><RmtInf><Ustrd>客户B回款</Ustrd></RmtInf></TxDtls></NtryDtls>
+      </Ntry>
+      <Ntry>
+        <Amt Ccy="CNY">30.00</Amt><CdtDbtInd>DBIT</CdtDbtInd>
+        <BookgDt><Dt>2025-03-11</Dt></BookgDt>
+        <AddtlNtryInf>房租</AddtlNtryInf>
+      </Ntry>
+    </Stmt>
+  </BkToCstmrStmt>
+</Document>
+'''
+
+
+def make_statement(user_id):
+    bank = Account.query.filter_by(user_id=user_id, code='1002').one()
+    statement = BankStatement(account_id=bank.id, statement_date=date(2025, 3, 31), opening_balance=50.0, user_id=user_id)
+    db.session.add(statement)
+    db.session.commit()
+    return statement.id
+
+
+def items_of(statement_id):
+    return BankStatementItem.query.filter_by(bank_statement_id=statement_id).order_by(BankStatementItem.id).all()
+
+
+def test_import_csv_dedupes_lines(client, user):
+    statement_id = make_statement(user['id'])
+    body = '交易日期,摘要,金额\n2025-03-01,收款,100\n2025-03-02,付款,-40.5\nbad,行,1\n'.encode('utf-8')
+    result = client.post(f'/api/bank-statements/{statement_id}/import', data=body, content_type='text/csv').get_json()
+    assert (result['inserted_count'], result['duplicate_count'], result['error_count']) == (2, 0, 1)
+    assert result['errors'][0]['line'] == 4
+    assert [item.balance for item in items_of(statement_id)] == [150.0, 109.5]
+
+    result = client.post(f'/api/bank-statements/{statement_id}/import', data=body, content_type='text/csv').get_json()
+    assert (result['inserted_count'], result['duplicate_count']) == (0, 2)
+    assert db.session.get(BankStatement, statement_id).item_count == 2
+
+
+def test_import_csv_rejects_blank_amount(client, user):
+    statement_id = make_statement(user['id'])
+    body = '交易日期,摘要,金额,余额\n2025-03-01,收款,100, \n2025-03-02,空金额,,\n2025-03-03,空白金额,  ,\n'.encode('utf-8')
+    result = client.post(f'/api/bank-statements/{statement_id}/import', data=body, content_type='text/csv').get_json()
+    assert (result['inserted_count'], result['error_count']) == (1, 2)
+    assert [(error['line'], error['message']) for error in result['errors']] == [(3, '金额为空'), (4, '金额为空')]
+    assert [item.amount for item in items_of(statement_id)] == [100]
+
+
+def test_import_mt940(client, user):
+    statement_id = make_statement(user['id'])
+    data = {'file': (io.BytesIO(MT940.encode('utf-8')), 'march.sta')}
+    result = client.post(f'/api/bank-statements/{statement_id}/import', data=data, content_type='multipart/form-data').get_json()
+    assert result['inserted_count'] == 2
+    assert (result['file_opening_balance'], result['file_closing_balance']) == (1000.0, 1379.5)
+    items = items_of(statement_id)
+    assert [(item.transaction_date, item.amount, item.balance) for item in items] == [
+        (date(2025, 3, 5), 500.0, 1500.0),
+        (date(2025, 3, 6), -120.5, 1379.5),
+    ]
+    assert [item.description for item in items] == ['货款 客户A', '手续费 及邮电费']
+
+
+def test_import_camt053(client, user):
+    statement_id = make_statement(user['id'])
+    response = client.post(f'/api/bank-statements/{statement_id}/import?format=camt053', data=CAMT.encode('utf-8'), content_type='application/xml')
+    result = response.get_json()
+    assert result['inserted_count'] == 2
+    items = items_of(statement_id)
+    assert [(item.description, item.amount, item.balance) for item in items] == [('客户B回款', 80.0, 280.0), ('房租', -30.0, 250.0)]
+
+
+def test_import_rejects_malformed_xml(client, user):
+    statement_id = make_statement(user['id'])
+    response = client.post(f'/api/bank-statements/{statement_id}/import?format=camt053', data=b'<Document>', content_type='application/xml')
+    assert response.status_code == 400
+    assert items_of(statement_id) == []
@@ -0,0 +1,71 @@
+from models import Account
+from cache import tax_cache
+
+
+def post_voucher(client, day, debit, credit, amount, post=True):
+    voucher_id = client.post('/api/vouchers', json={
+        'date': day,
+        'description': '测试',
+        'entries': [
+            {'account_id': debit, 'direction': '借方', 'amount': amount},
+            {'account_id': credit, 'direction': '贷方', 'amount': amount},
+        ]
+    }).get_json()['id']
+    if post:
+        client.post(f'/api/vouchers/{voucher_id}/post')
+    return voucher_id
+
+
+def calculate(client, tax_type, period='2025-03', **extra):
+    response = client.post('/api/tax-declarations/calculate', json=dict(period=period, tax_type=tax_type, **extra))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_tax_from_posted_entries(client, user):
+    accounts = {account.code: account.id for account in Account.query.filter_by(user_id=user['id'])}
+    post_voucher(client, '2025-03-02', accounts['1403'], accounts['2202'], 1000)
+    post_voucher(client, '2025-03-05', accounts['1122'], accounts['6001'], 5000)
+    post_voucher(client, '2025-03-20', accounts['6602'], accounts['2211'], 2000)
+    draft = post_voucher(client, '2025-03-21', accounts['1122'], accounts['6051'], 800, post=False)
+    post_voucher(client, '2025-04-01', accounts['1122'], accounts['6001'], 9000)
+
+    vat = calculate(client, '增值税')
+    assert (vat['taxable_income'], vat['output_tax'], vat['input_tax'], vat['tax_payable'], vat['tax_rate']) == (5000, 650, 130, 520, 13)
+    assert calculate(client, '附加税')['tax_payable'] == 62.4
+    income_tax = calculate(client, '企业所得税')
+    assert (income_tax['taxable_income'], income_tax['taxable_amount'], income_tax['tax_payable']) == (5000, 3000, 750)
+    assert calculate(client, '个人所得税', tax_rate=10)['tax_payable'] == 200
+    assert calculate(client, '增值税', period='2025-02')['tax_payable'] == 0
+
+    # 结转损益凭证不影响所得税计算
+    assert client.post('/api/periods/2025-03/close').get_json()['message'] == '本期还有 1 张凭证未过账'
+    client.delete(f'/api/vouchers/{draft}')
+    assert client.post('/api/periods/2025-03/close').status_code == 200
+    assert calculate(client, '企业所得税')['taxable_amount'] == 3000
+    assert calculate(client, '增值税')['tax_payable'] == 520
+
+    assert client.post('/api/tax-declarations/calculate', json={'period': '2025-3', 'tax_type': '增值税'}).status_code == 400
+    assert client.post('/api/tax-declarations/calculate', json={'period': '2025-03', 'tax_type': '印花税'}).status_code == 400
+
+
+def test_period_aggregates_cached_until_period_changes(client, user, count_queries):
+    accounts = {account.code: account.id for account in Account.query.filter_by(user_id=user['id'])}
+    post_voucher(client, '2025-03-05', accounts['1122'], accounts['6001'], 1000)
+    assert calculate(client, '增值税')['output_tax'] == 130
+    calculate(client, '增值税', period='2025-04')
+
+    with count_queries() as statements:
+        assert calculate(client, '企业所得税')['taxable_income'] == 1000
+    assert not any('account_period_balances' in statement for statement in statements)
+
+    # 其他期间过账只失效该期间
+    post_voucher(client, '2025-04-10', accounts['1122'], accounts['6001'], 500)
+    assert tax_cache.get((user['id'], '2025-03')) is not None
+    assert tax_cache.get((user['id'], '2025-04')) is None
+
+    draft = post_voucher(client, '2025-03-06', accounts['1122'], accounts['6001'], 200, post=False)
+    client.post(f'/api/vouchers/{draft}/post')
+    assert calculate(client, '增值税')['taxable_income'] == 1200
+    client.post(f'/api/vouchers/{draft}/unpost')
+    assert calculate(client, '增值税')['taxable_income'] == 1000
@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+from models import db, Account, Voucher
+
+
+def test_trial_balance_with_rollups(client, user):
+    accounts = {account.code: account for account in Account.query.filter_by(user_id=user['id'])}
+    accounts['4001'].balance = Decimal('0.00')
+    db.session.commit()
+    child = client.post('/api/accounts', json={'code': '100201', 'name': '工商银行', 'type': '资产', 'parent_id': accounts['1002'].id}).get_json()['id']
+
+    def voucher(day, debit, credit, amount):
+        return client.post('/api/vouchers', json={
+            'date': day,
+            'description': '测试',
+            'entries': [
+                {'account_id': debit, 'direction': '借方', 'amount': amount},
+                {'account_id': credit, 'direction': '贷方', 'amount': amount},
+            ]
+        }).get_json()['id']
+
+    posted = [
+        voucher('2025-01-10', child, accounts['4001'].id, 100),
+        voucher('2025-02-05', child, accounts['6001'].id, 30),
+        voucher('2025-03-01', accounts['6602'].id, child, 10),
+    ]
+    voucher('2025-02-06', child, accounts['6001'].id, 999)
+    client.post('/api/vouchers/post-batch', json={'voucher_ids': posted})
+    assert Voucher.query.filter_by(posted=True).count() == 3
+
+    report = client.get('/api/reports/trial-balance?from=2025-02-01&to=2025-02-28').get_json()
+    rows = {row['code']: row for row in report['accounts']}
+    assert (rows['1002']['opening_balance'], rows['1002']['debit_total'], rows['1002']['closing_balance']) == (100, 30, 130)
+    assert rows['1002']['has_children'] and rows['100201']['level'] == 1
+    assert rows['100201']['closing_debit'] == 130
+    assert (rows['6001']['closing_debit'], rows['6001']['closing_credit']) == (0, 30)
+    assert rows['6602']['debit_total'] == 0
+    assert report['totals']['debit_total'] == report['totals']['credit_total'] == 30
+    assert report['totals']['closing_debit'] == 130
+    assert report['balanced']
+
+    top = client.get('/api/reports/trial-balance?from=2025-02-01&to=2025-03-31&level=0').get_json()
+    assert '100201' not in {row['code'] for row in top['accounts']}
+    assert top['totals']['closing_debit'] == top['totals']['closing_credit'] == 130
+
+    assert client.get('/api/reports/trial-balance?from=2025-03-01&to=2025-02-01').status_code == 400
+    assert client.get('/api/reports/trial-balance?level=x').status_code == 400
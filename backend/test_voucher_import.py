@@ -0,0 +1,75 @@
+import io
+import json
+
+from models import Account, Voucher, VoucherEntry
+import voucher_import
+
+
+CSV_HEADER = 'voucher_ref,date,description,account_code,direction,amount,entry_description\n'
+
+
+def test_import_csv(client, user):
+    body = CSV_HEADER + (
+        'A,2025-01-05,收款,1002,借方,100,\n'
+        'A,2025-01-05,收款,6001,贷方,100,销售\n'
+        'B,2025-01-06,不平衡,1002,借方,50,\n'
+        'B,2025-01-06,不平衡,6001,贷方,40,\n'
+        'C,2025-01-07,未知科目,9999,借方,10,\n'
+        'C,2025-01-07,未知科目,6001,贷方,10,\n'
+        'D,2025-01-08,付款,6602,借方,30.5,\n'
+        'D,2025-01-08,付款,1002,贷方,30.5,\n'
+    )
+    response = client.post('/api/vouchers/import?post=true', data=body.encode('utf-8'), content_type='text/csv')
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['imported_count'] == 2
+    assert [(error['line'], error['voucher_ref']) for error in result['errors']] == [(4, 'B'), (6, 'C')]
+
+    vouchers = Voucher.query.filter_by(user_id=user['id']).order_by(Voucher.id).all()
+    assert [voucher.description for voucher in vouchers] == ['收款', '付款']
+    assert all(voucher.posted for voucher in vouchers)
+    assert len({voucher.voucher_no for voucher in vouchers}) == 2
+    assert VoucherEntry.query.count() == 4
+    bank = Account.query.filter_by(user_id=user['id'], code='1002').one()
+    assert bank.balance == 69.5
+
+
+def test_import_jsonl_in_batches(client, user, monkeypatch):
+    monkeypatch.setattr(voucher_import, 'IMPORT_BATCH_SIZE', 2)
+    lines = [json.dumps({
+        'voucher_ref': str(i),
+        'date': f'2025-02-{i + 1:02d}',
+        'description': f'凭证{i}',
+        'entries': [
+            {'account_code': '1002', 'direction': '借方', 'amount': 10},
+            {'account_code': '6001', 'direction': '贷方', 'amount': 10},
+        ]
+    }, ensure_ascii=False) for i in range(5)]
+    lines.insert(2, '{broken')
+    data = {'file': (io.BytesIO('\n'.join(lines).encode('utf-8')), 'vouchers.jsonl')}
+    response = client.post('/api/vouchers/import', data=data, content_type='multipart/form-data')
+    result = response.get_json()
+    assert result['imported_count'] == 5
+    assert result['batch_count'] == 3
+    assert result['errors'] == [{'line': 3, 'voucher_ref': None, 'message': 'JSON格式错误'}]
+    assert Voucher.query.filter_by(user_id=user['id'], posted=False).count() == 5
+
+
+def test_import_rejects_unknown_format(client, user):
+    response = client.post('/api/vouchers/import', data=b'x', content_type='application/octet-stream')
+    assert response.status_code == 400
+
+
+def test_import_rejects_closed_period(client, user):
+    assert client.post('/api/periods/2025-01/close').status_code == 200
+    body = CSV_HEADER + (
+        'A,2025-01-20,补录,1002,借方,100,\n'
+        'A,2025-01-20,补录,6001,贷方,100,\n'
+        'B,2025-02-03,收款,1002,借方,20,\n'
+        'B,2025-02-03,收款,6001,贷方,20,\n'
+    )
+    response = client.post('/api/vouchers/import', data=body.encode('utf-8'), content_type='text/csv')
+    result = response.get_json()
+    assert result['imported_count'] == 1
+    assert result['errors'] == [{'line': 2, 'voucher_ref': 'A', 'message': '会计期间 2025-01 已结账，不能导入'}]
+    assert [voucher.description for voucher in Voucher.query.filter_by(user_id=user['id'])] == ['收款']
@@ -0,0 +1,81 @@
+from models import Account
+
+
+def create_voucher(client, day, debit, credit, amount=10, post=False):
+    voucher_id = client.post('/api/vouchers', json={
+        'date': day,
+        'description': f'凭证{day}',
+        'entries': [
+            {'account_id': debit, 'direction': '借方', 'amount': amount},
+            {'account_id': credit, 'direction': '贷方', 'amount': amount},
+        ]
+    }).get_json()['id']
+    if post:
+        client.post(f'/api/vouchers/{voucher_id}/post')
+    return voucher_id
+
+
+def seed(client, user):
+    accounts = {account.code: account.id for account in Account.query.filter_by(user_id=user['id'])}
+    days = ['2025-03-01', '2025-03-02', '2025-03-02', '2025-03-02', '2025-03-02', '2025-03-03', '2025-03-03', '2025-03-05']
+    vouchers = []
+    for i, day in enumerate(days):
+        credit = accounts['6001'] if i % 3 else accounts['2202']
+        vouchers.append((day, create_voucher(client, day, accounts['1002'], credit, post=i % 2 == 0)))
+    return accounts, vouchers
+
+
+def walk(client, query=''):
+    ids, cursor, pages = [], None, 0
+    while True:
+        url = f'/api/vouchers?limit=3{query}' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        ids.extend(item['id'] for item in page['items'])
+        pages += 1
+        if not page['has_more']:
+            assert page['next_cursor'] is None
+            return ids, pages
+        cursor = page['next_cursor']
+
+
+def test_keyset_pages_cover_all_vouchers_once(client, user):
+    _, vouchers = seed(client, user)
+    ids, pages = walk(client)
+    # 同一天的多张凭证按ID倒序，跨页不重复、不遗漏
+    assert ids == [voucher_id for _, voucher_id in sorted(vouchers, reverse=True)]
+    assert pages == 3
+
+    page = client.get('/api/vouchers?limit=2&include=entries').get_json()
+    assert [len(item['entries']) for item in page['items']] == [2, 2]
+    assert page['items'][0]['total_amount'] == 10 and page['items'][0]['entry_count'] == 2
+
+
+def test_voucher_filters(client, user):
+    accounts, vouchers = seed(client, user)
+    by_id = dict((voucher_id, day) for day, voucher_id in vouchers)
+    posted = [voucher_id for i, (_, voucher_id) in enumerate(vouchers) if i % 2 == 0]
+
+    # 仅传日期的 date_to 包含当天全部凭证
+    ids, _ = walk(client, '&date_from=2025-03-02&date_to=2025-03-03')
+    assert sorted(ids) == sorted(voucher_id for voucher_id, day in by_id.items() if '2025-03-02' <= day <= '2025-03-03')
+    ids, _ = walk(client, '&date_to=2025-03-02T00:00:00')
+    assert sorted(ids) == sorted(voucher_id for voucher_id, day in by_id.items() if day <= '2025-03-02')
+
+    ids, _ = walk(client, '&posted=true')
+    assert sorted(ids) == sorted(posted)
+    ids, _ = walk(client, '&posted=false')
+    assert sorted(ids) == sorted(set(by_id) - set(posted))
+    ids, _ = walk(client, '&status=已审核')
+    assert sorted(ids) == sorted(posted)
+
+    ids, _ = walk(client, f"&account_id={accounts['2202']}")
+    assert sorted(ids) == sorted(voucher_id for i, (_, voucher_id) in enumerate(vouchers) if i % 3 == 0)
+    ids, _ = walk(client, f"&account_id={accounts['2202']}&posted=true")
+    assert sorted(ids) == sorted(voucher_id for i, (_, voucher_id) in enumerate(vouchers) if i % 6 == 0)
+
+
+def test_invalid_paging_parameters(client, user):
+    seed(client, user)
+    assert client.get('/api/vouchers?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/vouchers?limit=abc').status_code == 400
+    assert client.get('/api/vouchers?date_from=2025-13-01').status_code == 400
@@ -0,0 +1,224 @@
+import io
+import csv
+import json
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, Account, Voucher, VoucherEntry
+from sequences import next_numbers
+from posting import post_vouchers
+from ledger import period_key, latest_closed_period, ensure_periods_open
+from cache import mark_ledger_changed
+from money import ZERO, to_money
+
+# 凭证批量导入：流式解析 CSV / JSON Lines，逐张凭证校验，按批次批量写入并分批提交
+# CSV 每行一条分录，相邻且 voucher_ref 相同的行属于同一张凭证：
+#   voucher_ref,date,description,account_code,direction,amount,entry_description
+# JSON Lines 每行一张凭证：
+#   {"voucher_ref": "...", "date": "2025-01-31", "description": "...", "entries": [{"account_code": "1002", "direction": "借方", "amount": 100}]}
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_ERROR_LIMIT = 1000
+IMPORT_FORMATS = ('csv', 'jsonl')
+DIRECTIONS = ('借方', '贷方')
+
+class ImportRowError(ValueError):
+    pass
+
+def _text_stream(stream):
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+# 逐行读取CSV，按 voucher_ref 将相邻分录组装为凭证，产出 (起始行号, 凭证数据)
+def read_csv_vouchers(stream):
+    reader = csv.DictReader(_text_stream(stream))
+    current, start_line = None, None
+    for row in reader:
+        ref = (row.get('voucher_ref') or '').strip()
+        if current is None or not ref or ref != current['voucher_ref']:
+            if current is not None:
+                yield start_line, current
+            current = {
+                'voucher_ref': ref,
+                'date': row.get('date'),
+                'description': row.get('description'),
+                'status': row.get('status') or None,
+                'entries': []
+            }
+            start_line = reader.line_num
+        current['entries'].append({
+            'account_code': row.get('account_code'),
+            'direction': row.get('direction'),
+            'amount': row.get('amount'),
+            'description': row.get('entry_description') or None
+        })
+    if current is not None:
+        yield start_line, current
+
+def read_jsonl_vouchers(stream):
+    for line_no, line in enumerate(_text_stream(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield line_no, ImportRowError('JSON格式错误')
+            continue
+        if not isinstance(data, dict):
+            yield line_no, ImportRowError('每行应为一个凭证对象')
+            continue
+        yield line_no, data
+
+READERS = {
+    'csv': read_csv_vouchers,
+    'jsonl': read_jsonl_vouchers,
+}
+
+def detect_format(filename, content_type):
+    name = (filename or '').lower()
+    if name.endswith('.csv') or content_type == 'text/csv':
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')) or content_type in ('application/x-ndjson', 'application/jsonl'):
+        return 'jsonl'
+    return None
+
+def _parse_amount(value):
+    try:
+        amount = to_money(str(value).strip())
+    except (TypeError, ArithmeticError):
+        raise ImportRowError(f'金额无效: {value}')
+    if amount <= 0:
+        raise ImportRowError(f'金额必须大于0: {value}')
+    return amount
+
+# 校验单张凭证并将科目编码解析为科目ID；closed_through 为最近一个已结账期间，该期间及之前的凭证不能导入
+def validate_voucher(data, account_ids, closed_through=None):
+    try:
+        date = datetime.fromisoformat(str(data.get('date') or '').strip())
+    except ValueError:
+        raise ImportRowError(f"日期无效: {data.get('date')}")
+    if closed_through is not None and period_key(date) <= closed_through:
+        raise ImportRowError(f'会计期间 {period_key(date)} 已结账，不能导入')
+    description = (data.get('description') or '').strip()
+    if not description:
+        raise ImportRowError('摘要不能为空')
+    entries = data.get('entries') or []
+    if len(entries) < 2:
+        raise ImportRowError('凭证至少需要两条分录')
+
+    rows = []
+    debit_total = credit_total = ZERO
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ImportRowError('分录格式错误')
+        code = str(entry.get('account_code') or '').strip()
+        account_id = account_ids.get(code)
+        if account_id is None:
+            raise ImportRowError(f'科目编码不存在: {code}')
+        direction = (entry.get('direction') or '').strip()
+        if direction not in DIRECTIONS:
+            raise ImportRowError(f'借贷方向无效: {direction}')
+        amount = _parse_amount(entry.get('amount'))
+        if direction == '借方':
+            debit_total += amount
+        else:
+            credit_total += amount
+        rows.append({
+            'account_id': account_id,
+            'direction': direction,
+            'amount': amount,
+            'description': entry.get('description')
+        })
+
+    if debit_total != credit_total:
+        raise ImportRowError('借贷不平衡，借方合计: {}, 贷方合计: {}'.format(debit_total, credit_total))
+
+    return {
+        'date': date,
+        'description': description,
+        'status': data.get('status') or '未审核',
+        'entries': rows
+    }
+
+# 批量写入一批已校验的凭证，返回新凭证ID列表；由调用方提交
+def insert_vouchers(user_id, vouchers, post=False):
+    ensure_periods_open(user_id, {period_key(voucher['date']) for voucher in vouchers})
+    now = datetime.utcnow()
+    numbers = next_numbers(user_id, 'voucher', len(vouchers))
+    voucher_rows = [{
+        'voucher_no': number,
+        'date': voucher['date'],
+        'description': voucher['description'],
+        'status': voucher['status'],
+        'posted': False,
+        'user_id': user_id,
+        'created_at': now,
+        'updated_at': now
+    } for number, voucher in zip(numbers, vouchers)]
+    voucher_ids = db.session.execute(
+        insert(Voucher).returning(Voucher.id, sort_by_parameter_order=True),
+        voucher_rows
+    ).scalars().all()
+
+    entry_rows = [
+        dict(entry, voucher_id=voucher_id)
+        for voucher_id, voucher in zip(voucher_ids, vouchers)
+        for entry in voucher['entries']
+    ]
+    db.session.execute(insert(VoucherEntry), entry_rows)
+
+    if post:
+        post_vouchers(user_id, voucher_ids)
+    mark_ledger_changed(user_id)
+    return voucher_ids
+
+# 导入入口：单张凭证的校验错误只记录不中断，每批单独提交，某批写入失败只回滚该批
+# progress(已处理凭证数, None) 在每批写入前调用，与该批一同提交
+def import_vouchers(user_id, stream, file_format, post=False, batch_size=None, progress=None):
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    account_ids = {
+        code: account_id
+        for account_id, code in db.session.query(Account.id, Account.code).filter(Account.user_id == user_id)
+    }
+    closed_through = latest_closed_period(user_id)
+    result = {
+        'imported_count': 0,
+        'error_count': 0,
+        'errors': [],
+        'batch_count': 0
+    }
+
+    def add_error(line, ref, message):
+        result['error_count'] += 1
+        if len(result['errors']) < IMPORT_ERROR_LIMIT:
+            result['errors'].append({'line': line, 'voucher_ref': ref, 'message': message})
+
+    batch = []
+
+    def flush_batch():
+        if progress:
+            progress(result['imported_count'] + result['error_count'], None)
+        try:
+            insert_vouchers(user_id, [voucher for _, _, voucher in batch], post)
+            db.session.commit()
+            result['imported_count'] += len(batch)
+        except Exception as e:
+            db.session.rollback()
+            for line, ref, _ in batch:
+                add_error(line, ref, f'写入失败: {e}')
+        result['batch_count'] += 1
+        batch.clear()
+
+    for line, data in READERS[file_format](stream):
+        if isinstance(data, ImportRowError):
+            add_error(line, None, str(data))
+            continue
+        ref = data.get('voucher_ref')
+        try:
+            batch.append((line, ref, validate_voucher(data, account_ids, closed_through)))
+        except ImportRowError as e:
+            add_error(line, ref, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush_batch()
+    if batch:
+        flush_batch()
+    return result
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import socket
+import signal
+import logging
+import argparse
+import multiprocessing
+
+# 后台任务工作进程：轮询 jobs 表领取任务并执行，无需外部消息队列
+#   python worker.py               启动一个工作进程
+#   python worker.py -n 4          启动四个工作进程
+#   python worker.py --once        执行完当前排队的任务后退出
+
+logger = logging.getLogger('worker')
+
+def work(index, once=False):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+    from jobs import run_next_job, fail_stale_jobs
+
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    stopping = []
+    # 收到终止信号时执行完当前任务再退出
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+
+    with app.app_context():
+        if index == 0:
+            failed = fail_stale_jobs(app.config['JOB_STALE_TIMEOUT'])
+            if failed:
+                logger.warning('%s 个中断的任务已标记为失败', failed)
+        logger.info('工作进程 %s 已启动', worker_id)
+        while not stopping:
+            job_id = run_next_job(worker_id)
+            if job_id is not None:
+                logger.info('任务 %s 执行结束', job_id)
+                continue
+            if once:
+                break
+            time.sleep(app.config['JOB_POLL_INTERVAL'])
+        logger.info('工作进程 %s 已退出', worker_id)
+
+def main():
+    parser = argparse.ArgumentParser(description='后台任务工作进程')
+    parser.add_argument('-n', '--processes', type=int, default=1, help='工作进程数量')
+    parser.add_argument('--once', action='store_true', help='执行完排队中的任务后退出')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.processes <= 1:
+        work(0, args.once)
+        return
+    processes = [multiprocessing.Process(target=work, args=(index, args.once)) for index in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# WSGI 入口，供 gunicorn / waitress 等服务器加载：gunicorn wsgi:application
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+
+application = app
@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react'
 import { Table, Card, Spin, message, Button, Modal, Form, Input, Select } from 'antd'
 import { AccountBookOutlined, PlusOutlined, DeleteOutlined, EditOutlined } from '@ant-design/icons'
-import { getAccounts, createAccount, updateAccount, deleteAccount } from '../services/api'
+import { getAccountTree, createAccount, updateAccount, deleteAccount } from '../services/api'
 
 const Accounts = () => {
   const [accounts, setAccounts] = useState([])
@@ -11,11 +11,18 @@ const Accounts = () => {
   const [isEditMode, setIsEditMode] = useState(false)
   const [currentAccount, setCurrentAccount] = useState(null)
 
+  // 科目树由后端一次查询返回，父科目的 total_balance 为含全部下级科目的汇总余额
+  const [accountTree, setAccountTree] = useState([])
+
+  // 展开科目树，供上级科目选择使用
+  const flattenTree = (nodes) => nodes.reduce((list, node) => list.concat([node], flattenTree(node.children || [])), [])
+
   const fetchAccounts = async () => {
     try {
       setLoading(true)
-      const data = await getAccounts()
-      setAccounts(data)
+      const data = await getAccountTree()
+      setAccountTree(data)
+      setAccounts(flattenTree(data))
     } catch (error) {
       message.error('获取科目列表失败')
     } finally {
@@ -26,56 +33,6 @@ const Accounts = () => {
   useEffect(() => {
     fetchAccounts()
   }, [])
-
-  // 递归计算父科目余额
-  const calculateParentBalance = (accounts) => {
-    const accountMap = {};
-    const rootAccounts = [];
-    
-    // 首先创建所有账户的映射
-    accounts.forEach(account => {
-      accountMap[account.id] = { ...account, children: [] };
-    });
-    
-    // 构建层级结构
-    accounts.forEach(account => {
-      if (account.parent_id) {
-        if (accountMap[account.parent_id]) {
-          accountMap[account.parent_id].children.push(accountMap[account.id]);
-        }
-      } else {
-        rootAccounts.push(accountMap[account.id]);
-      }
-    });
-    
-    // 递归计算父科目余额
-    const computeBalance = (account) => {
-      // 计算所有子科目的余额总和
-      const childrenBalance = account.children.reduce((sum, child) => {
-        return sum + computeBalance(child);
-      }, 0);
-      
-      // 父科目余额 = 自身余额 + 所有子科目余额
-      account.totalBalance = account.balance + childrenBalance;
-      return account.totalBalance;
-    };
-    
-    // 计算每个根科目的余额
-    rootAccounts.forEach(account => {
-      computeBalance(account);
-    });
-    
-    return rootAccounts;
-  };
-  
-  const [processedAccounts, setProcessedAccounts] = useState([]);
-  
-  useEffect(() => {
-    if (accounts.length > 0) {
-      const rootAccounts = calculateParentBalance(accounts);
-      setProcessedAccounts(rootAccounts);
-    }
-  }, [accounts]);
   
   // 账户类型选项
   const accountTypes = [
@@ -178,14 +135,14 @@ const Accounts = () => {
       dataIndex: 'balance',
       key: 'balance',
       render: (balance, record) => {
-        // 父科目显示计算后的总余额，子科目显示自身余额
-        const displayBalance = record.totalBalance !== undefined ? record.totalBalance : balance;
+        // 父科目显示含下级科目的汇总余额
+        const displayBalance = record.total_balance !== undefined ? record.total_balance : balance;
         const balanceClass = displayBalance >= 0 ? 'positive-balance' : 'negative-balance';
         return <span className={balanceClass}>{displayBalance.toFixed(2)} 元</span>;
       },
       sorter: (a, b) => {
-        const balanceA = a.totalBalance !== undefined ? a.totalBalance : a.balance;
-        const balanceB = b.totalBalance !== undefined ? b.totalBalance : b.balance;
+        const balanceA = a.total_balance !== undefined ? a.total_balance : a.balance;
+        const balanceB = b.total_balance !== undefined ? b.total_balance : b.balance;
         return balanceA - balanceB;
       }
     },
@@ -221,7 +178,7 @@ const Accounts = () => {
         </div>
         <Spin spinning={loading}>
           <Table
-              dataSource={processedAccounts}
+              dataSource={accountTree}
               columns={columns}
               rowKey="id"
               pagination={{ pageSize: 20 }}
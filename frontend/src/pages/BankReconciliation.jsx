@@ -204,10 +204,14 @@ const BankReconciliation = () => {
   };
 
   // 获取待对账的凭证分录
-  const fetchUnreconciledEntries = async () => {
+  const fetchUnreconciledEntries = async (accountId) => {
     try {
-      const data = await getUnreconciledVoucherEntries();
-      setUnreconciledEntries(data);
+      const params = { limit: 500 };
+      if (accountId) {
+        params.account_id = accountId;
+      }
+      const data = await getUnreconciledVoucherEntries(params);
+      setUnreconciledEntries(data.items);
     } catch (error) {
       message.error('获取待对账凭证分录失败');
     }
@@ -225,7 +229,7 @@ const BankReconciliation = () => {
     setSelectedStatementId(statementId);
     const statement = statements.find(s => s.id === statementId);
     setCurrentStatement(statement);
-    fetchUnreconciledEntries();
+    fetchUnreconciledEntries(statement?.account_id);
   };
 
   // 处理添加银行对账单
@@ -347,7 +351,6 @@ const BankReconciliation = () => {
       message.success('对账成功');
       setIsReconcileModalVisible(false);
       fetchBankStatements();
-      fetchUnreconciledEntries();
       // 刷新当前选中的对账单
       handleSelectStatement(selectedStatementId);
     } catch (error) {
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
-import { Table, Button, Card, Row, Col, Tabs, message } from 'antd';
-import { FileTextOutlined, BarChartOutlined, LineChartOutlined } from '@ant-design/icons';
-import { getBalanceSheet, getIncomeStatement, getCashFlow } from '../services/api';
+import { Table, Button, Card, Row, Col, Tabs, Tag, message } from 'antd';
+import { FileTextOutlined, BarChartOutlined, LineChartOutlined, TableOutlined } from '@ant-design/icons';
+import { getBalanceSheet, getIncomeStatement, getCashFlow, getTrialBalance } from '../services/api';
 
 const { TabPane } = Tabs;
 
@@ -10,6 +10,7 @@ const Reports = () => {
   const [balanceSheetData, setBalanceSheetData] = useState(null);
   const [incomeStatementData, setIncomeStatementData] = useState(null);
   const [cashFlowData, setCashFlowData] = useState(null);
+  const [trialBalanceData, setTrialBalanceData] = useState(null);
 
   // 资产负债表列配置
   const balanceSheetColumns = [
@@ -71,6 +72,30 @@ const Reports = () => {
     }
   ];
 
+  // 试算平衡表列配置
+  const amountColumn = (title, dataIndex) => ({
+    title,
+    dataIndex,
+    key: dataIndex,
+    align: 'right',
+    render: (amount) => (amount ? amount.toFixed(2) : '')
+  });
+  const trialBalanceColumns = [
+    {
+      title: '科目',
+      dataIndex: 'name',
+      key: 'name',
+      render: (name, record) => (
+        <span style={{ paddingLeft: record.level * 16, fontWeight: record.has_children ? 'bold' : 'normal' }}>
+          {record.code} {name}
+        </span>
+      )
+    },
+    { title: '期初余额', children: [amountColumn('借方', 'opening_debit'), amountColumn('贷方', 'opening_credit')] },
+    { title: '本期发生额', children: [amountColumn('借方', 'debit_total'), amountColumn('贷方', 'credit_total')] },
+    { title: '期末余额', children: [amountColumn('借方', 'closing_debit'), amountColumn('贷方', 'closing_credit')] }
+  ];
+
   // 生成资产负债表
   const generateBalanceSheet = async (showMessage = true) => {
     try {
@@ -119,11 +144,28 @@ const Reports = () => {
     }
   };
 
+  // 生成试算平衡表（本年年初至今）
+  const generateTrialBalance = async (showMessage = true) => {
+    try {
+      setLoading(true);
+      const data = await getTrialBalance();
+      setTrialBalanceData(data);
+      if (showMessage) {
+        message.success('试算平衡表生成成功');
+      }
+    } catch (error) {
+      message.error('试算平衡表生成失败');
+    } finally {
+      setLoading(false);
+    }
+  };
+
   // 初始生成所有报表（不显示重复消息）
   useEffect(() => {
     generateBalanceSheet(false);
     generateIncomeStatement(false);
     generateCashFlow(false);
+    generateTrialBalance(false);
   }, []);
 
   return (
@@ -139,9 +181,12 @@ const Reports = () => {
             <Button type="primary" icon={<BarChartOutlined />} onClick={generateIncomeStatement} style={{ marginRight: 8 }} loading={loading}>
               刷新利润表
             </Button>
-            <Button type="primary" icon={<LineChartOutlined />} onClick={generateCashFlow} loading={loading}>
+            <Button type="primary" icon={<LineChartOutlined />} onClick={generateCashFlow} style={{ marginRight: 8 }} loading={loading}>
               刷新现金流量表
             </Button>
+            <Button type="primary" icon={<TableOutlined />} onClick={generateTrialBalance} loading={loading}>
+              刷新试算平衡表
+            </Button>
           </Card>
         </Col>
       </Row>
@@ -296,6 +341,35 @@ const Reports = () => {
             </>
           )}
         </TabPane>
+
+        {/* 试算平衡表 */}
+        <TabPane tab={<span><TableOutlined /> 试算平衡表</span>} key="trialBalance">
+          {trialBalanceData && (
+            <Card
+              title={`试算平衡表（${trialBalanceData.from.slice(0, 10)} 至 ${trialBalanceData.to.slice(0, 10)}）`}
+              extra={trialBalanceData.balanced ? <Tag color="green">平衡</Tag> : <Tag color="red">不平衡</Tag>}
+            >
+              <Table
+                dataSource={trialBalanceData.accounts}
+                columns={trialBalanceColumns}
+                rowKey="id"
+                pagination={false}
+                size="small"
+                bordered
+                summary={() => (
+                  <Table.Summary.Row>
+                    <Table.Summary.Cell index={0}><b>合计</b></Table.Summary.Cell>
+                    {['opening_debit', 'opening_credit', 'debit_total', 'credit_total', 'closing_debit', 'closing_credit'].map((key, index) => (
+                      <Table.Summary.Cell key={key} index={index + 1} align="right">
+                        <b>{trialBalanceData.totals[key].toFixed(2)}</b>
+                      </Table.Summary.Cell>
+                    ))}
+                  </Table.Summary.Row>
+                )}
+              />
+            </Card>
+          )}
+        </TabPane>
       </Tabs>
     </div>
   );
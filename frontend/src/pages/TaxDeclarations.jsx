@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react'
 import { Table, Card, Spin, message, Button, Modal, Form, Input, Select, DatePicker, Space, Divider } from 'antd'
 import { PlusOutlined, EditOutlined, DeleteOutlined, CheckOutlined, CloseOutlined, FileTextOutlined, SendOutlined } from '@ant-design/icons'
-import { getTaxDeclarations, createTaxDeclaration, updateTaxDeclaration, deleteTaxDeclaration, submitTaxDeclaration } from '../services/api'
+import { getTaxDeclarations, createTaxDeclaration, updateTaxDeclaration, deleteTaxDeclaration, submitTaxDeclaration, calculateTax } from '../services/api'
 import dayjs from 'dayjs'
 
 const { Option } = Select
@@ -86,6 +86,30 @@ const TaxDeclarations = () => {
     }
   }
 
+  // 按所属期已过账的账簿数据计算税款，税率为0时使用默认税率
+  const handleCalculate = async () => {
+    try {
+      const values = form.getFieldsValue()
+      if (!values.period || !values.tax_type) {
+        message.warning('请先选择申报所属期和税种')
+        return
+      }
+      const taxRate = parseFloat(values.tax_rate || 0)
+      const result = await calculateTax({
+        period: values.period.format('YYYY-MM'),
+        tax_type: values.tax_type,
+        ...(taxRate > 0 ? { tax_rate: taxRate } : {})
+      })
+      form.setFieldsValue({
+        taxable_income: result.taxable_income,
+        tax_rate: result.tax_rate,
+        tax_payable: result.tax_payable
+      })
+    } catch (error) {
+      message.error('计算税款失败：' + error.message)
+    }
+  }
+
   // 提交表单
   const handleSubmit = async () => {
     try {
@@ -227,6 +251,9 @@ const TaxDeclarations = () => {
             <Button key="back" onClick={handleCancel}>
               取消
             </Button>,
+            <Button key="calculate" onClick={handleCalculate}>
+              按账簿计算
+            </Button>,
             <Button key="submit" type="primary" onClick={handleSubmit}>
               {isEditMode ? '更新' : '保存'}
             </Button>
@@ -88,13 +88,16 @@ const Transactions = () => {
   const [entries, setEntries] = useState([{ account_id: null, direction: '借方', amount: 0, description: '' }, { account_id: null, direction: '贷方', amount: 0, description: '' }])
   const [searchForm] = Form.useForm()
   const [dateRange, setDateRange] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
 
-  const fetchVouchers = async () => {
+  const fetchVouchers = async (cursor) => {
     try {
       setLoading(true)
-      const data = await getVouchers()
-      setVouchers(data)
-      setFilteredVouchers(data)
+      const data = await getVouchers({ include: 'entries', limit: 200, cursor: cursor || undefined })
+      const list = cursor ? [...vouchers, ...data.items] : data.items
+      setVouchers(list)
+      setFilteredVouchers(list)
+      setNextCursor(data.next_cursor)
     } catch (error) {
       message.error('获取凭证列表失败')
     } finally {
@@ -459,6 +462,13 @@ const Transactions = () => {
         loading={loading}
         pagination={{ pageSize: 10 }}
       />
+      {nextCursor && (
+        <div style={{ textAlign: 'center', marginTop: 16 }}>
+          <Button onClick={() => fetchVouchers(nextCursor)} loading={loading}>
+            加载更多
+          </Button>
+        </div>
+      )}
       
       <Modal
         title={editingVoucher ? '编辑凭证' : '新增凭证'}
@@ -50,6 +50,15 @@ export const getAccounts = () => {
   return api.get('/accounts')
 }
 
+export const getAccountTree = () => {
+  return api.get('/accounts/tree')
+}
+
+// 科目明细账，翻页时传入上一页返回的 next_cursor
+export const getAccountLedger = (id, params) => {
+  return api.get(`/accounts/${id}/ledger`, { params })
+}
+
 export const getAccount = (id) => {
   return api.get(`/accounts/${id}`)
 }
@@ -72,8 +81,8 @@ export const getDashboardData = () => {
 }
 
 // 凭证管理
-export const getVouchers = () => {
-  return api.get('/vouchers')
+export const getVouchers = (params) => {
+  return api.get('/vouchers', { params })
 }
 
 export const getVoucher = (id) => {
@@ -102,6 +111,23 @@ export const unpostVoucher = (id) => {
   return api.post(`/vouchers/${id}/unpost`)
 }
 
+// 批量过账
+export const postVouchersBatch = (voucherIds) => {
+  return api.post('/vouchers/post-batch', { voucher_ids: voucherIds })
+}
+
+// 批量取消过账
+export const unpostVouchersBatch = (voucherIds) => {
+  return api.post('/vouchers/unpost-batch', { voucher_ids: voucherIds })
+}
+
+// 批量导入凭证（CSV / JSON Lines 文件）
+export const importVouchers = (file, params) => {
+  const formData = new FormData()
+  formData.append('file', file)
+  return api.post('/vouchers/import', formData, { params, timeout: 0 })
+}
+
 // 供应商管理
 export const getVendors = () => {
   return api.get('/vendors')
@@ -124,16 +150,38 @@ export const deleteVendor = (id) => {
 }
 
 // 财务报表
-export const getBalanceSheet = () => {
-  return api.get('/reports/balance_sheet')
+export const getBalanceSheet = (params) => {
+  return api.get('/reports/balance_sheet', { params })
+}
+
+export const getIncomeStatement = (params) => {
+  return api.get('/reports/income_statement', { params })
+}
+
+export const getCashFlow = (params) => {
+  return api.get('/reports/cash_flow', { params })
+}
+
+export const getTrialBalance = (params) => {
+  return api.get('/reports/trial-balance', { params })
+}
+
+export const getClosedPeriods = () => {
+  return api.get('/periods')
+}
+
+export const closePeriod = (period) => {
+  return api.post(`/periods/${period}/close`)
 }
 
-export const getIncomeStatement = () => {
-  return api.get('/reports/income_statement')
+export const reopenPeriod = (period) => {
+  return api.post(`/periods/${period}/reopen`)
 }
 
-export const getCashFlow = () => {
-  return api.get('/reports/cash_flow')
+// 总账导出为流式下载，直接返回下载地址供浏览器打开
+export const getGeneralLedgerExportUrl = (params) => {
+  const query = new URLSearchParams(params).toString()
+  return `/api/reports/general-ledger/export${query ? `?${query}` : ''}`
 }
 
 // 银行对账
@@ -169,8 +217,25 @@ export const reconcileBankStatementItem = (itemId, data) => {
   return api.post(`/bank-statement-items/${itemId}/reconcile`, data)
 }
 
-export const getUnreconciledVoucherEntries = () => {
-  return api.get('/unreconciled-voucher-entries')
+// 导入银行对账单文件（CSV / MT940 / CAMT.053）
+export const importBankStatementFile = (statementId, file, params) => {
+  const formData = new FormData()
+  formData.append('file', file)
+  return api.post(`/bank-statements/${statementId}/import`, formData, { params, timeout: 0 })
+}
+
+// 批量对账，pairs: [{ item_id, voucher_entry_id }]
+export const reconcileBankStatementItemsBatch = (statementId, pairs) => {
+  return api.post(`/bank-statements/${statementId}/reconcile-batch`, { pairs })
+}
+
+// 自动对账，data: { dry_run, window_days }
+export const autoReconcileBankStatement = (statementId, data) => {
+  return api.post(`/bank-statements/${statementId}/auto-reconcile`, data)
+}
+
+export const getUnreconciledVoucherEntries = (params) => {
+  return api.get('/unreconciled-voucher-entries', { params })
 }
 
 // 采购订单管理
@@ -238,4 +303,34 @@ export const getBankAccounts = () => {
   return api.get('/accounts/bank')
 }
 
+// 后台任务：提交后立即返回任务ID，通过 getJob 轮询进度
+export const createJob = (kind, params) => {
+  return api.post('/jobs', { kind, params })
+}
+
+// 提交导入类后台任务（上传文件）
+export const createFileJob = (kind, file, params = {}) => {
+  const formData = new FormData()
+  formData.append('kind', kind)
+  formData.append('file', file)
+  Object.entries(params).forEach(([key, value]) => formData.append(key, value))
+  return api.post('/jobs', formData, { timeout: 0 })
+}
+
+export const getJobs = (params) => {
+  return api.get('/jobs', { params })
+}
+
+export const getJob = (id) => {
+  return api.get(`/jobs/${id}`)
+}
+
+export const cancelJob = (id) => {
+  return api.post(`/jobs/${id}/cancel`)
+}
+
+export const getJobDownloadUrl = (id) => {
+  return `/api/jobs/${id}/download`
+}
+
 export default api
\ No newline at end of file